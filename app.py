@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import Depends, FastAPI, Request
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
@@ -21,6 +22,13 @@ from embeddings.apis.crud_embeddings import app as create_embeddings_router
 # publish routers
 from publish.publish_apis import app as publish_router
 
+from embeddings.executors import shutdown_executors
+from embeddings.batcher import close_embedding_batcher
+from embeddings.jobs import stop_running_jobs
+from embeddings.embedding_settings import Settings as EmbeddingSettings
+from defaults.db_engine import dispose_engines
+from defaults.startup import start_warmup, stop_warmup, state as warmup_state
+
 # logging
 from cloud_watch_logs.client_connect import send_backend_log_to_cloudwatch, create_event, send_frontend_log_to_cloudwatch
 import asyncio
@@ -32,8 +40,24 @@ import json
 load_dotenv(override=True)
 
 ENVIRONMENT = os.environ.get("ENVIRONMENT", "production")
+
+# Liveness and readiness probes; not logged to CloudWatch
+PROBE_PATHS = ("/health", "/ready")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema check, job resume and warm-up (see defaults/startup.py)
+    await start_warmup(resume_jobs=EmbeddingSettings().EMBED_JOB_RESUME_ON_STARTUP)
+    yield
+    await stop_warmup()
+    await stop_running_jobs()
+    await close_embedding_batcher()
+    shutdown_executors()
+    await dispose_engines()
+
 # Setup FastAPI
 app = FastAPI(
+    lifespan=lifespan,
     debug=ENVIRONMENT != "production",
     docs_url=None if ENVIRONMENT == "production" else "/docs",
     redoc_url=None if ENVIRONMENT == "production" else "/redoc",
@@ -50,9 +74,17 @@ app.add_middleware(
 
 class CloudWatchLoggingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
+        if request.url.path in PROBE_PATHS:
+            return await call_next(request)
         start_time = time.time()
         response = await call_next(request)
 
+        # Only JSON bodies are captured; streamed ones (exports, ...) pass through
+        # untouched so they are never held in memory, and only status and timing are logged
+        if not response.headers.get("content-type", "").startswith("application/json"):
+            self.log(request, response, start_time, "NOT CAPTURED (streamed response)")
+            return response
+
         # Read the response body (may only work once)
         response_body = b""
         async for chunk in response.body_iterator:
@@ -65,6 +97,17 @@ class CloudWatchLoggingMiddleware(BaseHTTPMiddleware):
         except Exception:
             response_data = "NON-JSON or UNREADABLE response"
 
+        self.log(request, response, start_time, response_data)
+
+        return Response(
+            content=response_body,
+            status_code=response.status_code,
+            headers=dict(response.headers),
+            media_type=response.media_type
+        )
+
+    @staticmethod
+    def log(request: Request, response, start_time: float, response_data) -> None:
         process_time = (time.time() - start_time) * 1000  # in milliseconds
 
         log_event = {
@@ -81,13 +124,6 @@ class CloudWatchLoggingMiddleware(BaseHTTPMiddleware):
 
         # Schedule the log sending without blocking the response
         asyncio.create_task(send_backend_log_to_cloudwatch(log_event))
-
-        return Response(
-            content=response_body,
-            status_code=response.status_code,
-            headers=dict(response.headers),
-            media_type=response.media_type
-        )
     
 app.add_middleware(CloudWatchLoggingMiddleware)
 
@@ -124,6 +160,17 @@ app.include_router(create_embeddings_router, prefix="/embeddings", tags=['Vector
 
 app.include_router(publish_router, prefix="/publish", tags=['Publish'], dependencies=[current_user])
 
+@app.get("/health")
+async def health():
+    """Liveness: the process serves requests."""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness: the schema is checked and the warm-up steps required to serve are done."""
+    report = warmup_state.report()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
 @app.get("/me")
 async def read_users_me(user = current_user):
     await send_backend_log_to_cloudwatch(create_event('INFO', 'User Profile Accessed', {'user': user}))
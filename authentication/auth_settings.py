@@ -1,6 +1,6 @@
 from dotenv import load_dotenv
 import os
-import boto3
+from defaults.aws_clients import LazyClient
 from defaults.bearer_setting import BYPASS_USER
 
 load_dotenv(override=True)
@@ -13,7 +13,7 @@ COGNITO_USER_POOL_ID=os.environ.get("COGNITO_USER_POOL_ID")
 COGNITO_REDIRECT_URI=os.environ.get("COGNITO_REDIRECT_URI")
 ENVIRONMENT=os.environ.get("ENVIRONMENT")
 
-CLIENT = boto3.client('cognito-idp', region_name=COGNITO_REGION)
+CLIENT = LazyClient('cognito-idp', region_name=COGNITO_REGION)
 
 class Settings:
     def __init__(self):
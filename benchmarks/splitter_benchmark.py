@@ -0,0 +1,91 @@
+"""
+Compare the current split path (RecursiveCharacterTextSplitter followed by
+clean_string on every chunk) with FastRecursiveSplitter (cleaning fused into the
+split).
+
+Usage:
+    python -m benchmarks.splitter_benchmark                 # synthetic corpus
+    python -m benchmarks.splitter_benchmark file1.txt ...   # your own text files
+"""
+import random
+import re
+import sys
+import time
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from embeddings.fast_splitter import FastRecursiveSplitter, SEPARATORS
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+REPEATS = 5
+
+def clean_string(s: str) -> str:
+    # Copy of embeddings.doc_loader.clean_string, which cannot be imported without a database
+    s = s.replace('\x00', '')
+    s = re.sub(r'[\x01-\x08\x0B\x0C\x0E-\x1F\x7F]', '', s)
+    s = s.replace('\u00A0', ' ')
+    return s
+
+def synthetic_corpus(n_docs: int = 200, seed: int = 7, dirty: bool = False) -> list[str]:
+    rng = random.Random(seed)
+    words = ["embedding", "vector", "index", "project", "team", "chunk", "pgvector", "latency",
+             "throughput", "document", "S3", "Bedrock", "splitter", "overlap", "token",
+             "数据", "向量", "検索", "문서"]
+    noise = ["\x00", "\x07", "\x1b", "\u00a0", "\x7f"] if dirty else [""]
+    docs = []
+    for _ in range(n_docs):
+        paragraphs = []
+        for _ in range(rng.randint(5, 60)):
+            sentences = []
+            for _ in range(rng.randint(1, 12)):
+                sentence = " ".join(rng.choice(words) for _ in range(rng.randint(4, 30)))
+                sentences.append(sentence + rng.choice([".", ",", "。", "．"]) + rng.choice(noise))
+            paragraphs.append(rng.choice([" ", "\n"]).join(sentences))
+        docs.append("\n\n".join(paragraphs))
+    return docs
+
+def current_path(splitter, docs):
+    return [[clean_string(chunk) for chunk in splitter.split_text(doc)] for doc in docs]
+
+def fast_path(splitter, docs):
+    return [splitter.split_text(doc) for doc in docs]
+
+def best_time(func, *args) -> tuple[float, list]:
+    best, result = float("inf"), None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def report(label: str, docs: list[str]) -> None:
+    langchain_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+                                                        separators=SEPARATORS)
+    fast_splitter = FastRecursiveSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+                                          separators=SEPARATORS)
+    megabytes = sum(len(doc.encode("utf-8")) for doc in docs) / 1e6
+
+    current_s, current_chunks = best_time(current_path, langchain_splitter, docs)
+    fast_s, fast_chunks = best_time(fast_path, fast_splitter, docs)
+    n_current = sum(len(chunks) for chunks in current_chunks)
+    n_fast = sum(len(chunks) for chunks in fast_chunks)
+
+    print(f"{label}: {len(docs)} docs, {megabytes:.1f} MB")
+    print(f"  current (langchain + clean_string): {current_s * 1000:8.1f} ms  {megabytes / current_s:6.1f} MB/s  {n_current} chunks")
+    print(f"  fast (fused split + clean):         {fast_s * 1000:8.1f} ms  {megabytes / fast_s:6.1f} MB/s  {n_fast} chunks")
+    print(f"  speedup: {current_s / fast_s:.2f}x, identical chunks: {current_chunks == fast_chunks}")
+
+def main(paths: list[str]) -> None:
+    if paths:
+        docs = []
+        for path in paths:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                docs.append(f.read())
+        report("files", docs)
+        return
+    report("synthetic, clean text", synthetic_corpus())
+    report("synthetic, with control characters and NBSP", synthetic_corpus(dirty=True))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,11 +1,11 @@
-import boto3
+from defaults.aws_clients import LazyClient
 import time
 import json
 from cloud_watch_logs.settings import Settings
 
 settings = Settings()
 
-client = boto3.client('logs', region_name=settings.CLOUDWATCH_REGION)
+client = LazyClient('logs', region_name=settings.CLOUDWATCH_REGION)
 
 class LogLevels:
     INFO = "INFO"
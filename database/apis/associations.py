@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from pydantic import BaseModel
 from typing import List
@@ -8,7 +9,7 @@ from datetime import datetime
 
 # Import from your existing schema
 from database.create_schema import FileAssociatedId
-from defaults.db_engine import engine
+from defaults.db_engine import get_async_db
 
 app = APIRouter()
 
@@ -32,21 +33,10 @@ class FileAssociatedIdResponse(FileAssociatedIdBase):
     class Config:
         from_attributes = True
 
-# Database connection dependency
-def get_db():
-    # engine, _ = setup_database(DATABASE_URL)
-    from sqlalchemy.orm import sessionmaker
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # CRUD Endpoints for FileAssociatedId
 
 @app.post("/", response_model=FileAssociatedIdResponse, status_code=status.HTTP_201_CREATED)
-async def create_file_associated_id(assoc: FileAssociatedIdCreate, db: Session = Depends(get_db)):
+async def create_file_associated_id(assoc: FileAssociatedIdCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new file associated ID"""
     try:
         db_assoc = FileAssociatedId(
@@ -55,11 +45,11 @@ async def create_file_associated_id(assoc: FileAssociatedIdCreate, db: Session =
             id_type=assoc.id_type
         )
         db.add(db_assoc)
-        db.commit()
-        db.refresh(db_assoc)
+        await db.commit()
+        await db.refresh(db_assoc)
         return db_assoc
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}"
@@ -69,11 +59,11 @@ async def create_file_associated_id(assoc: FileAssociatedIdCreate, db: Session =
 async def get_all_file_associated_ids(
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all file associated IDs with pagination"""
     try:
-        assocs = db.query(FileAssociatedId).offset(skip).limit(limit).all()
+        assocs = (await db.scalars(select(FileAssociatedId).offset(skip).limit(limit))).all()
         return assocs
     except SQLAlchemyError as e:
         raise HTTPException(
@@ -82,9 +72,9 @@ async def get_all_file_associated_ids(
         )
 
 @app.get("/{associated_id}", response_model=FileAssociatedIdResponse)
-async def get_file_associated_id(associated_id: uuid.UUID, db: Session = Depends(get_db)):
+async def get_file_associated_id(associated_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """Get a specific file associated ID"""
-    assoc = db.query(FileAssociatedId).filter(FileAssociatedId.associated_id == associated_id).first()
+    assoc = await db.get(FileAssociatedId, associated_id)
     if assoc is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -96,11 +86,11 @@ async def get_file_associated_id(associated_id: uuid.UUID, db: Session = Depends
 async def update_file_associated_id(
     associated_id: uuid.UUID, 
     assoc_update: FileAssociatedIdUpdate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a file associated ID"""
     try:
-        db_assoc = db.query(FileAssociatedId).filter(FileAssociatedId.associated_id == associated_id).first()
+        db_assoc = await db.get(FileAssociatedId, associated_id)
         if db_assoc is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -110,44 +100,44 @@ async def update_file_associated_id(
         db_assoc.id_value = assoc_update.id_value
         db_assoc.id_type = assoc_update.id_type
         
-        db.commit()
-        db.refresh(db_assoc)
+        await db.commit()
+        await db.refresh(db_assoc)
         return db_assoc
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}"
         )
 
 @app.delete("/{associated_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_file_associated_id(associated_id: uuid.UUID, db: Session = Depends(get_db)):
+async def delete_file_associated_id(associated_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """Delete a file associated ID"""
     try:
-        db_assoc = db.query(FileAssociatedId).filter(FileAssociatedId.associated_id == associated_id).first()
+        db_assoc = await db.get(FileAssociatedId, associated_id)
         if db_assoc is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Associated ID {associated_id} not found"
             )
         
-        db.delete(db_assoc)
-        db.commit()
+        await db.delete(db_assoc)
+        await db.commit()
         return None
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}"
         )
     
 @app.delete("/delete-associated-ids/{file_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_associated_ids_by_file_id(file_id: uuid.UUID, db: Session = Depends(get_db)):
+async def delete_associated_ids_by_file_id(file_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """
     Delete all associated IDs for a given file_id from FileAssociatedId table.
     """
     try:
-        records = db.query(FileAssociatedId).filter(FileAssociatedId.file_id == file_id).all()
+        records = (await db.scalars(select(FileAssociatedId).where(FileAssociatedId.file_id == file_id))).all()
         if not records:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -155,13 +145,13 @@ async def delete_associated_ids_by_file_id(file_id: uuid.UUID, db: Session = Dep
             )
         
         for record in records:
-            db.delete(record)
+            await db.delete(record)
         
-        db.commit()
+        await db.commit()
         return None
 
     except SQLAlchemyError as db_err:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(db_err)}"
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from pydantic import BaseModel
 from typing import List, Optional
@@ -7,7 +8,7 @@ import uuid
 
 # Import from your existing schema
 from database.create_schema import EmbeddingModel as EmbeddingModelDB
-from defaults.db_engine import engine
+from defaults.db_engine import get_async_db
 
 app = APIRouter()
 
@@ -29,20 +30,10 @@ class EmbeddingModelResponse(EmbeddingModelBase):
     class Config:
         from_attributes = True
 
-# Database connection dependency
-def get_db():
-    from sqlalchemy.orm import sessionmaker
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # CRUD Endpoints for EmbeddingModel
 
 @app.post("/", response_model=EmbeddingModelResponse, status_code=status.HTTP_201_CREATED)
-async def create_embedding_model(model: EmbeddingModelCreate, db: Session = Depends(get_db)):
+async def create_embedding_model(model: EmbeddingModelCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new embedding model entry"""
     try:
         db_model = EmbeddingModelDB(
@@ -50,11 +41,11 @@ async def create_embedding_model(model: EmbeddingModelCreate, db: Session = Depe
             value=model.value
         )
         db.add(db_model)
-        db.commit()
-        db.refresh(db_model)
+        await db.commit()
+        await db.refresh(db_model)
         return db_model
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}"
@@ -64,11 +55,11 @@ async def create_embedding_model(model: EmbeddingModelCreate, db: Session = Depe
 async def get_all_embedding_models(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all embedding models with pagination"""
     try:
-        models = db.query(EmbeddingModelDB).offset(skip).limit(limit).all()
+        models = (await db.scalars(select(EmbeddingModelDB).offset(skip).limit(limit))).all()
         return models
     except SQLAlchemyError as e:
         raise HTTPException(
@@ -77,9 +68,9 @@ async def get_all_embedding_models(
         )
 
 @app.get("/{field_id}", response_model=EmbeddingModelResponse)
-async def get_embedding_model(field_id: uuid.UUID, db: Session = Depends(get_db)):
+async def get_embedding_model(field_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """Get a specific embedding model by ID"""
-    model = db.query(EmbeddingModelDB).filter(EmbeddingModelDB.field_id == field_id).first()
+    model = await db.get(EmbeddingModelDB, field_id)
     if model is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -91,11 +82,11 @@ async def get_embedding_model(field_id: uuid.UUID, db: Session = Depends(get_db)
 async def update_embedding_model(
     field_id: uuid.UUID,
     model_update: EmbeddingModelUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update an embedding model entry"""
     try:
-        db_model = db.query(EmbeddingModelDB).filter(EmbeddingModelDB.field_id == field_id).first()
+        db_model = await db.get(EmbeddingModelDB, field_id)
         if db_model is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -106,32 +97,32 @@ async def update_embedding_model(
         for key, value in update_data.items():
             setattr(db_model, key, value)
 
-        db.commit()
-        db.refresh(db_model)
+        await db.commit()
+        await db.refresh(db_model)
         return db_model
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}"
         )
 
 @app.delete("/{field_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_embedding_model(field_id: uuid.UUID, db: Session = Depends(get_db)):
+async def delete_embedding_model(field_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """Delete an embedding model entry"""
     try:
-        db_model = db.query(EmbeddingModelDB).filter(EmbeddingModelDB.field_id == field_id).first()
+        db_model = await db.get(EmbeddingModelDB, field_id)
         if db_model is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Embedding model with ID {field_id} not found"
             )
         
-        db.delete(db_model)
-        db.commit()
+        await db.delete(db_model)
+        await db.commit()
         return None
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}"
@@ -1,14 +1,16 @@
 from fastapi import APIRouter, HTTPException, Depends, status,  UploadFile, Form
 from fastapi import File as FastAPIFile
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from pydantic import BaseModel
 from typing import List, Optional
 import uuid
 from datetime import datetime
 from defaults.s3_client import s3_client, S3_BUCKET_NAME
+from embeddings.executors import run_io_bound
 # Import from your existing schema
-from defaults.db_engine import engine
+from defaults.db_engine import get_async_db
 from database.create_schema import File
 from database.create_schema import File as FileModel
 app = APIRouter()
@@ -50,23 +52,13 @@ class FileListResponse(BaseModel):
     files: List[FileResponse]
     stats: FileStats
 
-# Database connection dependency
-def get_db():
-    from sqlalchemy.orm import sessionmaker
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # CRUD Endpoints for Files
 
 @app.post("/", status_code=status.HTTP_201_CREATED)
 async def upload_files_to_project(
     project_id: uuid.UUID = Form(...),
     files: List[UploadFile] = FastAPIFile(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Upload one or more files to a project and store in S3"""
     uploaded_file_responses = []
@@ -94,7 +86,8 @@ async def upload_files_to_project(
                 )
 
             # Upload to S3 using bytes
-            s3_client.put_object(
+            await run_io_bound(
+                s3_client.put_object,
                 Bucket=S3_BUCKET_NAME,
                 Key=s3_key,
                 Body=file_bytes,
@@ -112,8 +105,8 @@ async def upload_files_to_project(
                 uploaded_by_cognito_sub=None  # Set if required
             )
             db.add(db_file)
-            db.commit()
-            db.refresh(db_file)
+            await db.commit()
+            await db.refresh(db_file)
 
             uploaded_file_responses.append({
                 "file_id": str(db_file.file_id),
@@ -124,7 +117,7 @@ async def upload_files_to_project(
         return {"uploaded_files": uploaded_file_responses}
 
     except SQLAlchemyError as db_err:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(db_err)}"
@@ -139,11 +132,11 @@ async def upload_files_to_project(
 async def get_all_files(
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all files with pagination"""
     try:
-        files = db.query(File).offset(skip).limit(limit).all()
+        files = (await db.scalars(select(File).offset(skip).limit(limit))).all()
         return files
     except SQLAlchemyError as e:
         raise HTTPException(
@@ -152,9 +145,9 @@ async def get_all_files(
         )
 
 @app.get("/{file_id}", response_model=FileResponse)
-async def get_file(file_id: uuid.UUID, db: Session = Depends(get_db)):
+async def get_file(file_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """Get a specific file by ID"""
-    file = db.query(File).filter(File.file_id == file_id).first()
+    file = await db.get(File, file_id)
     if file is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -166,11 +159,11 @@ async def get_file(file_id: uuid.UUID, db: Session = Depends(get_db)):
 async def update_file(
     file_id: uuid.UUID, 
     file_update: FileUpdate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a file's information"""
     try:
-        db_file = db.query(File).filter(File.file_id == file_id).first()
+        db_file = await db.get(File, file_id)
         if db_file is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -183,11 +176,11 @@ async def update_file(
         
         db_file.updated_at = datetime.utcnow()
         
-        db.commit()
-        db.refresh(db_file)
+        await db.commit()
+        await db.refresh(db_file)
         return db_file
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}"
@@ -212,11 +205,11 @@ def count_files(files: list[dict]) -> dict:
 @app.get("/projects/{project_id}", response_model=FileListResponse)
 async def get_files_by_project(
     project_id: uuid.UUID, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all files associated with a specific project"""
     try:
-        files = db.query(File).filter(File.project_id == project_id).all()
+        files = (await db.scalars(select(File).where(File.project_id == project_id))).all()
         if not files:
             return []
             # raise HTTPException(
@@ -257,25 +250,25 @@ async def get_files_by_project(
 #         )
 
 @app.delete("/{file_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_file(file_id: uuid.UUID, db: Session = Depends(get_db)):
+async def delete_file(file_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """
     Delete file from S3 and remove record from database.
     """
     try:
-        db_file = db.query(FileModel).filter(FileModel.file_id == file_id).first()
+        db_file = await db.get(FileModel, file_id)
         if not db_file:
             raise HTTPException(status_code=404, detail=f"File with ID {file_id} not found")
 
         # Delete from S3
-        s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=db_file.storage_path)
+        await run_io_bound(s3_client.delete_object, Bucket=S3_BUCKET_NAME, Key=db_file.storage_path)
 
         # Delete from DB
-        db.delete(db_file)
-        db.commit()
+        await db.delete(db_file)
+        await db.commit()
         return None
 
     except SQLAlchemyError as db_err:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"DB error: {db_err}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Deletion failed: {str(e)}")
\ No newline at end of file
@@ -1,18 +1,23 @@
 from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from pydantic import BaseModel
 from typing import List, Optional
 import uuid
 from datetime import datetime
-from sqlalchemy import func
-from defaults.db_engine import engine
+from sqlalchemy import func, select
+from defaults.db_engine import get_async_db
 # Import from your existing schema
 from database.create_schema import Project
 
 from database.create_schema import FileAssociatedId
 from database.create_schema import File as FileModel
-from embeddings.vs_connect import vector_stor_connection
+from embeddings.executors import run_io_bound
+from embeddings.vs_connect import get_vector_store, invalidate_vector_store
+from embeddings.partitions import drop_collection, ensure_partition, find_collection_id
+from embeddings.search import bump_collection_version, invalidate_search_target
+from embeddings.vector_db import get_vector_engine
+from embeddings.quantized import validate_storage_mode
 from defaults.s3_client import s3_client, S3_BUCKET_NAME
 
 app = APIRouter()
@@ -22,6 +27,7 @@ class ProjectBase(BaseModel):
     project_name: str
     description: Optional[str] = None
     vector_index_name: Optional[str] = None
+    vector_storage_mode: Optional[str] = "float32"
     team_id: uuid.UUID
 
 class ProjectCreate(ProjectBase):
@@ -31,6 +37,7 @@ class ProjectUpdate(BaseModel):
     project_name: Optional[str] = None
     description: Optional[str] = None
     vector_index_name: Optional[str] = None
+    vector_storage_mode: Optional[str] = None
 
 class ProjectResponse(ProjectBase):
     project_id: uuid.UUID
@@ -40,35 +47,53 @@ class ProjectResponse(ProjectBase):
     class Config:
         from_attributes = True
 
-# Database connection dependency
-def get_db():
-    # engine, _ = setup_database(DATABASE_URL)
-    from sqlalchemy.orm import sessionmaker
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
+def check_storage_mode(mode: Optional[str]) -> str:
     try:
-        yield db
-    finally:
-        db.close()
+        return validate_storage_mode(mode)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+def attach_partition(collection_name: Optional[str]) -> None:
+    # Attach the collection's partition when the embedding table is partitioned. Not
+    # fatal: the vector store handle attaches it on first use otherwise.
+    try:
+        ensure_partition(collection_name)
+    except Exception as e:
+        print(f"Could not attach a partition for collection '{collection_name}': {e}")
+
+def drop_project_collection(collection_name: str) -> None:
+    # Drops the collection's cached search results on this process right away.
+    # Nothing to do if the project never embedded anything.
+    with get_vector_engine().begin() as conn:
+        collection_id = find_collection_id(conn, collection_name)
+        if collection_id is None:
+            return
+        bump_collection_version(conn, collection_id=collection_id)
+    drop_collection(collection_name)
 
 # CRUD Endpoints for Projects
 
 @app.post("/", response_model=ProjectResponse, status_code=status.HTTP_201_CREATED)
-async def create_project(project: ProjectCreate, db: Session = Depends(get_db)):
+async def create_project(project: ProjectCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new project"""
     try:
         db_project = Project(
             project_name=project.project_name,
             description=project.description,
             vector_index_name=project.vector_index_name,
+            vector_storage_mode=check_storage_mode(project.vector_storage_mode),
             team_id=project.team_id
         )
         db.add(db_project)
-        db.commit()
-        db.refresh(db_project)
+        await db.commit()
+        await db.refresh(db_project)
+        await run_io_bound(attach_partition, db_project.vector_index_name)
         return db_project
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}"
@@ -78,11 +103,11 @@ async def create_project(project: ProjectCreate, db: Session = Depends(get_db)):
 async def get_all_projects(
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all projects with pagination"""
     try:
-        projects = db.query(Project).offset(skip).limit(limit).all()
+        projects = (await db.scalars(select(Project).offset(skip).limit(limit))).all()
         return projects
     except SQLAlchemyError as e:
         raise HTTPException(
@@ -92,14 +117,14 @@ async def get_all_projects(
     
 # get project stats number of projects, number of files, number of embeddings, embedded and non embedded files
 @app.get("/stats", response_model=dict)
-async def get_project_stats(db: Session = Depends(get_db)):
+async def get_project_stats(db: AsyncSession = Depends(get_async_db)):
     """Get project statistics"""
     try:
-        total_projects = db.query(func.count(Project.project_id)).scalar()
-        total_files = db.query(func.count(FileModel.file_id)).scalar()
-        embedded_files = db.query(func.count(FileModel.file_id)).filter(FileModel.is_embedded.is_(True)).scalar()
-        non_embedded_files = db.query(func.count(FileModel.file_id)).filter(FileModel.is_embedded.is_(False)).scalar()
-        total_embeddings = db.query(func.count(FileAssociatedId.associated_id)).scalar()
+        total_projects = await db.scalar(select(func.count(Project.project_id)))
+        total_files = await db.scalar(select(func.count(FileModel.file_id)))
+        embedded_files = await db.scalar(select(func.count(FileModel.file_id)).where(FileModel.is_embedded.is_(True)))
+        non_embedded_files = await db.scalar(select(func.count(FileModel.file_id)).where(FileModel.is_embedded.is_(False)))
+        total_embeddings = await db.scalar(select(func.count(FileAssociatedId.associated_id)))
 
         return {
             "total_projects": total_projects,
@@ -116,7 +141,7 @@ async def get_project_stats(db: Session = Depends(get_db)):
         )
     
 @app.get("/{project_id}/stats")
-def get_specific_project_stats(project_id: uuid.UUID, db: Session = Depends(get_db)):
+async def get_specific_project_stats(project_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """
     Returns stats for a specific project:
     - total_files
@@ -126,7 +151,7 @@ def get_specific_project_stats(project_id: uuid.UUID, db: Session = Depends(get_
     """
     try:
         # Fetch the project
-        project = db.query(Project).filter(Project.project_id == project_id).first()
+        project = await db.get(Project, project_id)
         if not project:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -134,14 +159,13 @@ def get_specific_project_stats(project_id: uuid.UUID, db: Session = Depends(get_
             )
 
         # Fetch stats
-        total_files = db.query(func.count(FileModel.file_id)).filter(FileModel.project_id == project_id).scalar()
-        embedded_files = db.query(func.count(FileModel.file_id)).filter(FileModel.project_id == project_id, FileModel.is_embedded.is_(True)).scalar()
-        non_embedded_files = db.query(func.count(FileModel.file_id)).filter(FileModel.project_id == project_id, FileModel.is_embedded.is_(False)).scalar()
-        total_embeddings = (
-            db.query(func.count(FileAssociatedId.associated_id))
+        total_files = await db.scalar(select(func.count(FileModel.file_id)).where(FileModel.project_id == project_id))
+        embedded_files = await db.scalar(select(func.count(FileModel.file_id)).where(FileModel.project_id == project_id, FileModel.is_embedded.is_(True)))
+        non_embedded_files = await db.scalar(select(func.count(FileModel.file_id)).where(FileModel.project_id == project_id, FileModel.is_embedded.is_(False)))
+        total_embeddings = await db.scalar(
+            select(func.count(FileAssociatedId.associated_id))
             .join(FileModel, FileAssociatedId.file_id == FileModel.file_id)
-            .filter(FileModel.project_id == project_id)
-            .scalar()
+            .where(FileModel.project_id == project_id)
         )
 
         return {
@@ -158,9 +182,9 @@ def get_specific_project_stats(project_id: uuid.UUID, db: Session = Depends(get_
         )
 
 @app.get("/{project_id}", response_model=ProjectResponse)
-async def get_project(project_id: uuid.UUID, db: Session = Depends(get_db)):
+async def get_project(project_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """Get a specific project by ID"""
-    project = db.query(Project).filter(Project.project_id == project_id).first()
+    project = await db.get(Project, project_id)
     if project is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -174,11 +198,11 @@ async def get_project(project_id: uuid.UUID, db: Session = Depends(get_db)):
 async def update_project(
     project_id: uuid.UUID, 
     project_update: ProjectUpdate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a project's information"""
     try:
-        db_project = db.query(Project).filter(Project.project_id == project_id).first()
+        db_project = await db.get(Project, project_id)
         if db_project is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -186,33 +210,40 @@ async def update_project(
             )
         
         update_data = project_update.dict(exclude_unset=True)
+        if "vector_storage_mode" in update_data:
+            update_data["vector_storage_mode"] = check_storage_mode(update_data["vector_storage_mode"])
         for key, value in update_data.items():
             setattr(db_project, key, value)
         
         db_project.updated_at = datetime.utcnow()
         
-        db.commit()
-        db.refresh(db_project)
+        await db.commit()
+        await db.refresh(db_project)
+        if "vector_index_name" in update_data:
+            await run_io_bound(attach_partition, db_project.vector_index_name)
+        invalidate_search_target(project_id)
+        invalidate_vector_store(project_id)
         return db_project
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}"
         )
 
 @app.delete("/projects/{project_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_project(project_id: uuid.UUID, db: Session = Depends(get_db)):
+async def delete_project(project_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """
     Delete a project:
-    - Delete embeddings via vector store (from all associated files)
+    - Drop the project's collection (its partition, when partitioned), or delete the
+      embeddings of each file when another project shares the collection
     - Delete associated IDs from DB
     - Delete files from S3 and DB
     - Delete project from DB
     """
     try:
         # Step 1: Fetch the project
-        project = db.query(Project).filter(Project.project_id == project_id).first()
+        project = await db.get(Project, project_id)
         if not project:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -220,34 +251,47 @@ async def delete_project(project_id: uuid.UUID, db: Session = Depends(get_db)):
             )
 
         # Step 2: Collect all associated files
-        files = db.query(FileModel).filter(FileModel.project_id == project_id).all()
+        files = (await db.scalars(select(FileModel).where(FileModel.project_id == project_id))).all()
+        owns_collection = project.vector_index_name and not (await db.scalars(select(Project).where(
+            Project.vector_index_name == project.vector_index_name,
+            Project.project_id != project_id,
+        ))).first()
 
         # Step 3: Process each file
+        vs = await run_io_bound(get_vector_store, project_id) if files and not owns_collection else None
         for file in files:
             # 3.1 Delete embeddings via vector store
-            associated_records = db.query(FileAssociatedId).filter(FileAssociatedId.file_id == file.file_id).all()
+            associated_records = (await db.scalars(
+                select(FileAssociatedId).where(FileAssociatedId.file_id == file.file_id)
+            )).all()
             if associated_records:
-                vs = vector_stor_connection(project_id)
-                vs.vector_store.delete(ids=[str(record.id_value) for record in associated_records])
+                if not owns_collection:
+                    await run_io_bound(vs.delete_embeddings, [str(record.id_value) for record in associated_records])
 
                 for record in associated_records:
-                    db.delete(record)
+                    await db.delete(record)
 
             # 3.2 Delete file from S3
-            s3_client.delete_object(Bucket=S3_BUCKET_NAME, Key=file.storage_path)
+            await run_io_bound(s3_client.delete_object, Bucket=S3_BUCKET_NAME, Key=file.storage_path)
 
             # 3.3 Delete file from DB
-            db.delete(file)
+            await db.delete(file)
+
+        # Step 4: Delete the collection in one statement
+        if owns_collection:
+            await run_io_bound(drop_project_collection, project.vector_index_name)
 
-        # Step 4: Delete project record
-        db.delete(project)
+        # Step 5: Delete project record
+        await db.delete(project)
 
-        # Step 5: Commit all
-        db.commit()
+        # Step 6: Commit all
+        await db.commit()
+        invalidate_search_target(project_id)
+        invalidate_vector_store(project_id, project.vector_index_name if owns_collection else None)
         return None
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Project deletion failed: {str(e)}"
@@ -1,13 +1,14 @@
 from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import uuid
 from datetime import datetime
-from defaults.db_engine import engine
+from defaults.db_engine import get_async_db
 # Import from your existing schema
-from database.create_schema import Team
+from database.create_schema import Project, Team
 
 app = APIRouter()
 
@@ -31,20 +32,10 @@ class TeamResponse(TeamBase):
     class Config:
         from_attributes = True
 
-# Database connection dependency
-def get_db():
-    from sqlalchemy.orm import sessionmaker
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # CRUD Endpoints for Teams
 
 @app.post("/", response_model=TeamResponse, status_code=status.HTTP_201_CREATED)
-async def create_team(team: TeamCreate, db: Session = Depends(get_db)):
+async def create_team(team: TeamCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new team"""
     try:
         db_team = Team(
@@ -52,11 +43,11 @@ async def create_team(team: TeamCreate, db: Session = Depends(get_db)):
             description=team.description
         )
         db.add(db_team)
-        db.commit()
-        db.refresh(db_team)
+        await db.commit()
+        await db.refresh(db_team)
         return db_team
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}"
@@ -66,11 +57,11 @@ async def create_team(team: TeamCreate, db: Session = Depends(get_db)):
 async def get_all_teams(
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all teams with pagination"""
     try:
-        teams = db.query(Team).offset(skip).limit(limit).all()
+        teams = (await db.scalars(select(Team).offset(skip).limit(limit))).all()
         return teams
     except SQLAlchemyError as e:
         raise HTTPException(
@@ -79,9 +70,9 @@ async def get_all_teams(
         )
 
 @app.get("/{team_id}", response_model=TeamResponse)
-async def get_team(team_id: uuid.UUID, db: Session = Depends(get_db)):
+async def get_team(team_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """Get a specific team by ID"""
-    team = db.query(Team).filter(Team.team_id == team_id).first()
+    team = await db.get(Team, team_id)
     if team is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -93,11 +84,11 @@ async def get_team(team_id: uuid.UUID, db: Session = Depends(get_db)):
 async def update_team(
     team_id: uuid.UUID, 
     team_update: TeamUpdate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a team's information"""
     try:
-        db_team = db.query(Team).filter(Team.team_id == team_id).first()
+        db_team = await db.get(Team, team_id)
         if db_team is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -112,20 +103,20 @@ async def update_team(
         # Update the updated_at timestamp
         db_team.updated_at = datetime.utcnow()
         
-        db.commit()
-        db.refresh(db_team)
+        await db.commit()
+        await db.refresh(db_team)
         return db_team
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}"
         )
     
 @app.get("/name/{team_name}", response_model=TeamResponse)
-async def get_team_by_name(team_name: str, db: Session = Depends(get_db)):
+async def get_team_by_name(team_name: str, db: AsyncSession = Depends(get_async_db)):
     """Get a specific team by name"""
-    team = db.query(Team).filter(Team.team_name == team_name).first()
+    team = (await db.scalars(select(Team).where(Team.team_name == team_name))).first()
     if team is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -134,21 +125,21 @@ async def get_team_by_name(team_name: str, db: Session = Depends(get_db)):
     return team
 
 @app.delete("/{team_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_team(team_id: uuid.UUID, db: Session = Depends(get_db)):
+async def delete_team(team_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """Delete a team"""
     try:
-        db_team = db.query(Team).filter(Team.team_id == team_id).first()
+        db_team = await db.get(Team, team_id)
         if db_team is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Team with ID {team_id} not found"
             )
         
-        db.delete(db_team)
-        db.commit()
+        await db.delete(db_team)
+        await db.commit()
         return None
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}"
@@ -166,13 +157,14 @@ class ProjectResponse(BaseModel):
         from_attributes = True
 
 @app.get("/{team_id}/projects", response_model=List[ProjectResponse])
-async def get_team_projects(team_id: uuid.UUID, db: Session = Depends(get_db)):
+async def get_team_projects(team_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """Get all projects for a specific team"""
-    team = db.query(Team).filter(Team.team_id == team_id).first()
+    team = await db.get(Team, team_id)
     if team is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Team with ID {team_id} not found"
         )
-    
-    return team.projects
\ No newline at end of file
+
+    # team.projects would lazy-load outside of an await
+    return (await db.scalars(select(Project).where(Project.team_id == team_id))).all()
\ No newline at end of file
@@ -0,0 +1,35 @@
+import threading
+
+class LazyClient:
+    """
+    A boto3 client created on first use.
+
+    boto3 is only imported then, so modules holding a client import quickly
+    and without AWS configuration. Attribute access is forwarded to the real
+    client.
+    """
+
+    def __init__(self, service_name: str, **client_options):
+        self.service_name = service_name
+        self.client_options = client_options
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        The underlying boto3 client, created on the first call.
+        """
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import boto3
+
+                    self._client = boto3.client(self.service_name, **self.client_options)
+        return self._client
+
+    @property
+    def created(self) -> bool:
+        return self._client is not None
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
@@ -1,2 +1,72 @@
-from database.create_schema import setup_database, DATABASE_URL
-engine, created = setup_database(DATABASE_URL)
\ No newline at end of file
+import os
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from database.create_schema import ensure_schema, DATABASE_URL, ASYNC_DATABASE_URL
+
+load_dotenv(override=True)
+
+# Shared data-access layer of the app database. Routers take an AsyncSession
+# from get_async_db; ingestion, jobs and other code running in worker threads
+# use the sync engine through get_db / db_session. Both engines get the same
+# pool sizing, pre-ping and server-side statement timeout, and every session
+# comes from one of the two module-level factories below. Engines connect on
+# first use; the schema is checked by init_schema, from the app's lifespan.
+APP_DB_POOL_SIZE = int(os.environ.get("APP_DB_POOL_SIZE", "10"))
+APP_DB_MAX_OVERFLOW = int(os.environ.get("APP_DB_MAX_OVERFLOW", "20"))
+APP_DB_POOL_TIMEOUT = float(os.environ.get("APP_DB_POOL_TIMEOUT", "30"))
+APP_DB_POOL_RECYCLE = int(os.environ.get("APP_DB_POOL_RECYCLE", "1800"))
+APP_DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("APP_DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+ENGINE_OPTIONS = {
+    "pool_size": APP_DB_POOL_SIZE,
+    "max_overflow": APP_DB_MAX_OVERFLOW,
+    "pool_timeout": APP_DB_POOL_TIMEOUT,
+    "pool_recycle": APP_DB_POOL_RECYCLE,
+    "pool_pre_ping": True,
+    # Set at connect, so it holds for every statement of every session; 0 disables it
+    "connect_args": {"options": f"-c statement_timeout={APP_DB_STATEMENT_TIMEOUT_MS}"},
+}
+
+engine = create_engine(DATABASE_URL, **ENGINE_OPTIONS)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **ENGINE_OPTIONS)
+# Objects stay loaded after commit: an expired attribute cannot lazy-load outside of an await
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+def init_schema() -> bool:
+    """
+    Create the app database schema, or add what is missing to it.
+
+    Returns:
+        bool: Whether the tables were created.
+    """
+    return ensure_schema(engine)
+
+def get_db():
+    """
+    Sync session dependency, for code that runs in a worker thread.
+    """
+    db: Session = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    """
+    AsyncSession dependency of the routers.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def dispose_engines() -> None:
+    """
+    Close the pooled connections of both engines, at shutdown.
+    """
+    await async_engine.dispose()
+    engine.dispose()
@@ -1,8 +1,8 @@
-import boto3
 import os
+from defaults.aws_clients import LazyClient
 
-# S3 Client Setup
-s3_client = boto3.client(
+# S3 Client Setup; created on first use
+s3_client = LazyClient(
     "s3",
 )
 S3_BUCKET_NAME = os.environ.get("AWS_BUCKET_NAME")
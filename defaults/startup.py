@@ -0,0 +1,169 @@
+import asyncio
+import os
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from defaults.db_engine import init_schema
+
+load_dotenv(override=True)
+
+# Startup runs in the app's lifespan, after the import, which creates no
+# connections or clients. STARTUP_WARMUP picks what happens there:
+#   "background" - serve right away and warm up in a background task
+#   "eager"      - warm everything up before serving
+#   "lazy"       - only check the schema; the rest is built on first use
+# /ready turns 200 once the required steps are done, so traffic only reaches a
+# pod once it can serve it.
+WARMUP_MODES = ("background", "eager", "lazy")
+STARTUP_WARMUP = os.environ.get("STARTUP_WARMUP", "background").lower()
+STARTUP_RETRY_SECONDS = float(os.environ.get("STARTUP_RETRY_SECONDS", "5"))
+
+class WarmupState:
+    """
+    Status of each warm-up step: pending, running, ready, failed or deferred
+    (left to first use).
+    """
+
+    def __init__(self):
+        self.mode = None
+        self.steps = {}
+        self.started = time.monotonic()
+        self.finished = None
+
+    def add(self, name: str, required: bool, status: str = "pending") -> None:
+        self.steps[name] = {"status": status, "required": required}
+
+    @property
+    def ready(self) -> bool:
+        return all(step["status"] == "ready" for step in self.steps.values() if step["required"])
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "mode": self.mode,
+            "uptime_seconds": round(time.monotonic() - self.started, 3),
+            "warmup_seconds": round(self.finished - self.started, 3) if self.finished is not None else None,
+            "steps": {name: dict(step) for name, step in self.steps.items()},
+        }
+
+state = WarmupState()
+_task = None
+
+async def _run_step(name: str, func, retry: bool = False) -> bool:
+    from embeddings.executors import run_io_bound
+
+    step = state.steps[name]
+    start = time.monotonic()
+    while True:
+        step["status"] = "running"
+        try:
+            if asyncio.iscoroutinefunction(func):
+                await func()
+            else:
+                await run_io_bound(func)
+        except Exception as e:
+            step.update(status="failed", error=str(e))
+            print(f"Warm-up step '{name}' failed: {e}")
+            if not retry:
+                return False
+            await asyncio.sleep(STARTUP_RETRY_SECONDS)
+            continue
+        step.pop("error", None)
+        step.update(status="ready", seconds=round(time.monotonic() - start, 3))
+        return True
+
+def _check_vector_database() -> None:
+    from embeddings.vector_db import get_vector_engine
+
+    with get_vector_engine().connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+def _load_embedding_model() -> None:
+    from embeddings.embedding_settings import embedding_model
+
+    embedding_model()
+
+def _create_aws_clients() -> None:
+    from authentication.auth_settings import CLIENT
+    from cloud_watch_logs.client_connect import client
+    from defaults.s3_client import s3_client
+
+    for lazy_client in (s3_client, CLIENT, client):
+        lazy_client.get()
+
+def _import_vector_store() -> None:
+    import langchain_postgres  # noqa: F401
+
+async def _resume_embedding_jobs() -> None:
+    from embeddings.jobs import resume_interrupted_jobs
+
+    resumed = await resume_interrupted_jobs()
+    if resumed:
+        print(f"Resumed {len(resumed)} interrupted embedding jobs.")
+
+async def _resume_index_builds() -> None:
+    from embeddings.ann_index import resume_suspended_indexes
+
+    resumed = await resume_suspended_indexes()
+    if resumed:
+        print(f"Rebuilding the ANN indexes of {len(resumed)} projects left suspended by a bulk load.")
+
+async def warm_up(mode: str, resume_jobs: bool) -> None:
+    """
+    Check the schema (retrying until the database answers), resume interrupted
+    embedding jobs and the ANN index rebuilds of unfinished bulk loads, then,
+    unless mode is "lazy", open the vector database pool, build the embedding
+    model and AWS clients and import the vector store.
+    """
+    if await _run_step("schema", init_schema, retry=True):
+        if resume_jobs:
+            await _run_step("embedding_jobs", _resume_embedding_jobs)
+        await _run_step("index_builds", _resume_index_builds)
+    if mode != "lazy":
+        await _run_step("vector_database", _check_vector_database, retry=True)
+        await asyncio.gather(
+            _run_step("embedding_model", _load_embedding_model),
+            _run_step("aws_clients", _create_aws_clients),
+            _run_step("vector_store", _import_vector_store),
+        )
+    state.finished = time.monotonic()
+    print(f"Warm-up ({mode}) finished in {state.finished - state.started:.2f}s; ready: {state.ready}.")
+
+async def start_warmup(resume_jobs: bool = True) -> None:
+    """
+    Start the warm-up for STARTUP_WARMUP: wait for it in "eager" mode, run it
+    in the background otherwise.
+
+    Raises:
+        ValueError: If STARTUP_WARMUP is not a supported mode.
+    """
+    global _task
+    if STARTUP_WARMUP not in WARMUP_MODES:
+        raise ValueError(f"Unsupported STARTUP_WARMUP '{STARTUP_WARMUP}'. Expected one of {WARMUP_MODES}.")
+    state.mode = STARTUP_WARMUP
+    state.add("schema", required=True)
+    if resume_jobs:
+        state.add("embedding_jobs", required=False)
+    state.add("index_builds", required=False)
+    deferred = "deferred" if STARTUP_WARMUP == "lazy" else "pending"
+    state.add("vector_database", required=STARTUP_WARMUP != "lazy", status=deferred)
+    state.add("embedding_model", required=STARTUP_WARMUP != "lazy", status=deferred)
+    state.add("aws_clients", required=False, status=deferred)
+    state.add("vector_store", required=False, status=deferred)
+
+    _task = asyncio.create_task(warm_up(STARTUP_WARMUP, resume_jobs))
+    if STARTUP_WARMUP == "eager":
+        await _task
+
+async def stop_warmup() -> None:
+    """
+    Cancel a warm-up still running at shutdown.
+    """
+    if _task is not None and not _task.done():
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,433 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+import math
+import re
+import uuid
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+from database.create_schema import SuspendedIndex
+from embeddings.embedding_settings import Settings
+from embeddings.executors import run_io_bound
+from embeddings.helper_functions import (
+    db_session, get_vector_index_name_by_project_id, get_vector_storage_mode_by_project_id
+)
+from embeddings.partitions import ensure_partition, storage_table
+from embeddings.quantized import EMBEDDING_TABLE, collection_dims, compact_expression, compact_operator
+from embeddings.vector_db import get_vector_engine
+
+settings = Settings()
+
+INDEX_METHODS = ("hnsw", "ivfflat")
+
+def index_name(collection_id) -> str:
+    # One ANN index per collection, whatever its method or storage mode
+    return f"ix_emb_{uuid.UUID(str(collection_id)).hex}"
+
+def resolve_collection(project_id) -> dict:
+    """
+    Collection id, storage mode, vector dimension and storage table (the
+    collection's partition when the embedding table is partitioned) of a project.
+
+    Raises:
+        ValueError: If the project or its collection does not exist.
+    """
+    with db_session() as db:
+        collection_name = get_vector_index_name_by_project_id(project_id, db)
+        storage_mode = get_vector_storage_mode_by_project_id(project_id, db)
+    with get_vector_engine().connect() as conn:
+        collection_id = conn.execute(
+            text("SELECT uuid FROM langchain_pg_collection WHERE name = :name"), {"name": collection_name}
+        ).scalar()
+        if collection_id is None:
+            raise ValueError(f"Collection '{collection_name}' has no embeddings yet.")
+        dims = collection_dims(conn, collection_id)
+    # Rows written before the partition existed sit in the default partition
+    ensure_partition(collection_name)
+    return {"collection_id": collection_id, "storage_mode": storage_mode, "dims": dims,
+            "table": storage_table(collection_id)}
+
+def default_lists(rows: int) -> int:
+    # pgvector guidance: rows / 1000 up to 1M rows, sqrt(rows) above
+    return max(1, rows // 1000 if rows <= 1_000_000 else int(math.sqrt(rows)))
+
+def index_options(method: str, m: int | None = None, ef_construction: int | None = None,
+                  lists: int | None = None, rows: int = 0) -> dict:
+    """
+    Build parameters of an index, with defaults from the settings.
+
+    Raises:
+        ValueError: If the method is unknown.
+    """
+    method = (method or settings.VECTOR_INDEX_METHOD).lower()
+    if method == "hnsw":
+        return {
+            "m": int(m or settings.VECTOR_INDEX_HNSW_M),
+            "ef_construction": int(ef_construction or settings.VECTOR_INDEX_HNSW_EF_CONSTRUCTION),
+        }
+    if method == "ivfflat":
+        return {"lists": int(lists or settings.VECTOR_INDEX_IVFFLAT_LISTS or default_lists(rows))}
+    raise ValueError(f"Unknown index method '{method}'. Use one of: {', '.join(INDEX_METHODS)}.")
+
+def index_sql(name: str, collection_id, storage_mode: str, dims: int, method: str, options: dict,
+              table: str = EMBEDDING_TABLE) -> str:
+    """
+    CREATE INDEX CONCURRENTLY statement of a collection's ANN index: a partial
+    index on the shared table, or a plain one on the collection's partition.
+    """
+    _, opclass = compact_operator(storage_mode)
+    with_clause = ", ".join(f"{key} = {int(value)}" for key, value in options.items())
+    sql = (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+        f"ON {table} USING {method} ({compact_expression(storage_mode, dims)} {opclass}) "
+        f"WITH ({with_clause})"
+    )
+    if table == EMBEDDING_TABLE:
+        sql += f" WHERE collection_id = '{uuid.UUID(str(collection_id))}'"
+    return sql
+
+def parse_index_definition(definition: str) -> dict:
+    """
+    Recover the method, build options, operator class and indexed dimension
+    from a pg_indexes.indexdef. The operator class tells the storage mode apart.
+    """
+    method = re.search(r"USING (\w+)", definition).group(1)
+    with_match = re.search(r"WITH \(([^)]*)\)", definition)
+    options = dict(re.findall(r"(\w+)='?(\d+)'?", with_match.group(1))) if with_match else {}
+    opclass = re.search(r"(\w+_ops)\b", definition)
+    dims = re.search(r"::(?:vector|halfvec|bit)\((\d+)\)", definition)
+    return {
+        "method": method,
+        **{key: int(value) for key, value in options.items()},
+        "opclass": opclass.group(1) if opclass else None,
+        "dims": int(dims.group(1)) if dims else None,
+    }
+
+def _autocommit(conn):
+    # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction block
+    return conn.execution_options(isolation_level="AUTOCOMMIT")
+
+def _drop(conn, name: str) -> None:
+    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+def get_index(collection_id) -> dict | None:
+    """
+    Definition, size and validity of a collection's ANN index, or None.
+    """
+    name = index_name(collection_id)
+    with get_vector_engine().connect() as conn:
+        row = conn.execute(text(
+            "SELECT pg_get_indexdef(x.indexrelid) AS indexdef, pg_relation_size(x.indexrelid) AS size_bytes, "
+            "x.indisvalid FROM pg_index x WHERE x.indexrelid = to_regclass(:name)"
+        ), {"name": name}).first()
+    if row is None:
+        return None
+    return {
+        "name": name,
+        "definition": row.indexdef,
+        "size_bytes": row.size_bytes,
+        "valid": row.indisvalid,
+        **parse_index_definition(row.indexdef),
+    }
+
+def build_progress(table: str = EMBEDDING_TABLE) -> list[dict]:
+    """
+    Index builds running on an embedding table or partition, from pg_stat_progress_create_index.
+    """
+    with get_vector_engine().connect() as conn:
+        rows = conn.execute(text(
+            "SELECT p.pid, p.index_relid::regclass::text AS index_name, p.phase, "
+            "p.blocks_done, p.blocks_total, p.tuples_done, p.tuples_total "
+            "FROM pg_stat_progress_create_index p "
+            "WHERE p.relid = CAST(:table AS regclass)"
+        ), {"table": table}).mappings().all()
+    progress = []
+    for row in rows:
+        row = dict(row)
+        if row["blocks_total"]:
+            row["percent"] = round(100 * row["blocks_done"] / row["blocks_total"], 1)
+        elif row["tuples_total"]:
+            row["percent"] = round(100 * row["tuples_done"] / row["tuples_total"], 1)
+        else:
+            row["percent"] = None
+        progress.append(row)
+    return progress
+
+def prewarm_index(name: str) -> int:
+    """
+    Load an index into shared_buffers with pg_prewarm.
+
+    Returns:
+        int: Number of blocks read.
+    """
+    with _autocommit(get_vector_engine().connect()) as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_prewarm"))
+        return conn.execute(text("SELECT pg_prewarm(CAST(:name AS regclass))"), {"name": name}).scalar()
+
+def build_index(project_id, method: str | None = None, m: int | None = None, ef_construction: int | None = None,
+                lists: int | None = None, rebuild: bool = False) -> dict:
+    """
+    Create, or with rebuild=True replace, the ANN index of a project's collection
+    without blocking reads or writes.
+
+    A rebuild builds the new index under a temporary name, drops the old one and
+    renames the new one, so queries keep an index throughout. Without rebuild an
+    existing index with the same parameters is kept and one with other parameters
+    or indexed expression (after a storage mode change) is replaced. A failed
+    concurrent build leaves an invalid index, which is dropped.
+
+    Raises:
+        ValueError: If the collection is empty or a parameter is invalid.
+    """
+    target = resolve_collection(project_id)
+    if target["dims"] is None:
+        raise ValueError("The collection is empty; build the index after loading data.")
+    collection_id = target["collection_id"]
+    name = index_name(collection_id)
+    method = (method or settings.VECTOR_INDEX_METHOD).lower()
+
+    with get_vector_engine().connect() as conn:
+        rows = conn.execute(
+            text(f"SELECT count(*) FROM {target['table']} WHERE collection_id = :cid"), {"cid": collection_id}
+        ).scalar()
+    options = index_options(method, m, ef_construction, lists, rows)
+
+    existing = get_index(collection_id)
+    if existing and not rebuild:
+        # The indexed expression must match too: search orders by the project's storage mode
+        _, opclass = compact_operator(target["storage_mode"])
+        wanted = {"method": method, **options, "opclass": opclass, "dims": int(target["dims"])}
+        if existing["valid"] and parse_index_definition(existing["definition"]) == wanted:
+            return {"name": name, "method": method, **options, "storage_mode": target["storage_mode"],
+                    "prewarmed_blocks": None}
+        # Invalid (left over from an interrupted concurrent build) or built with other parameters
+        rebuild = True
+    build_name = f"{name}_new" if existing else name
+
+    with _autocommit(get_vector_engine().connect()) as conn:
+        if settings.VECTOR_INDEX_MAINTENANCE_WORK_MEM:
+            conn.execute(text(f"SET maintenance_work_mem = '{settings.VECTOR_INDEX_MAINTENANCE_WORK_MEM}'"))
+        if build_name != name:
+            _drop(conn, build_name)
+        try:
+            conn.execute(text(index_sql(build_name, collection_id, target["storage_mode"], target["dims"],
+                                        method, options, target["table"])))
+        except Exception:
+            _drop(conn, build_name)
+            raise
+        if build_name != name:
+            _drop(conn, name)
+            conn.execute(text(f"ALTER INDEX {build_name} RENAME TO {name}"))
+
+    prewarmed = None
+    if settings.VECTOR_INDEX_PREWARM:
+        try:
+            prewarmed = prewarm_index(name)
+        except Exception as e:
+            print(f"Prewarming {name} failed: {e}")
+    return {"name": name, "method": method, **options, "storage_mode": target["storage_mode"],
+            "prewarmed_blocks": prewarmed}
+
+def drop_index(project_id) -> bool:
+    """
+    Drop the ANN index of a project's collection without blocking queries.
+
+    Returns:
+        bool: False if there was no index.
+    """
+    collection_id = resolve_collection(project_id)["collection_id"]
+    name = index_name(collection_id)
+    if get_index(collection_id) is None:
+        return False
+    with _autocommit(get_vector_engine().connect()) as conn:
+        _drop(conn, name)
+        _drop(conn, f"{name}_new")
+    return True
+
+# Index maintenance runs in the background and is deferred while a project is
+# being bulk loaded: an HNSW index built once after the load is much cheaper
+# than one maintained row by row during it. Tracked per process, except for
+# indexes dropped for a load: their rebuild is recorded in suspended_indexes,
+# with a heartbeat while a process owns it (the embedding jobs' lease), so one
+# lost to a crash or restart is finished by the next start.
+_builds: dict = {}
+_bulk_loads: dict = {}
+_deferred: dict = {}
+_suspended: set = set()
+_heartbeat_task = None
+
+def index_state(project_id) -> dict:
+    project_id = str(project_id)
+    build = _builds.get(project_id)
+    return {
+        "building": build is not None and not build.done(),
+        "bulk_loading": _bulk_loads.get(project_id, 0) > 0,
+        "deferred": _deferred.get(project_id),
+    }
+
+def _record_suspended(project_id: str, spec: dict) -> None:
+    with db_session() as db:
+        stmt = insert(SuspendedIndex).values(
+            project_id=project_id, spec=spec, heartbeat_at=datetime.utcnow(), created_at=datetime.utcnow()
+        )
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["project_id"],
+            set_={"spec": stmt.excluded.spec, "heartbeat_at": stmt.excluded.heartbeat_at},
+        ))
+        db.commit()
+
+def _touch_suspended(project_ids: list[str]) -> None:
+    with db_session() as db:
+        db.query(SuspendedIndex).filter(SuspendedIndex.project_id.in_(project_ids)).update(
+            {"heartbeat_at": datetime.utcnow()}, synchronize_session=False
+        )
+        db.commit()
+
+def _clear_suspended(project_id: str) -> None:
+    with db_session() as db:
+        db.query(SuspendedIndex).filter(SuspendedIndex.project_id == project_id).delete(synchronize_session=False)
+        db.commit()
+
+def _claim_suspended() -> dict:
+    # Rebuilds whose owner stopped heartbeating; claiming renews the heartbeat
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=settings.EMBED_JOB_LEASE_SECONDS)
+    with db_session() as db:
+        rows = db.execute(
+            SuspendedIndex.__table__.update()
+            .where((SuspendedIndex.heartbeat_at.is_(None)) | (SuspendedIndex.heartbeat_at < stale))
+            .values(heartbeat_at=now)
+            .returning(SuspendedIndex.project_id, SuspendedIndex.spec)
+        ).all()
+        db.commit()
+    return {str(project_id): spec for project_id, spec in rows}
+
+async def _heartbeat_suspended() -> None:
+    global _heartbeat_task
+    try:
+        while _suspended:
+            await asyncio.sleep(settings.EMBED_JOB_LEASE_SECONDS / 3)
+            if _suspended:
+                await run_io_bound(_touch_suspended, list(_suspended))
+    finally:
+        _heartbeat_task = None
+
+def _own_suspended(project_id: str) -> None:
+    global _heartbeat_task
+    _suspended.add(project_id)
+    if _heartbeat_task is None:
+        _heartbeat_task = asyncio.get_running_loop().create_task(_heartbeat_suspended())
+
+def _start_build(project_id: str, spec: dict) -> None:
+    async def run():
+        try:
+            result = await run_io_bound(build_index, project_id, **spec)
+            print(f"ANN index {result['name']} built for project {project_id}.")
+        except ValueError as e:
+            # The project or its rows are gone: there is nothing left to rebuild
+            print(f"ANN index build for project {project_id} failed: {e}")
+        except Exception as e:
+            # A suspended index stays recorded, and the next start retries it
+            print(f"ANN index build for project {project_id} failed: {e}")
+            _suspended.discard(project_id)
+            return
+        if project_id in _suspended:
+            await run_io_bound(_clear_suspended, project_id)
+            _suspended.discard(project_id)
+
+    task = asyncio.get_running_loop().create_task(run())
+    _builds[project_id] = task
+    task.add_done_callback(lambda _: _builds.pop(project_id, None) if _builds.get(project_id) is task else None)
+
+async def request_build(project_id, **spec) -> str:
+    """
+    Start a background build, or defer it until the project's bulk load ends.
+
+    Returns:
+        str: "started", "deferred" or "running" (a build is already in progress).
+    """
+    project_id = str(project_id)
+    if _bulk_loads.get(project_id, 0) > 0:
+        _deferred[project_id] = spec
+        if project_id in _suspended:
+            await run_io_bound(_record_suspended, project_id, spec)
+        return "deferred"
+    build = _builds.get(project_id)
+    if build is not None and not build.done():
+        return "running"
+    _start_build(project_id, spec)
+    return "started"
+
+async def _suspend_index(project_id: str) -> None:
+    # Drop an existing index before a large load and rebuild it with the same parameters afterwards
+    try:
+        target = await run_io_bound(resolve_collection, project_id)
+        existing = await run_io_bound(get_index, target["collection_id"])
+    except ValueError:
+        return
+    if existing is None:
+        return
+    spec = {key: existing.get(key) for key in ("method", "m", "ef_construction", "lists")}
+    spec = _deferred.setdefault(project_id, {**spec, "rebuild": False})
+    # Recorded before the drop, so the index is never gone without a trace
+    await run_io_bound(_record_suspended, project_id, spec)
+    _own_suspended(project_id)
+    await run_io_bound(drop_index, project_id)
+
+async def resume_suspended_indexes() -> list:
+    """
+    Rebuild the indexes dropped for a bulk load that never finished, e.g.
+    because the process crashed or restarted during it.
+
+    Returns:
+        list: Ids of the projects whose rebuild was started or deferred.
+    """
+    claimed = await run_io_bound(_claim_suspended)
+    for project_id, spec in claimed.items():
+        _own_suspended(project_id)
+        if _bulk_loads.get(project_id, 0) > 0:
+            _deferred.setdefault(project_id, spec)
+        else:
+            _start_build(project_id, spec)
+    return list(claimed)
+
+async def wait_for_build(project_id) -> None:
+    """
+    Wait for the background index build of a project, if one is running.
+    """
+    build = _builds.get(str(project_id))
+    if build is not None:
+        await build
+
+@asynccontextmanager
+async def bulk_load(project_files: dict, suspend_index: bool = False):
+    """
+    Mark projects as being bulk loaded for the duration of the block.
+
+    Index builds requested meanwhile are deferred and run when the last load of
+    the project ends. Projects receiving at least VECTOR_INDEX_BULK_LOAD_MIN_FILES
+    files have their index dropped for the load and rebuilt after it.
+
+    Args:
+        project_files (dict): project_id -> number of files being loaded.
+        suspend_index (bool): Drop and rebuild the indexes regardless of the file count.
+    """
+    project_ids = [str(project_id) for project_id in project_files]
+    for project_id in project_ids:
+        _bulk_loads[project_id] = _bulk_loads.get(project_id, 0) + 1
+    try:
+        threshold = settings.VECTOR_INDEX_BULK_LOAD_MIN_FILES
+        for project_id, n_files in project_files.items():
+            if suspend_index or (threshold and n_files >= threshold):
+                await _suspend_index(str(project_id))
+        yield
+    finally:
+        for project_id in project_ids:
+            _bulk_loads[project_id] -= 1
+            if _bulk_loads[project_id] <= 0:
+                del _bulk_loads[project_id]
+                spec = _deferred.pop(project_id, None)
+                if spec is not None:
+                    _start_build(project_id, spec)
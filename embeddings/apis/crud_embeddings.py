@@ -1,88 +1,110 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, status, UploadFile, Form
+from fastapi import File as FastAPIFile
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 import uuid
-from embeddings.doc_loader import extract_text_from_s3_file
 from database.create_schema import File as FileModel
-from defaults.db_engine import engine
-from embeddings.vs_connect import vector_stor_connection
+from defaults.db_engine import get_async_db
+from embeddings.vs_connect import get_vector_store
 from database.create_schema import FileAssociatedId
+from embeddings.executors import run_io_bound
+from embeddings.jobs import create_job, get_job, start_job
+from embeddings.ann_index import (
+    build_progress, bulk_load, drop_index, get_index, index_name, index_options, index_state, prewarm_index,
+    request_build, resolve_collection
+)
+from embeddings.bulk_import import IMPORT_FORMATS, format_of, import_records, open_records
+from embeddings.reembed import reembed_file
+from embeddings.embedding_cache import CachedEmbeddings
+from embeddings.search import result_cache
+from embeddings.embedding_settings import Settings
 import asyncio
 
 app = APIRouter()
 
-# Database connection dependency
-def get_db():
-    from sqlalchemy.orm import sessionmaker
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+settings = Settings()
 
 # Pydantic model for request body
 class FileIDsRequest(BaseModel):
     file_ids: List[uuid.UUID]
 
-async def process_single_file(db_file: FileModel):
-    """
-    Process a single file (custom logic here)
-    """
-    if db_file.project_id is None:
-        raise ValueError(f"File {db_file.file_id} has no associated project_id.")
-    if db_file.is_embedded:
-        # Skip if already embedded
-        return db_file.file_id
-    if db_file.storage_path is None:   
-        raise ValueError(f"File {db_file.file_id} has no storage path.")
-    splits = extract_text_from_s3_file(db_file.storage_path, db_file.file_id)
-    vs = vector_stor_connection(db_file.project_id)
-    vs.push_embeddings_to_vector_store(splits)
-    return db_file.file_id
-
 @app.post("/create-embeddings", status_code=status.HTTP_200_OK)
-async def create_embeddings(request: FileIDsRequest, db: Session = Depends(get_db)):
+async def create_embeddings(request: FileIDsRequest):
     """
-    Concurrently process files and update 'is_embedded' flags in batch.
+    Embed files as a checkpointed job and wait for it. Files are processed
+    concurrently and each one is flagged 'is_embedded' as soon as it is written.
+    If the process stops midway, the job resumes from its last checkpoint.
     """
     try:
-        # Fetch all files first
-        files = db.query(FileModel).filter(FileModel.file_id.in_(request.file_ids)).all()
-
-        if not files:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="No files found for given file_ids"
-            )
-
-        # Async parallel processing with per-file exception handling
-        async def safe_process(file):
-            try:
-                return await process_single_file(file)
-            except Exception as e:
-                # Log or collect errors if needed
-                print(e)
+        job_id = await run_io_bound(create_job, request.file_ids)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
 
-        tasks = [safe_process(file) for file in files]
-        results = await asyncio.gather(*tasks)
+    try:
+        task = await start_job(job_id)
+        # Shielded so that a dropped request does not cancel the job
+        result = await asyncio.shield(task)
 
-        # Filter successful results
-        processed_file_ids = [fid for fid in results if fid is not None]
+        return {
+            "message": f"{result['completed']} files processed and embeddings created successfully.",
+            "job_id": job_id,
+            **result,
+        }
 
-        # Bulk update is_embedded flag
-        db.query(FileModel).filter(FileModel.file_id.in_(processed_file_ids)).update(
-            {"is_embedded": True},
-            synchronize_session=False
+    except SQLAlchemyError as db_err:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database error: {str(db_err)}"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Embedding creation failed: {str(e)}"
         )
-        db.commit()
-
-        return {"message": f"{len(processed_file_ids)} files processed and embeddings created successfully."}
 
+@app.post("/import/{project_id}", status_code=status.HTTP_200_OK)
+async def import_embeddings(
+    project_id: uuid.UUID,
+    data: UploadFile = FastAPIFile(...),
+    metadata: Optional[UploadFile] = FastAPIFile(None),
+    format: Optional[str] = Form(None),
+    file_id: Optional[uuid.UUID] = Form(None),
+    file_name: Optional[str] = Form(None),
+    suspend_index: bool = Form(False),
+):
+    """
+    Import precomputed embeddings (NDJSON, Parquet, or .npy vectors with an
+    NDJSON metadata file) into a project without calling the embedding model.
+    Vectors must have the dimension of the configured embedding model, which
+    embeds the project's queries. The records go under file_id, else the
+    project's import file named file_name (the upload's name by default), so
+    re-running an import upserts. With suspend_index, the project's ANN index
+    is dropped during the import and rebuilt after it.
+    """
+    file_format = (format or format_of(data.filename or "") or "").lower()
+    if file_format not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown import format of '{data.filename}'. Pass format, one of: {', '.join(IMPORT_FORMATS)}."
+        )
+    try:
+        records = open_records(file_format, data.file, metadata.file if metadata else None)
+        async with bulk_load({project_id: 1}, suspend_index=suspend_index):
+            result = await run_io_bound(
+                import_records, project_id, records, file_id, file_name or data.filename, file_format
+            )
+    except (ValueError, ImportError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except SQLAlchemyError as db_err:
-        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(db_err)}"
@@ -90,22 +112,76 @@ async def create_embeddings(request: FileIDsRequest, db: Session = Depends(get_d
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Embedding creation failed: {str(e)}"
+            detail=f"Import failed: {str(e)}"
+        )
+    return {"message": f"{result['imported']} embeddings imported.", **result}
+
+@app.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def create_embedding_job(request: FileIDsRequest):
+    """
+    Start a checkpointed embedding job in the background and return its id.
+    """
+    try:
+        job_id = await run_io_bound(create_job, request.file_ids)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    await start_job(job_id)
+    return {"message": "Embedding job started.", "job_id": job_id}
+
+@app.get("/jobs/{job_id}", response_model=dict)
+async def get_embedding_job(job_id: uuid.UUID):
+    """
+    Status of an embedding job with the checkpoint of every file.
+    """
+    job = await run_io_bound(get_job, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job with ID {job_id} not found"
         )
+    return job
+
+@app.post("/jobs/{job_id}/resume", status_code=status.HTTP_202_ACCEPTED)
+async def resume_embedding_job(job_id: uuid.UUID):
+    """
+    Resume an interrupted or failed job from its last checkpoint.
+    """
+    job = await run_io_bound(get_job, job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job with ID {job_id} not found"
+        )
+    if await start_job(job_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job {job_id} is {job['status']} and cannot be resumed now."
+        )
+    return {"message": "Embedding job resumed.", "job_id": job_id}
 
 @app.delete("/delete-embeddings-ids/{file_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_associated_ids_by_file_id(file_id: uuid.UUID, db: Session = Depends(get_db)):
+async def delete_associated_ids_by_file_id(file_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """
     Delete all associated IDs for a given file_id from FileAssociatedId table.
     """
     try:
-        records = db.query(FileAssociatedId).filter(FileAssociatedId.file_id == file_id).all()
-        project_id = db.query(FileModel).filter(FileModel.file_id == file_id).first().project_id
+        db_file = await db.get(FileModel, file_id)
+        if db_file is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"File with ID {file_id} not found"
+            )
+        project_id = db_file.project_id
         if not project_id:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Project ID not found for file_id {file_id}"
             )
+
+        records = (await db.scalars(select(FileAssociatedId).where(FileAssociatedId.file_id == file_id))).all()
         
         if not records:
             raise HTTPException(
@@ -113,17 +189,168 @@ async def delete_associated_ids_by_file_id(file_id: uuid.UUID, db: Session = Dep
                 detail=f"No associated IDs found for file_id {file_id}"
             )
 
-        vs = vector_stor_connection(project_id)
-        vs.vector_store.delete(ids=[str(record.id_value) for record in records])
+        vs = await run_io_bound(get_vector_store, project_id)
+        await run_io_bound(vs.delete_embeddings, [str(record.id_value) for record in records])
         
         for record in records:
-            db.delete(record)
+            await db.delete(record)
         
-        db.query(FileModel).filter(FileModel.file_id == file_id).update({"is_embedded": False})
+        await db.execute(update(FileModel).where(FileModel.file_id == file_id).values(is_embedded=False))
         
-        db.commit()
+        await db.commit()
         return None
 
     except Exception as e:
-        db.rollback()
-        raise e
\ No newline at end of file
+        await db.rollback()
+        raise e
+
+@app.post("/reembed/{file_id}", status_code=status.HTTP_200_OK)
+async def reembed_changed_file(file_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
+    """
+    Incrementally re-embed a file after its content changed: only new chunks are
+    embedded and only vanished chunks are deleted.
+    """
+    db_file = await db.get(FileModel, file_id)
+    if db_file is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"File with ID {file_id} not found"
+        )
+    if db_file.storage_path is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File {file_id} has no storage path."
+        )
+
+    try:
+        result = await reembed_file(db_file.file_id, db_file.storage_path, db_file.project_id, db_file.mime_type)
+
+        await db.execute(update(FileModel).where(FileModel.file_id == file_id).values(is_embedded=True))
+        await db.commit()
+
+        return {"message": f"File {file_id} re-embedded incrementally.", **result}
+
+    except SQLAlchemyError as db_err:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database error: {str(db_err)}"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Re-embedding failed: {str(e)}"
+        )
+
+class IndexRequest(BaseModel):
+    method: Optional[str] = None  # "hnsw" or "ivfflat"; defaults to VECTOR_INDEX_METHOD
+    m: Optional[int] = None
+    ef_construction: Optional[int] = None
+    lists: Optional[int] = None
+
+async def _request_index_build(project_id: uuid.UUID, request: IndexRequest, rebuild: bool):
+    try:
+        # Validate the parameters before going to the background
+        index_options(request.method, request.m, request.ef_construction, request.lists)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    state = await request_build(project_id, **request.dict(), rebuild=rebuild)
+    messages = {
+        "started": "Index build started.",
+        "deferred": "The project is being bulk loaded; the index will be built when the load ends.",
+        "running": "An index build is already running for this project.",
+    }
+    return {"message": messages[state], "state": state}
+
+@app.get("/index/{project_id}", response_model=dict)
+async def get_collection_index(project_id: uuid.UUID):
+    """
+    ANN index of a project's collection, with the progress of running builds.
+    """
+    try:
+        target = await run_io_bound(resolve_collection, project_id)
+        index = await run_io_bound(get_index, target["collection_id"])
+        progress = await run_io_bound(build_progress)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    name = index_name(target["collection_id"])
+    return {
+        "index": index,
+        "storage_mode": target["storage_mode"],
+        "progress": [row for row in progress if row["index_name"] in (name, f"{name}_new")] or progress,
+        **index_state(project_id),
+    }
+
+@app.post("/index/{project_id}", status_code=status.HTTP_202_ACCEPTED)
+async def create_collection_index(project_id: uuid.UUID, request: IndexRequest = IndexRequest()):
+    """
+    Build the ANN index of a project's collection (CREATE INDEX CONCURRENTLY) in
+    the background, using the project's vector storage mode.
+    """
+    return await _request_index_build(project_id, request, rebuild=False)
+
+@app.post("/index/{project_id}/rebuild", status_code=status.HTTP_202_ACCEPTED)
+async def rebuild_collection_index(project_id: uuid.UUID, request: IndexRequest = IndexRequest()):
+    """
+    Replace the ANN index, e.g. with new parameters or after a storage mode change,
+    without leaving the collection unindexed.
+    """
+    return await _request_index_build(project_id, request, rebuild=True)
+
+@app.delete("/index/{project_id}", status_code=status.HTTP_200_OK)
+async def drop_collection_index(project_id: uuid.UUID):
+    """
+    Drop the ANN index of a project's collection (DROP INDEX CONCURRENTLY).
+    """
+    try:
+        dropped = await run_io_bound(drop_index, project_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    return {"message": "Index dropped." if dropped else "No index to drop."}
+
+@app.post("/index/{project_id}/prewarm", status_code=status.HTTP_200_OK)
+async def prewarm_collection_index(project_id: uuid.UUID):
+    """
+    Load the ANN index into shared_buffers with pg_prewarm.
+    """
+    try:
+        target = await run_io_bound(resolve_collection, project_id)
+        blocks = await run_io_bound(prewarm_index, index_name(target["collection_id"]))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Prewarm failed: {str(e)}"
+        )
+    return {"message": "Index prewarmed.", "blocks": blocks}
+
+@app.get("/cache-stats", response_model=dict)
+async def get_embedding_cache_stats():
+    """
+    Hit/miss counters for the content-addressed embedding cache, the
+    query-embedding cache and the search-result cache.
+    """
+    query_cache = {"enabled": False}
+    if settings.query_cache is not None:
+        query_cache = {"enabled": True, **settings.query_cache.stats()}
+    search_results = {"enabled": False}
+    if result_cache is not None:
+        search_results = {"enabled": True, **result_cache.stats()}
+    if not isinstance(settings.embeddings, CachedEmbeddings):
+        return {"enabled": False, "query_cache": query_cache, "search_results": search_results}
+    return {
+        "enabled": True, **settings.embeddings.stats(), "query_cache": query_cache, "search_results": search_results
+    }
@@ -0,0 +1,115 @@
+import asyncio
+
+from embeddings.embedding_settings import Settings
+from embeddings.executors import run_io_bound
+
+settings = Settings()
+
+class EmbeddingBatcher:
+    """
+    Shared micro-batcher between document extraction and the embedding model.
+
+    Callers submit the chunks of any number of files; chunks are coalesced into
+    batches of up to max_batch_size, a partial batch is flushed after max_wait_ms,
+    and at most max_in_flight batches are sent to the model at once. Every chunk
+    carries its own future, so vectors are routed back to the caller that owns them.
+    """
+
+    def __init__(self, embeddings, max_batch_size: int, max_wait_ms: float, max_in_flight: int):
+        if max_batch_size < 1 or max_in_flight < 1:
+            raise ValueError("max_batch_size and max_in_flight must be at least 1.")
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_in_flight = max_in_flight
+        self.loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._flushes = set()
+        self._worker = self.loop.create_task(self._collect())
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embed texts through the shared batches, preserving their order.
+        """
+        futures = []
+        for text in texts:
+            future = self.loop.create_future()
+            self._queue.put_nowait((text, future))
+            futures.append(future)
+        return list(await asyncio.gather(*futures))
+
+    async def _collect(self):
+        while True:
+            batch = [await self._queue.get()]
+            try:
+                deadline = self.loop.time() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    timeout = deadline - self.loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+
+                await self._in_flight.acquire()
+            except asyncio.CancelledError:
+                for _, future in batch:
+                    future.cancel()
+                raise
+            flush = self.loop.create_task(self._flush(batch))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch):
+        try:
+            vectors = await run_io_bound(self.embeddings.embed_documents, [text for text, _ in batch])
+            if len(vectors) != len(batch):
+                raise ValueError(f"Embedding model returned {len(vectors)} vectors for {len(batch)} texts.")
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._in_flight.release()
+
+    async def close(self):
+        """
+        Stop collecting and wait for batches already sent to the model.
+        """
+        self._worker.cancel()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+
+_batcher = None
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """
+    Return the process-wide batcher, creating it on the running event loop.
+    """
+    global _batcher
+    if _batcher is None or _batcher.loop is not asyncio.get_running_loop():
+        _batcher = EmbeddingBatcher(
+            settings.embeddings,
+            max_batch_size=settings.EMBED_BATCH_MAX_SIZE,
+            max_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS,
+            max_in_flight=settings.EMBED_MAX_IN_FLIGHT,
+        )
+    return _batcher
+
+async def close_embedding_batcher() -> None:
+    global _batcher
+    if _batcher is not None:
+        await _batcher.close()
+        _batcher = None
@@ -0,0 +1,272 @@
+import argparse
+import ast
+import asyncio
+from array import array
+from datetime import datetime
+import io
+import json
+import uuid
+
+from database.create_schema import File as FileModel
+from embeddings.ann_index import bulk_load, wait_for_build
+from embeddings.doc_loader import chunk_id
+from embeddings.embedding_settings import Settings, embedding_dimensions
+from embeddings.executors import run_io_bound
+from embeddings.helper_functions import content_hash, db_session
+from embeddings.vs_connect import get_vector_store
+
+settings = Settings()
+
+# Bulk import of precomputed (text, vector, metadata) records into a project,
+# bypassing S3, parsing and the embedding model. Records go in batches of
+# IMPORT_BATCH_SIZE straight to the collection and file_associated_ids, under a
+# file of the project: the one given by file_id, else the project's import file
+# named file_name, created on the first run. A re-run with either upserts.
+#
+#     python -m embeddings.bulk_import PROJECT_ID vectors.parquet
+#     python -m embeddings.bulk_import PROJECT_ID vectors.npy --metadata records.ndjson
+#
+# NDJSON and Parquet records have "text" (or "document"), "vector" (or
+# "embedding"), optional "metadata" (object or JSON string) and optional "id".
+# A .npy file holds a 2-D float32/float64 array whose rows pair, in order, with
+# the lines of an NDJSON metadata file of text/metadata/id records.
+IMPORT_FORMATS = ("ndjson", "parquet", "npy")
+
+NPY_DTYPES = {"<f4": ("f", 4), "<f8": ("d", 8)}
+
+def format_of(name: str) -> str | None:
+    """
+    Import format of a file name, from its extension.
+    """
+    extension = name.rsplit(".", 1)[-1].lower()
+    if extension in ("ndjson", "jsonl"):
+        return "ndjson"
+    return extension if extension in IMPORT_FORMATS else None
+
+def _record(values: dict, position: int) -> dict:
+    text = values.get("text", values.get("document"))
+    vector = values.get("vector", values.get("embedding"))
+    if text is None or vector is None:
+        raise ValueError(f"Record {position} needs a text and a vector.")
+    metadata = values.get("metadata") or {}
+    if isinstance(metadata, str):
+        metadata = json.loads(metadata)
+    return {"text": text, "vector": vector, "metadata": metadata, "id": values.get("id")}
+
+def _text_lines(stream):
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding="utf-8")
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+def iter_ndjson_records(stream):
+    """
+    Yield the records of an NDJSON stream, one object per line.
+    """
+    for position, values in enumerate(_text_lines(stream)):
+        yield _record(values, position)
+
+def iter_parquet_records(source):
+    """
+    Yield the records of a Parquet file, reading one row group batch at a time.
+
+    Raises:
+        ImportError: If pyarrow is not installed.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet import requires pyarrow: pip install pyarrow") from e
+
+    position = 0
+    for batch in pq.ParquetFile(source).iter_batches(batch_size=settings.IMPORT_BATCH_SIZE):
+        for values in batch.to_pylist():
+            yield _record(values, position)
+            position += 1
+
+def read_npy_header(stream) -> tuple[str, tuple]:
+    """
+    Read the header of a .npy stream, leaving it at the start of the data.
+
+    Returns:
+        tuple: (dtype descr, shape).
+    """
+    if stream.read(6) != b"\x93NUMPY":
+        raise ValueError("Not a .npy file.")
+    major = stream.read(2)[0]
+    length = int.from_bytes(stream.read(2 if major == 1 else 4), "little")
+    header = ast.literal_eval(stream.read(length).decode("latin1"))
+    if header["fortran_order"] or header["descr"] not in NPY_DTYPES or len(header["shape"]) != 2:
+        raise ValueError("The .npy file must hold a C-order 2-D float32 or float64 array.")
+    return header["descr"], header["shape"]
+
+def iter_npy_records(vectors, metadata):
+    """
+    Yield records pairing the rows of a .npy stream with the lines of an NDJSON
+    metadata stream, reading IMPORT_BATCH_SIZE rows at a time.
+    """
+    descr, (rows, dims) = read_npy_header(vectors)
+    typecode, size = NPY_DTYPES[descr]
+    lines = _text_lines(metadata)
+    position = 0
+    while position < rows:
+        count = min(settings.IMPORT_BATCH_SIZE, rows - position)
+        values = array(typecode)
+        values.frombytes(vectors.read(count * dims * size))
+        if len(values) != count * dims:
+            raise ValueError(f"The .npy file ends before row {position + len(values) // dims}.")
+        for i in range(count):
+            line = next(lines, None)
+            if line is None:
+                raise ValueError(f"The metadata file has no line for row {position}.")
+            yield _record({**line, "vector": values[i * dims:(i + 1) * dims]}, position)
+            position += 1
+    if next(lines, None) is not None:
+        raise ValueError(f"The metadata file has more lines than the .npy file has rows ({rows}).")
+
+def _import_file(db, project_id, file_id=None, file_name: str | None = None, file_format: str = "ndjson"):
+    if file_id is not None:
+        db_file = db.query(FileModel).filter(FileModel.file_id == file_id).first()
+        if db_file is None or db_file.project_id != uuid.UUID(str(project_id)):
+            raise ValueError(f"File {file_id} not found in project {project_id}.")
+        return db_file
+    if file_name:
+        # A re-run under the same name continues the earlier import's file
+        db_file = db.query(FileModel).filter(
+            FileModel.project_id == project_id,
+            FileModel.storage_path == f"imports/{project_id}/{file_name}",
+        ).first()
+        if db_file is not None:
+            return db_file
+    file_name = file_name or f"import-{datetime.utcnow():%Y%m%dT%H%M%S}.{file_format}"
+    db_file = FileModel(
+        project_id=project_id,
+        file_name=file_name,
+        # Nothing is uploaded to S3 for an import
+        storage_path=f"imports/{project_id}/{file_name}",
+        mime_type=f"application/x-embeddings-{file_format}",
+        is_embedded=False,
+    )
+    db.add(db_file)
+    db.commit()
+    db.refresh(db_file)
+    return db_file
+
+def _batches(records, size: int):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def import_records(project_id, records, file_id=None, file_name: str | None = None,
+                   file_format: str = "ndjson") -> dict:
+    """
+    Load precomputed records into a project's collection without embedding them.
+
+    Ids are the records' own or, like ingestion, derived from the file, the
+    record's position and its text. A re-run under the same file_id or
+    file_name reuses the file, so it upserts instead of duplicating; without
+    either, every run creates a new file with a timestamped name.
+
+    Args:
+        project_id: The project to import into.
+        records: Iterable of {"text", "vector", "metadata", "id"} dicts.
+        file_id: Existing file of the project to record the chunks under.
+        file_name (str | None): Name of the project's import file otherwise,
+            reused when an earlier import created it.
+        file_format (str): Source format, recorded on a created file.
+
+    Returns:
+        dict: file_id, number of imported records and their dimension.
+
+    Raises:
+        ValueError: If the project or file does not exist, or a record is
+            invalid; the batches before it stay imported under the file, and
+            re-running the import with its file_id or file_name completes it.
+    """
+    vs = get_vector_store(project_id)
+    # The vectors must come from the model that embeds the project's queries
+    dims = embedding_dimensions()
+    imported = 0
+    with db_session() as db:
+        db_file = _import_file(db, project_id, file_id, file_name, file_format)
+        try:
+            for batch in _batches(records, settings.IMPORT_BATCH_SIZE):
+                vectors, hashes, ids = [], [], []
+                for i, record in enumerate(batch):
+                    if len(record["vector"]) != dims:
+                        raise ValueError(
+                            f"Record {imported + i} has {len(record['vector'])} dimensions; "
+                            f"the embedding model produces {dims}."
+                        )
+                    vectors.append([float(value) for value in record["vector"]])
+                    hashes.append(content_hash(record["text"]))
+                    ids.append(str(record["id"] or chunk_id(db_file.file_id, imported + i, hashes[-1])))
+
+                vs.replace_embeddings(
+                    delete_ids=[],
+                    texts=[record["text"] for record in batch],
+                    vectors=vectors,
+                    metadatas=[{**record["metadata"], "id": id_value} for record, id_value in zip(batch, ids)],
+                    ids=ids,
+                    file_id=db_file.file_id,
+                    hashes=hashes,
+                )
+                imported += len(batch)
+        except ValueError as e:
+            raise ValueError(f"{e} {imported} records were imported under file {db_file.file_id}.") from e
+
+        db_file.is_embedded = True
+        db.commit()
+        return {"file_id": str(db_file.file_id), "imported": imported, "dimensions": dims}
+
+def open_records(file_format: str, source, metadata=None):
+    """
+    Records of an import source (a path or a binary file object).
+    """
+    if file_format == "parquet":
+        return iter_parquet_records(source)
+    if file_format == "npy":
+        if metadata is None:
+            raise ValueError("A .npy import needs a metadata file of text/metadata records.")
+        return iter_npy_records(source, metadata)
+    return iter_ndjson_records(source)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import precomputed embeddings into a project.")
+    parser.add_argument("project_id")
+    parser.add_argument("path", help="NDJSON, Parquet or .npy file.")
+    parser.add_argument("--metadata", help="NDJSON text/metadata records of a .npy file, row by row.")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Defaults to the file extension.")
+    parser.add_argument("--file-id", help="Existing file of the project to record the chunks under.")
+    parser.add_argument("--file-name",
+                        help="Name of the project's import file, created on the first run and reused after.")
+    parser.add_argument("--suspend-index", action="store_true",
+                        help="Drop the collection's ANN index during the import and rebuild it after.")
+    args = parser.parse_args()
+
+    file_format = args.format or format_of(args.path)
+    if file_format is None:
+        parser.error("Cannot tell the format from the file name; pass --format.")
+
+    async def run_import():
+        # Through bulk_load, like the endpoint, so a dropped index is recorded and rebuilt
+        with open(args.path, "rb") as source:
+            metadata = open(args.metadata, "rb") if args.metadata else None
+            try:
+                records = open_records(file_format, source, metadata)
+                async with bulk_load({args.project_id: 1}, suspend_index=args.suspend_index):
+                    print(await run_io_bound(
+                        import_records, args.project_id, records, args.file_id, args.file_name, file_format
+                    ))
+            finally:
+                if metadata is not None:
+                    metadata.close()
+        await wait_for_build(args.project_id)
+
+    asyncio.run(run_import())
@@ -0,0 +1,143 @@
+from array import array
+import io
+import json
+import struct
+import sys
+import uuid
+
+from sqlalchemy import text
+
+from embeddings.hybrid import LEXICAL_COLUMN, has_lexical_column, lexical_expression
+from embeddings.partitions import conflict_columns
+from embeddings.quantized import EMBEDDING_TABLE
+
+try:
+    import numpy
+except ImportError:  # Optional: vectors are packed with array() instead
+    numpy = None
+
+# Bulk writes of embeddings through COPY ... FROM STDIN (FORMAT BINARY). Rows are
+# encoded straight to Postgres' binary format (vectors as packed big-endian
+# float32, never formatted as text) into a per-connection staging table, then
+# merged into the embedding table with one INSERT ... ON CONFLICT, which keeps
+# upsert semantics, the partition routing and the tsvector column.
+STAGE_TABLE = "embedding_copy_stage"
+STAGE_COLUMNS = "id, collection_id, embedding, document, cmetadata"
+
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+NULL_FIELD = struct.pack(">i", -1)
+JSONB_VERSION = b"\x01"
+
+def pack_vectors(vectors) -> list[bytes]:
+    """
+    pgvector's binary form of each vector: dimension and an unused int16,
+    then the values as big-endian float32.
+    """
+    if len(vectors) == 0:
+        return []
+    if numpy is not None:
+        matrix = numpy.asarray(vectors, dtype=">f4")
+        if matrix.ndim != 2:
+            raise ValueError("All vectors of a batch must have the same dimension.")
+        prefix = struct.pack(">HH", matrix.shape[1], 0)
+        return [prefix + row.tobytes() for row in matrix]
+    packed = []
+    for vector in vectors:
+        values = array("f", vector)
+        if sys.byteorder == "little":
+            values.byteswap()
+        packed.append(struct.pack(">HH", len(values), 0) + values.tobytes())
+    return packed
+
+def _field(value: bytes | None) -> bytes:
+    if value is None:
+        return NULL_FIELD
+    return struct.pack(">i", len(value)) + value
+
+def _jsonb(id_value, metadata: dict | None) -> bytes | None:
+    if metadata is None:
+        return None
+    try:
+        return JSONB_VERSION + json.dumps(metadata, allow_nan=False).encode()
+    except ValueError:
+        raise ValueError(
+            f"Metadata of chunk {id_value} has NaN or Infinity values, which JSONB cannot store."
+        ) from None
+
+def encode_rows(collection_id, ids: list[str], texts: list[str], vectors, metadatas: list[dict]) -> bytes:
+    """
+    Encode rows of (id, collection_id, embedding, document, cmetadata) as a
+    binary COPY payload.
+
+    Raises:
+        ValueError: If a chunk's metadata has NaN or Infinity values.
+    """
+    collection = uuid.UUID(str(collection_id)).bytes
+    buffer = io.BytesIO()
+    buffer.write(COPY_HEADER)
+    field_count = struct.pack(">h", 5)
+    for id_value, text_value, vector, metadata in zip(ids, texts, pack_vectors(vectors), metadatas):
+        buffer.write(field_count)
+        buffer.write(_field(str(id_value).encode()))
+        buffer.write(_field(collection))
+        buffer.write(_field(vector))
+        buffer.write(_field(text_value.encode() if text_value is not None else None))
+        buffer.write(_field(_jsonb(id_value, metadata)))
+    buffer.write(COPY_TRAILER)
+    return buffer.getvalue()
+
+def _copy(cursor, sql: str, payload: bytes) -> None:
+    if hasattr(cursor, "copy_expert"):
+        # psycopg2
+        cursor.copy_expert(sql, io.BytesIO(payload))
+    else:
+        # psycopg 3
+        with cursor.copy(sql) as copy:
+            copy.write(payload)
+
+def merge_sql() -> str:
+    """
+    Upsert of the staged rows into the embedding table.
+    """
+    targets, values = STAGE_COLUMNS, STAGE_COLUMNS
+    updates = ["embedding = EXCLUDED.embedding", "document = EXCLUDED.document", "cmetadata = EXCLUDED.cmetadata"]
+    if has_lexical_column():
+        targets += f", {LEXICAL_COLUMN}"
+        values += f", {lexical_expression('document')}"
+        updates.append(f"{LEXICAL_COLUMN} = EXCLUDED.{LEXICAL_COLUMN}")
+    return (
+        f"INSERT INTO {EMBEDDING_TABLE} ({targets}) SELECT {values} FROM {STAGE_TABLE} "
+        f"ON CONFLICT ({', '.join(conflict_columns())}) DO UPDATE SET {', '.join(updates)}"
+    )
+
+def copy_embeddings(session, collection_id, ids: list[str], texts: list[str], vectors,
+                    metadatas: list[dict]) -> None:
+    """
+    Upsert embeddings through a binary COPY, in the session's transaction.
+
+    The staging table is a temporary table of the connection, created once and
+    emptied at every commit, so pooled connections reuse it.
+
+    Args:
+        session: Session on the vector database (psycopg2 or psycopg 3 driver).
+        collection_id: Collection of the rows.
+        ids (list[str]): Chunk ids.
+        texts (list[str]): Chunk texts.
+        vectors: Embeddings, as lists or a 2-D NumPy array.
+        metadatas (list[dict]): Chunk metadata.
+    """
+    payload = encode_rows(collection_id, ids, texts, vectors, metadatas)
+    connection = session.connection()
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} (id varchar, collection_id uuid, embedding vector, "
+            f"document varchar, cmetadata jsonb) ON COMMIT DELETE ROWS"
+        )
+        # Rows of an earlier batch of this transaction
+        cursor.execute(f"DELETE FROM {STAGE_TABLE}")
+        _copy(cursor, f"COPY {STAGE_TABLE} ({STAGE_COLUMNS}) FROM STDIN (FORMAT BINARY)", payload)
+    finally:
+        cursor.close()
+    connection.execute(text(merge_sql()))
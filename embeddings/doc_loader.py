@@ -1,30 +1,38 @@
 from langchain_community.document_loaders import S3FileLoader
+from langchain_core.documents import Document
 from embeddings.embedding_settings import Settings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from embeddings.fast_splitter import FastRecursiveSplitter, SEPARATORS
+from embeddings.parsers import get_parser
 import uuid
-from embeddings.helper_functions import get_db, add_file_associated_ids
+from embeddings.helper_functions import get_db, add_file_associated_ids, content_hash
+from defaults.s3_client import s3_client
+import os
 import re
+import tempfile
 
 settings = Settings()
 S3_BUCKET_NAME = settings.S3_BUCKET_NAME
 
-separators=[
-        "\n\n",
-        "\n",
-        " ",
-        ".",
-        ",",
-        "\u200b",  # Zero-width space
-        "\uff0c",  # Fullwidth comma
-        "\u3001",  # Ideographic comma
-        "\uff0e",  # Fullwidth full stop
-        "\u3002",  # Ideographic full stop
-        "",
-    ]
-
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000,
-                                chunk_overlap=100,
-                                separators=separators)
+separators = SEPARATORS
+
+def build_text_splitter():
+    """
+    Build the splitter selected by TEXT_SPLITTER_ENGINE ("fast" or "langchain").
+    Both use chunk_size=1000, chunk_overlap=100 and the same separators.
+    """
+    if settings.TEXT_SPLITTER_ENGINE == "langchain":
+        return RecursiveCharacterTextSplitter(chunk_size=1000,
+                                    chunk_overlap=100,
+                                    separators=separators)
+    return FastRecursiveSplitter(chunk_size=1000,
+                                 chunk_overlap=100,
+                                 separators=separators)
+
+text_splitter = build_text_splitter()
+
+# The fast engine cleans while it splits, so the per-chunk clean pass is skipped
+SPLITTER_CLEANS = getattr(text_splitter, "clean", False)
 
 def generate_unique_ids(n: int):
         """
@@ -43,30 +51,143 @@ def clean_string(s: str) -> str:
     s = s.replace('\u00A0', ' ')  # non-breaking space to regular space
     return s
 
-def extract_text_from_s3_file(key: str, source_id: str):
+def finish_chunk(s: str) -> str:
+    """
+    Clean a chunk unless the splitter already did.
+    """
+    return s if SPLITTER_CLEANS else clean_string(s)
+
+def fast_parser_for(mime_type: str | None, key: str):
+    """
+    Return the lightweight parser for simple formats, or None to use unstructured.
+    """
+    if not settings.INGEST_FAST_PARSERS:
+        return None
+    return get_parser(mime_type, key)
+
+def load_clean_splits(key: str, mime_type: str | None = None):
+    """
+    CPU-bound stage of ingestion: download, parse, split and clean a file.
+
+    Kept free of database access so it can run in a worker process.
+
+    :param key: S3 key of the file
+    :param mime_type: MIME type recorded at upload; simple formats skip unstructured
+    :return: List of cleaned Document splits
+    """
+    if fast_parser_for(mime_type, key) is not None:
+        splits = list(iter_clean_splits(key, mime_type))
+        if not splits:
+            raise ValueError("No text found in the file.")
+        return splits
+
     loader = S3FileLoader(S3_BUCKET_NAME, key)
 
     splits = loader.load_and_split(text_splitter=text_splitter)
     if not splits:
         raise ValueError("No text found in the file.")
     
-    for i, item in enumerate(splits):
-        item.page_content = clean_string(item.page_content)
-    
-    ids = generate_unique_ids(len(splits))
+    if not SPLITTER_CLEANS:
+        for i, item in enumerate(splits):
+            item.page_content = clean_string(item.page_content)
+
+    return splits
 
-    source_id_map = {
-        "source_id": source_id,
-        "associated_ids": ids
-    }
+def chunk_id(source_id, ordinal: int, hash_value: str) -> str:
+    """
+    Deterministic id of a split: uuid5 in the namespace of the file, named by
+    the split's position and content hash. Re-processing the same file yields
+    the same ids, so retries upsert instead of duplicating.
+
+    :param source_id: file_id the split belongs to
+    :param ordinal: Position of the split in the file
+    :param hash_value: content_hash of the split text
+    :return: The id as a string
+    """
+    return str(uuid.uuid5(uuid.UUID(str(source_id)), f"{ordinal}:{hash_value}"))
+
+def register_split_ids(splits, source_id: str, start: int = 0):
+    """
+    I/O-bound stage of ingestion: assign deterministic ids to the splits and
+    record them against the source file. Ids already recorded are skipped.
+
+    :param splits: List of Document splits, updated in place
+    :param source_id: file_id the splits belong to
+    :param start: Ordinal of the first split, for files registered in windows
+    :return: The same splits
+    """
+    hashes = [content_hash(item.page_content) for item in splits]
+    ids = [chunk_id(source_id, start + i, hash_value) for i, hash_value in enumerate(hashes)]
 
     for i, item in enumerate(splits):
         item.metadata.update({"id": ids[i]})
 
     db = next(get_db())
-    source_id = source_id_map["source_id"]
-    split_ids = source_id_map["associated_ids"]  # Example splits
+    add_file_associated_ids(source_id, ids, db, hashes=hashes)
+
+    return splits
+
+def extract_text_from_s3_file(key: str, source_id: str):
+    splits = load_clean_splits(key)
+    return register_split_ids(splits, source_id)
+
+def iter_file_segments(path: str, mime_type: str | None = None):
+    """
+    Yield the text segments of a local file: through a fast-path parser for
+    simple formats, otherwise each element unstructured extracts.
+    """
+    parser = fast_parser_for(mime_type, path)
+    if parser is not None:
+        yield from parser(path)
+        return
+
+    from unstructured.partition.auto import partition
+
+    for element in partition(filename=path):
+        yield str(element)
+
+def split_text_stream(segments, metadata: dict, buffer_chars: int):
+    """
+    Split a stream of text segments into cleaned Documents without holding the
+    whole text. Segments are joined the way S3FileLoader joins elements; once
+    the buffer reaches buffer_chars it is split and every chunk but the last is
+    yielded. The last chunk is carried into the next buffer, so no text is lost
+    or duplicated at buffer boundaries.
+
+    :param segments: Iterable of text segments in document order
+    :param metadata: Metadata copied onto every split
+    :param buffer_chars: Characters to accumulate before splitting
+    """
+    buffer = []
+    size = 0
+    for segment in segments:
+        buffer.append(segment)
+        size += len(segment)
+        if size < buffer_chars:
+            continue
+        chunks = text_splitter.split_text("\n\n".join(buffer))
+        for chunk in chunks[:-1]:
+            yield Document(page_content=finish_chunk(chunk), metadata=dict(metadata))
+        buffer = chunks[-1:]
+        size = sum(len(chunk) for chunk in buffer)
+
+    if buffer:
+        for chunk in text_splitter.split_text("\n\n".join(buffer)):
+            yield Document(page_content=finish_chunk(chunk), metadata=dict(metadata))
 
-    add_file_associated_ids(source_id, split_ids, db)
+def iter_clean_splits(key: str, mime_type: str | None = None,
+                      buffer_chars: int = settings.INGEST_STREAM_BUFFER_CHARS):
+    """
+    Streaming counterpart of load_clean_splits: the object is downloaded to a
+    temporary file in chunks and cleaned splits are yielded as parsing
+    progresses, instead of building the full list of splits in memory.
 
-    return splits
\ No newline at end of file
+    :param key: S3 key of the file
+    :param mime_type: MIME type recorded at upload, selects the parser
+    :param buffer_chars: Characters of extracted text to buffer before splitting
+    """
+    metadata = {"source": f"s3://{S3_BUCKET_NAME}/{key}"}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, os.path.basename(key))
+        s3_client.download_file(S3_BUCKET_NAME, key, path)
+        yield from split_text_stream(iter_file_segments(path, mime_type), metadata, buffer_chars)
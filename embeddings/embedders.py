@@ -0,0 +1,211 @@
+import hashlib
+import math
+import re
+import threading
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+# Embedding backends, selected by the 'provider' row of the embedding_model table.
+# A builder takes the embedding_model values as a dict and returns an Embeddings.
+EMBEDDERS = {}
+
+def register_embedder(name: str):
+    """
+    Register a builder under a provider name.
+    """
+    def decorator(builder):
+        EMBEDDERS[name] = builder
+        return builder
+    return decorator
+
+def build_embedder(provider: str, config: dict) -> Embeddings:
+    """
+    Build the embedder for a provider.
+
+    Args:
+        provider (str): Registered provider name, e.g. "bedrock", "local" or "hashing".
+        config (dict): Values of the embedding_model table (model_name, region, dimensions, ...).
+
+    Returns:
+        Embeddings: The embedder.
+
+    Raises:
+        ValueError: If the provider is unknown or its configuration is incomplete.
+    """
+    builder = EMBEDDERS.get((provider or "bedrock").lower())
+    if builder is None:
+        raise ValueError(f"Unknown embedding provider '{provider}'. Available: {', '.join(sorted(EMBEDDERS))}.")
+    return builder(config)
+
+def embedder_model_id(provider: str, config: dict) -> str:
+    """
+    Identity of the vectors an embedder produces, used to key the embedding cache.
+    Bedrock keeps the bare model id so existing cache entries stay valid; the
+    other providers are keyed on the model they actually load.
+    """
+    provider = (provider or "bedrock").lower()
+    if provider == "bedrock":
+        return config.get("model_name")
+    if provider == "local":
+        return f"local:{local_model_name(config)}"
+    if provider == "hashing":
+        return f"hashing:{config.get('dimensions') or HashingEmbeddings.DEFAULT_DIMENSIONS}"
+    return f"{provider}:{config.get('model_name')}"
+
+# Vector size of the Bedrock embedding models, by model id without its version suffix
+BEDROCK_DIMENSIONS = {
+    "amazon.titan-embed-text-v1": 1536,
+    "amazon.titan-embed-g1-text-02": 1536,
+    "amazon.titan-embed-text-v2": 1024,
+    "amazon.titan-embed-image-v1": 1024,
+    "cohere.embed-english-v3": 1024,
+    "cohere.embed-multilingual-v3": 1024,
+}
+
+def embedder_dimensions(provider: str, config: dict, embeddings: Embeddings) -> int:
+    """
+    Vector size an embedder produces: the known size of its model, else the
+    size of one probe embedding.
+    """
+    provider = (provider or "bedrock").lower()
+    embeddings = getattr(embeddings, "embeddings", embeddings)
+    if provider == "bedrock":
+        dimensions = BEDROCK_DIMENSIONS.get((config.get("model_name") or "").split(":")[0])
+    else:
+        dimensions = getattr(embeddings, "dimensions", None)
+    if dimensions:
+        return int(dimensions)
+    return len(embeddings.embed_query("dimensions"))
+
+def is_symmetric(embeddings: Embeddings) -> bool:
+    """
+    Whether embed_query(text) == embed_documents([text])[0] for an embedder (or
+    the model behind a cache), so that queries can be embedded as one batch.
+    Unknown models are assumed not to be: some embed queries with a different
+    input type.
+    """
+    return getattr(getattr(embeddings, "embeddings", embeddings), "symmetric", False)
+
+@register_embedder("bedrock")
+def _build_bedrock(config: dict) -> Embeddings:
+    from langchain_aws import BedrockEmbeddings
+
+    if not config.get("model_name") or not config.get("region"):
+        raise ValueError("Model name or region not found in the database or environment variables.")
+    return BedrockEmbeddings(
+        credentials_profile_name=config.get("credentials_profile_name"),
+        region_name=config.get("region"),
+        model_id=config.get("model_name")
+    )
+
+class LocalEmbeddings(Embeddings):
+    """
+    Sentence-transformers model running in-process on the CPU (or a GPU if
+    device says so). Texts are encoded in batches of batch_size. The model is
+    loaded on first use, so importing the settings stays cheap.
+
+    Requires the optional 'sentence-transformers' package.
+    """
+
+    DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+    # Queries are embedded like documents, so a batch of queries is one encode call
+    symmetric = True
+
+    def __init__(self, model_name: str | None = None, batch_size: int = 32, device: str = "cpu"):
+        self.model_name = model_name or self.DEFAULT_MODEL
+        self.batch_size = batch_size
+        self.device = device
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+                    except ImportError as e:
+                        raise ImportError(
+                            "The 'local' embedding provider requires sentence-transformers: "
+                            "pip install sentence-transformers"
+                        ) from e
+                    self._model = SentenceTransformer(self.model_name, device=self.device)
+        return self._model
+
+    @property
+    def dimensions(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        vectors = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+def local_model_name(config: dict) -> str:
+    """
+    Sentence-transformers model of the 'local' provider. It has its own setting:
+    model_name holds the Bedrock model id.
+    """
+    return config.get("local_model_name") or LocalEmbeddings.DEFAULT_MODEL
+
+@register_embedder("local")
+def _build_local(config: dict) -> Embeddings:
+    return LocalEmbeddings(
+        model_name=local_model_name(config),
+        batch_size=int(config.get("batch_size") or 32),
+        device=config.get("device") or "cpu",
+    )
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic, dependency-free embedder for tests and load tests.
+
+    Each token is hashed into one of `dimensions` buckets with a +/-1 sign
+    (the hashing trick) and the result is L2-normalised, so texts sharing words
+    get similar vectors and identical texts always get identical ones, in any
+    process. Text without word characters gets a vector derived from its digest.
+    """
+
+    DEFAULT_DIMENSIONS = 1024
+    TOKEN = re.compile(r"\w+")
+    symmetric = True
+
+    def __init__(self, dimensions: int = DEFAULT_DIMENSIONS):
+        if dimensions < 1:
+            raise ValueError("dimensions must be at least 1.")
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> list[float]:
+        vector = [0.0] * self.dimensions
+        for token in self.TOKEN.findall(text.lower()):
+            digest = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[(digest >> 1) % self.dimensions] += 1.0 if digest & 1 else -1.0
+
+        norm = math.sqrt(sum(value * value for value in vector))
+        if not norm:
+            noise = array("H", hashlib.shake_256(text.encode("utf-8")).digest(2 * self.dimensions))
+            vector = [value / 32767.5 - 1.0 for value in noise]
+            norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+@register_embedder("hashing")
+def _build_hashing(config: dict) -> Embeddings:
+    return HashingEmbeddings(dimensions=int(config.get("dimensions") or HashingEmbeddings.DEFAULT_DIMENSIONS))
@@ -0,0 +1,337 @@
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import threading
+import time
+import unicodedata
+
+from langchain_core.embeddings import Embeddings
+from sqlalchemy.dialects.postgresql import insert
+
+from database.create_schema import EmbeddingCache
+from embeddings.helper_functions import db_session, content_hash
+
+# Keep IN lists well below the Postgres bind parameter limit
+LOOKUP_BATCH_SIZE = 1000
+
+def pack_vector(vector) -> bytes:
+    """
+    Pack a vector into float32 bytes.
+    """
+    return array("f", vector).tobytes()
+
+def unpack_vector(blob: bytes) -> list[float]:
+    """
+    Unpack float32 bytes produced by pack_vector.
+    """
+    values = array("f")
+    values.frombytes(blob)
+    return values.tolist()
+
+class VectorLRU:
+    """
+    Thread-safe LRU of content hash -> packed vector, evicted by total payload size.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is not None:
+                self._entries.move_to_end(key)
+            return blob
+
+    def put(self, key: str, blob: bytes) -> None:
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.nbytes -= len(previous)
+            self._entries[key] = blob
+            self.nbytes += len(blob)
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class CachedEmbeddings(Embeddings):
+    """
+    Content-addressed cache in front of an embedding model.
+
+    Vectors are keyed by (model_id, sha256 of the cleaned chunk). Lookups go to the
+    in-process LRU first, then to the embedding_cache table, and only the remaining
+    misses are sent to the wrapped model. New vectors are written back to both tiers.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_id: str, max_bytes: int, persist: bool = True):
+        self.embeddings = embeddings
+        self.model_id = model_id
+        self.persist = persist
+        self.lru = VectorLRU(max_bytes)
+        self._counter_lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _count(self, memory_hits: int = 0, db_hits: int = 0, misses: int = 0) -> None:
+        with self._counter_lock:
+            self.memory_hits += memory_hits
+            self.db_hits += db_hits
+            self.misses += misses
+
+    def _load_from_db(self, hashes: list[str]) -> dict[str, bytes]:
+        found = {}
+        try:
+            with db_session() as db:
+                for start in range(0, len(hashes), LOOKUP_BATCH_SIZE):
+                    batch = hashes[start:start + LOOKUP_BATCH_SIZE]
+                    rows = db.query(EmbeddingCache.content_hash, EmbeddingCache.vector).filter(
+                        EmbeddingCache.model_id == self.model_id,
+                        EmbeddingCache.content_hash.in_(batch),
+                    ).all()
+                    found.update((row[0], bytes(row[1])) for row in rows)
+        except Exception as e:
+            # The cache must never fail ingestion; fall through to the model
+            print("Error reading embedding cache:", e)
+        return found
+
+    def _store_in_db(self, blobs: dict[str, bytes]) -> None:
+        try:
+            with db_session() as db:
+                rows = [
+                    {"model_id": self.model_id, "content_hash": key, "vector": blob}
+                    for key, blob in blobs.items()
+                ]
+                for start in range(0, len(rows), LOOKUP_BATCH_SIZE):
+                    stmt = insert(EmbeddingCache).values(rows[start:start + LOOKUP_BATCH_SIZE])
+                    db.execute(stmt.on_conflict_do_nothing(index_elements=["model_id", "content_hash"]))
+                db.commit()
+        except Exception as e:
+            print("Error writing embedding cache:", e)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = [None] * len(texts)
+        pending = {}  # content hash -> indexes of texts waiting for that vector
+
+        memory_hits = 0
+        for i, text in enumerate(texts):
+            key = content_hash(text)
+            blob = self.lru.get(key)
+            if blob is not None:
+                vectors[i] = unpack_vector(blob)
+                memory_hits += 1
+            else:
+                pending.setdefault(key, []).append(i)
+
+        db_hits = 0
+        if pending and self.persist:
+            for key, blob in self._load_from_db(list(pending)).items():
+                self.lru.put(key, blob)
+                vector = unpack_vector(blob)
+                for i in pending.pop(key):
+                    vectors[i] = vector
+                    db_hits += 1
+
+        if pending:
+            keys = list(pending)
+            computed = self.embeddings.embed_documents([texts[pending[key][0]] for key in keys])
+            blobs = {}
+            for key, vector in zip(keys, computed):
+                blob = pack_vector(vector)
+                blobs[key] = blob
+                self.lru.put(key, blob)
+                for i in pending[key]:
+                    vectors[i] = list(vector)
+            if self.persist:
+                self._store_in_db(blobs)
+
+        # misses counts distinct texts sent to the model, i.e. embedding calls paid for
+        self._count(memory_hits=memory_hits, db_hits=db_hits, misses=len(pending))
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        # Some models embed queries differently from documents, so queries bypass this cache
+        return self.embeddings.embed_query(text)
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters and LRU occupancy.
+        """
+        with self._counter_lock:
+            hits = self.memory_hits + self.db_hits
+            lookups = hits + self.misses
+            return {
+                "model_id": self.model_id,
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "lru_entries": len(self.lru),
+                "lru_bytes": self.lru.nbytes,
+                "lru_max_bytes": self.lru.max_bytes,
+            }
+
+class QueryEmbeddingCache:
+    """
+    LRU + TTL cache of normalised query text -> query vector, for search traffic.
+
+    Keyed by the model id, so switching the embedding model never serves stale
+    vectors. With shared=True, misses of the in-process tier are looked up in
+    the embedding_cache table under a separate "query:<model id>" namespace
+    (queries may be embedded differently from documents), so all replicas
+    share the vectors; the TTL applies there too.
+    """
+
+    # Expired shared entries are purged every this many writes
+    PRUNE_EVERY = 1000
+
+    def __init__(self, model_id: str, max_entries: int, ttl_seconds: float, shared: bool = False,
+                 casefold: bool = False):
+        self.model_id = model_id
+        self.namespace = f"query:{model_id}"
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared = shared
+        self.casefold = casefold
+        self._entries = OrderedDict()  # key -> (expiry, packed vector)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self._writes = 0
+
+    def normalize(self, text: str) -> str:
+        text = " ".join(unicodedata.normalize("NFKC", text).split())
+        return text.casefold() if self.casefold else text
+
+    def key(self, text: str) -> str:
+        return content_hash(self.normalize(text))
+
+    def _get_local(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.expired += 1
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _put_local(self, key: str, blob: bytes) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, blob)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_shared(self, key: str) -> bytes | None:
+        try:
+            with db_session() as db:
+                row = db.query(EmbeddingCache.vector).filter(
+                    EmbeddingCache.model_id == self.namespace,
+                    EmbeddingCache.content_hash == key,
+                    EmbeddingCache.created_at > datetime.utcnow() - timedelta(seconds=self.ttl_seconds),
+                ).first()
+            return bytes(row[0]) if row is not None else None
+        except Exception as e:
+            # The cache must never fail a search; fall through to the model
+            print("Error reading query embedding cache:", e)
+            return None
+
+    def _put_shared(self, key: str, blob: bytes) -> None:
+        try:
+            with db_session() as db:
+                now = datetime.utcnow()
+                stmt = insert(EmbeddingCache).values(
+                    model_id=self.namespace, content_hash=key, vector=blob, created_at=now
+                )
+                db.execute(stmt.on_conflict_do_update(
+                    index_elements=["model_id", "content_hash"],
+                    set_={"vector": stmt.excluded.vector, "created_at": stmt.excluded.created_at},
+                ))
+                with self._lock:
+                    self._writes += 1
+                    prune = self._writes % self.PRUNE_EVERY == 0
+                if prune:
+                    db.query(EmbeddingCache).filter(
+                        EmbeddingCache.model_id == self.namespace,
+                        EmbeddingCache.created_at <= now - timedelta(seconds=self.ttl_seconds),
+                    ).delete(synchronize_session=False)
+                db.commit()
+        except Exception as e:
+            print("Error writing query embedding cache:", e)
+
+    def lookup(self, text: str) -> list[float] | None:
+        """
+        Return the cached vector of a query, or None (counted as a miss).
+        """
+        key = self.key(text)
+        blob = self._get_local(key)
+        if blob is not None:
+            with self._lock:
+                self.memory_hits += 1
+            return unpack_vector(blob)
+
+        if self.shared:
+            blob = self._get_shared(key)
+            if blob is not None:
+                self._put_local(key, blob)
+                with self._lock:
+                    self.shared_hits += 1
+                return unpack_vector(blob)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def store(self, text: str, vector) -> None:
+        key = self.key(text)
+        blob = pack_vector(vector)
+        self._put_local(key, blob)
+        if self.shared:
+            self._put_shared(key, blob)
+
+    def get_or_embed(self, text: str, embed_query) -> list[float]:
+        """
+        Return the cached vector of a query, or embed it with embed_query and cache it.
+        """
+        vector = self.lookup(text)
+        if vector is None:
+            vector = list(embed_query(text))
+            self.store(text, vector)
+        return vector
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters and occupancy.
+        """
+        with self._lock:
+            hits = self.memory_hits + self.shared_hits
+            lookups = hits + self.misses
+            return {
+                "model_id": self.model_id,
+                "memory_hits": self.memory_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "expired": self.expired,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "shared": self.shared,
+            }
@@ -1,20 +1,13 @@
 from dotenv import load_dotenv
 import os
+import threading
 from defaults.s3_client import S3_BUCKET_NAME
-from embeddings.helper_functions import get_embedding_value_by_field_name, get_db
-from langchain_aws import BedrockEmbeddings
+from embeddings.helper_functions import get_embedding_value_by_field_name, db_session
+from embeddings.embedding_cache import CachedEmbeddings, QueryEmbeddingCache
+from embeddings.embedders import build_embedder, embedder_dimensions, embedder_model_id
 
 load_dotenv(override=True)
 
-# inside any FastAPI route or other internal function
-db = next(get_db())  # assuming get_db() is your session generator
-try:
-    model_name = get_embedding_value_by_field_name("model_name", db) or os.environ.get("EMBEDDING_MODEL")
-    region_name = get_embedding_value_by_field_name("region", db) or os.environ.get("EMBEDDING_MODEL_REGION")
-except ValueError as e:
-    print("Error: ", str(e))
-    raise ValueError("Model name or region not found in the database or environment variables.")
-
 DB_HOST=os.environ.get("DB_HOST")
 DB_PORT=os.environ.get("DB_PORT")
 DB_NAME=os.environ.get("PG_VECTOR_DB_NAME")
@@ -25,15 +18,248 @@ DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NA
 
 credentials_profile_name=os.environ.get("CREDENTIAL_PROFILE_NAME")
 
-embeddings = BedrockEmbeddings(
-    credentials_profile_name=credentials_profile_name, 
-    region_name=region_name,
-    model_id=model_name
-)
+# Ingestion execution: "process" runs parse/split/clean in a process pool,
+# "thread" runs it in the shared I/O thread pool, "inline" runs it on the event loop.
+INGEST_EXECUTION_MODE=os.environ.get("INGEST_EXECUTION_MODE", "process").lower()
+INGEST_PROCESS_WORKERS=int(os.environ.get("INGEST_PROCESS_WORKERS") or os.cpu_count() or 1)
+INGEST_PROCESS_START_METHOD=os.environ.get("INGEST_PROCESS_START_METHOD") or None
+INGEST_THREAD_WORKERS=int(os.environ.get("INGEST_THREAD_WORKERS", "16"))
+
+# Text splitter engine: "fast" (fused split + clean) or "langchain"
+TEXT_SPLITTER_ENGINE=os.environ.get("TEXT_SPLITTER_ENGINE", "fast").lower()
+
+# Parse plain text, Markdown, CSV, JSON and HTML without unstructured
+INGEST_FAST_PARSERS=os.environ.get("INGEST_FAST_PARSERS", "True").lower() in ("true", "1", "t", "yes")
+
+# Page-parallel PDF extraction; 0 pages disables it
+PDF_PARALLEL_MIN_PAGES=int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "40"))
+PDF_PARALLEL_WORKERS=int(os.environ.get("PDF_PARALLEL_WORKERS") or INGEST_PROCESS_WORKERS)
+
+# Streaming ingestion for large files; 0 disables it
+INGEST_STREAMING_MIN_BYTES=int(os.environ.get("INGEST_STREAMING_MIN_BYTES", str(50 * 1024 * 1024)))
+INGEST_STREAM_WINDOW_SIZE=int(os.environ.get("INGEST_STREAM_WINDOW_SIZE", "256"))
+INGEST_STREAM_QUEUE_DEPTH=int(os.environ.get("INGEST_STREAM_QUEUE_DEPTH", "2"))
+INGEST_STREAM_BUFFER_CHARS=int(os.environ.get("INGEST_STREAM_BUFFER_CHARS", "100000"))
+
+# Checkpointed embedding jobs
+EMBED_JOB_RESUME_ON_STARTUP=os.environ.get("EMBED_JOB_RESUME_ON_STARTUP", "True").lower() in ("true", "1", "t", "yes")
+EMBED_JOB_LEASE_SECONDS=int(os.environ.get("EMBED_JOB_LEASE_SECONDS", "120"))
+EMBED_JOB_MAX_CONCURRENT_FILES=int(os.environ.get("EMBED_JOB_MAX_CONCURRENT_FILES", "4"))
+
+# Content-addressed embedding cache (Postgres table fronted by an in-process LRU)
+EMBEDDING_CACHE_ENABLED=os.environ.get("EMBEDDING_CACHE_ENABLED", "True").lower() in ("true", "1", "t", "yes")
+EMBEDDING_CACHE_MAX_BYTES=int(os.environ.get("EMBEDDING_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Query-embedding cache for search traffic (in-process LRU + TTL, optionally shared through embedding_cache)
+QUERY_CACHE_ENABLED=os.environ.get("QUERY_CACHE_ENABLED", "True").lower() in ("true", "1", "t", "yes")
+QUERY_CACHE_MAX_ENTRIES=int(os.environ.get("QUERY_CACHE_MAX_ENTRIES", "10000"))
+QUERY_CACHE_TTL_SECONDS=float(os.environ.get("QUERY_CACHE_TTL_SECONDS", "3600"))
+QUERY_CACHE_SHARED=os.environ.get("QUERY_CACHE_SHARED", "False").lower() in ("true", "1", "t", "yes")
+QUERY_CACHE_CASEFOLD=os.environ.get("QUERY_CACHE_CASEFOLD", "False").lower() in ("true", "1", "t", "yes")
+
+# Candidates per requested result taken from a compact (halfvec/binary) index before the exact re-rank
+VECTOR_RERANK_FACTOR=int(os.environ.get("VECTOR_RERANK_FACTOR", "4"))
+
+# ANN index per collection: "hnsw" or "ivfflat"; IVFFLAT_LISTS 0 picks lists from the row count
+VECTOR_INDEX_METHOD=os.environ.get("VECTOR_INDEX_METHOD", "hnsw").lower()
+VECTOR_INDEX_HNSW_M=int(os.environ.get("VECTOR_INDEX_HNSW_M", "16"))
+VECTOR_INDEX_HNSW_EF_CONSTRUCTION=int(os.environ.get("VECTOR_INDEX_HNSW_EF_CONSTRUCTION", "64"))
+VECTOR_INDEX_IVFFLAT_LISTS=int(os.environ.get("VECTOR_INDEX_IVFFLAT_LISTS", "0"))
+VECTOR_IVFFLAT_PROBES=int(os.environ.get("VECTOR_IVFFLAT_PROBES", "10"))
+VECTOR_INDEX_MAINTENANCE_WORK_MEM=os.environ.get("VECTOR_INDEX_MAINTENANCE_WORK_MEM", "")
+VECTOR_INDEX_PREWARM=os.environ.get("VECTOR_INDEX_PREWARM", "True").lower() in ("true", "1", "t", "yes")
+VECTOR_INDEX_BULK_LOAD_MIN_FILES=int(os.environ.get("VECTOR_INDEX_BULK_LOAD_MIN_FILES", "0"))
+
+# Embedding writes of at least this many rows go through a binary COPY; 0 always uses INSERT
+VECTOR_COPY_MIN_ROWS=int(os.environ.get("VECTOR_COPY_MIN_ROWS", "100"))
+
+# Connection pool of the vector database (search, index and partition maintenance)
+VECTOR_DB_POOL_SIZE=int(os.environ.get("VECTOR_DB_POOL_SIZE", "10"))
+VECTOR_DB_MAX_OVERFLOW=int(os.environ.get("VECTOR_DB_MAX_OVERFLOW", "20"))
+
+# Server-side search on the publish router
+SEARCH_DEFAULT_K=int(os.environ.get("SEARCH_DEFAULT_K", "4"))
+SEARCH_MAX_K=int(os.environ.get("SEARCH_MAX_K", "100"))
+SEARCH_TARGET_CACHE_SECONDS=float(os.environ.get("SEARCH_TARGET_CACHE_SECONDS", "60"))
+SEARCH_BATCH_MAX_QUERIES=int(os.environ.get("SEARCH_BATCH_MAX_QUERIES", "50"))
+
+# Search-result cache, invalidated by per-collection write versions
+SEARCH_RESULT_CACHE_ENABLED=os.environ.get("SEARCH_RESULT_CACHE_ENABLED", "True").lower() in ("true", "1", "t", "yes")
+SEARCH_RESULT_CACHE_MAX_ENTRIES=int(os.environ.get("SEARCH_RESULT_CACHE_MAX_ENTRIES", "5000"))
+SEARCH_RESULT_CACHE_TTL_SECONDS=float(os.environ.get("SEARCH_RESULT_CACHE_TTL_SECONDS", "3600"))
+
+# Streaming export of a collection's chunks and vectors
+EXPORT_BATCH_SIZE=int(os.environ.get("EXPORT_BATCH_SIZE", "1000"))
+EXPORT_NPY_SHARD_ROWS=int(os.environ.get("EXPORT_NPY_SHARD_ROWS", "100000"))
+
+# Bulk import of precomputed embeddings
+IMPORT_BATCH_SIZE=int(os.environ.get("IMPORT_BATCH_SIZE", "1000"))
+
+# Hybrid (full-text + vector) search fused with reciprocal rank fusion
+HYBRID_SEARCH_ENABLED=os.environ.get("HYBRID_SEARCH_ENABLED", "True").lower() in ("true", "1", "t", "yes")
+HYBRID_TEXT_SEARCH_CONFIG=os.environ.get("HYBRID_TEXT_SEARCH_CONFIG", "simple")
+HYBRID_CANDIDATES=int(os.environ.get("HYBRID_CANDIDATES", "50"))
+HYBRID_RRF_K=int(os.environ.get("HYBRID_RRF_K", "60"))
+
+# Cross-file embedding micro-batcher
+EMBED_BATCH_MAX_SIZE=int(os.environ.get("EMBED_BATCH_MAX_SIZE", "64"))
+EMBED_BATCH_MAX_WAIT_MS=float(os.environ.get("EMBED_BATCH_MAX_WAIT_MS", "50"))
+EMBED_MAX_IN_FLIGHT=int(os.environ.get("EMBED_MAX_IN_FLIGHT", "8"))
+
+# The embedding model is read from the embedding_model table (then the
+# environment) and built on first use, not at import: importing the settings
+# needs neither the database nor the model's client libraries.
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+def embedding_model() -> dict:
+    """
+    Provider, config, embedder and query cache of the configured embedding model.
+
+    Returns:
+        dict: provider, config, embeddings and query_cache (None when disabled).
+
+    Raises:
+        ValueError: If the provider is unknown or its configuration is incomplete.
+    """
+    global _embedding_model
+    with _embedding_model_lock:
+        if _embedding_model is not None:
+            return _embedding_model
+
+        with db_session() as db:
+            def embedding_value(field_name: str, env_name: str):
+                # embedding_model row first, then the environment
+                try:
+                    value = get_embedding_value_by_field_name(field_name, db)
+                except ValueError:
+                    value = None
+                return value or os.environ.get(env_name)
+
+            # Embedding backend: "bedrock", "local" (sentence-transformers on this machine) or "hashing" (deterministic fake)
+            provider = (embedding_value("provider", "EMBEDDING_PROVIDER") or "bedrock").lower()
+            config = {
+                "model_name": embedding_value("model_name", "EMBEDDING_MODEL"),
+                "local_model_name": embedding_value("local_model_name", "EMBEDDING_LOCAL_MODEL"),
+                "region": embedding_value("region", "EMBEDDING_MODEL_REGION"),
+                "credentials_profile_name": credentials_profile_name,
+                "dimensions": embedding_value("dimensions", "EMBEDDING_DIMENSIONS"),
+                "batch_size": embedding_value("batch_size", "EMBEDDING_BATCH_SIZE"),
+                "device": embedding_value("device", "EMBEDDING_DEVICE"),
+            }
+
+        embeddings = build_embedder(provider, config)
+        if EMBEDDING_CACHE_ENABLED:
+            embeddings = CachedEmbeddings(embeddings, model_id=embedder_model_id(provider, config),
+                                          max_bytes=EMBEDDING_CACHE_MAX_BYTES)
+
+        query_cache = None
+        if QUERY_CACHE_ENABLED:
+            query_cache = QueryEmbeddingCache(
+                model_id=embedder_model_id(provider, config),
+                max_entries=QUERY_CACHE_MAX_ENTRIES,
+                ttl_seconds=QUERY_CACHE_TTL_SECONDS,
+                shared=QUERY_CACHE_SHARED,
+                casefold=QUERY_CACHE_CASEFOLD,
+            )
+
+        _embedding_model = {"provider": provider, "config": config, "embeddings": embeddings,
+                            "query_cache": query_cache}
+        return _embedding_model
+
+def embedding_dimensions() -> int:
+    """
+    Vector size of the configured embedding model, resolved once: the model's
+    known size, else that of one probe embedding.
+    """
+    model = embedding_model()
+    if model.get("dimensions") is None:
+        model["dimensions"] = embedder_dimensions(model["provider"], model["config"], model["embeddings"])
+    return model["dimensions"]
+
+def embedding_model_loaded() -> bool:
+    """
+    Whether the embedding model was built already.
+    """
+    return _embedding_model is not None
 
 class Settings:
     def __init__(self):
         self.S3_BUCKET_NAME = S3_BUCKET_NAME
         self.DATABASE_URL = DATABASE_URL
-        self.embeddings = embeddings
+        self.INGEST_EXECUTION_MODE = INGEST_EXECUTION_MODE
+        self.INGEST_PROCESS_WORKERS = INGEST_PROCESS_WORKERS
+        self.INGEST_PROCESS_START_METHOD = INGEST_PROCESS_START_METHOD
+        self.INGEST_THREAD_WORKERS = INGEST_THREAD_WORKERS
+        self.TEXT_SPLITTER_ENGINE = TEXT_SPLITTER_ENGINE
+        self.INGEST_FAST_PARSERS = INGEST_FAST_PARSERS
+        self.PDF_PARALLEL_MIN_PAGES = PDF_PARALLEL_MIN_PAGES
+        self.PDF_PARALLEL_WORKERS = PDF_PARALLEL_WORKERS
+        self.INGEST_STREAMING_MIN_BYTES = INGEST_STREAMING_MIN_BYTES
+        self.INGEST_STREAM_WINDOW_SIZE = INGEST_STREAM_WINDOW_SIZE
+        self.INGEST_STREAM_QUEUE_DEPTH = INGEST_STREAM_QUEUE_DEPTH
+        self.INGEST_STREAM_BUFFER_CHARS = INGEST_STREAM_BUFFER_CHARS
+        self.EMBED_JOB_RESUME_ON_STARTUP = EMBED_JOB_RESUME_ON_STARTUP
+        self.EMBED_JOB_LEASE_SECONDS = EMBED_JOB_LEASE_SECONDS
+        self.EMBED_JOB_MAX_CONCURRENT_FILES = EMBED_JOB_MAX_CONCURRENT_FILES
+        self.VECTOR_RERANK_FACTOR = VECTOR_RERANK_FACTOR
+        self.VECTOR_INDEX_METHOD = VECTOR_INDEX_METHOD
+        self.VECTOR_INDEX_HNSW_M = VECTOR_INDEX_HNSW_M
+        self.VECTOR_INDEX_HNSW_EF_CONSTRUCTION = VECTOR_INDEX_HNSW_EF_CONSTRUCTION
+        self.VECTOR_INDEX_IVFFLAT_LISTS = VECTOR_INDEX_IVFFLAT_LISTS
+        self.VECTOR_IVFFLAT_PROBES = VECTOR_IVFFLAT_PROBES
+        self.VECTOR_INDEX_MAINTENANCE_WORK_MEM = VECTOR_INDEX_MAINTENANCE_WORK_MEM
+        self.VECTOR_INDEX_PREWARM = VECTOR_INDEX_PREWARM
+        self.VECTOR_INDEX_BULK_LOAD_MIN_FILES = VECTOR_INDEX_BULK_LOAD_MIN_FILES
+        self.VECTOR_COPY_MIN_ROWS = VECTOR_COPY_MIN_ROWS
+        self.VECTOR_DB_POOL_SIZE = VECTOR_DB_POOL_SIZE
+        self.VECTOR_DB_MAX_OVERFLOW = VECTOR_DB_MAX_OVERFLOW
+        self.SEARCH_DEFAULT_K = SEARCH_DEFAULT_K
+        self.SEARCH_MAX_K = SEARCH_MAX_K
+        self.SEARCH_TARGET_CACHE_SECONDS = SEARCH_TARGET_CACHE_SECONDS
+        self.SEARCH_BATCH_MAX_QUERIES = SEARCH_BATCH_MAX_QUERIES
+        self.SEARCH_RESULT_CACHE_ENABLED = SEARCH_RESULT_CACHE_ENABLED
+        self.SEARCH_RESULT_CACHE_MAX_ENTRIES = SEARCH_RESULT_CACHE_MAX_ENTRIES
+        self.SEARCH_RESULT_CACHE_TTL_SECONDS = SEARCH_RESULT_CACHE_TTL_SECONDS
+        self.EXPORT_BATCH_SIZE = EXPORT_BATCH_SIZE
+        self.EXPORT_NPY_SHARD_ROWS = EXPORT_NPY_SHARD_ROWS
+        self.IMPORT_BATCH_SIZE = IMPORT_BATCH_SIZE
+        self.HYBRID_SEARCH_ENABLED = HYBRID_SEARCH_ENABLED
+        self.HYBRID_TEXT_SEARCH_CONFIG = HYBRID_TEXT_SEARCH_CONFIG
+        self.HYBRID_CANDIDATES = HYBRID_CANDIDATES
+        self.HYBRID_RRF_K = HYBRID_RRF_K
+        self.EMBED_BATCH_MAX_SIZE = EMBED_BATCH_MAX_SIZE
+        self.EMBED_BATCH_MAX_WAIT_MS = EMBED_BATCH_MAX_WAIT_MS
+        self.EMBED_MAX_IN_FLIGHT = EMBED_MAX_IN_FLIGHT
         
+
+    # Resolved on first access; an assignment overrides them for this instance only
+    @property
+    def EMBEDDING_PROVIDER(self) -> str:
+        if "EMBEDDING_PROVIDER" in self.__dict__:
+            return self.__dict__["EMBEDDING_PROVIDER"]
+        return embedding_model()["provider"]
+
+    @EMBEDDING_PROVIDER.setter
+    def EMBEDDING_PROVIDER(self, value):
+        self.__dict__["EMBEDDING_PROVIDER"] = value
+
+    @property
+    def embeddings(self):
+        if "embeddings" in self.__dict__:
+            return self.__dict__["embeddings"]
+        return embedding_model()["embeddings"]
+
+    @embeddings.setter
+    def embeddings(self, value):
+        self.__dict__["embeddings"] = value
+
+    @property
+    def query_cache(self):
+        if "query_cache" in self.__dict__:
+            return self.__dict__["query_cache"]
+        return embedding_model()["query_cache"]
+
+    @query_cache.setter
+    def query_cache(self, value):
+        self.__dict__["query_cache"] = value
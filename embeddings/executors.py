@@ -0,0 +1,102 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from embeddings.embedding_settings import Settings
+
+settings = Settings()
+
+EXECUTION_MODES = ("process", "thread", "inline")
+
+_cpu_executor = None
+_io_executor = None
+_lock = threading.Lock()
+
+def _init_process_worker():
+    """
+    Runs once in every worker process.
+
+    Forked workers inherit the parent's SQLAlchemy pool; drop those connections
+    without closing them so the parent's sockets are left untouched.
+    """
+    from defaults.db_engine import engine
+    engine.dispose(close=False)
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """
+    Return the shared thread pool used for I/O-bound ingestion stages
+    (S3, database writes, embedding calls).
+    """
+    global _io_executor
+    with _lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(
+                max_workers=settings.INGEST_THREAD_WORKERS,
+                thread_name_prefix="ingest-io",
+            )
+        return _io_executor
+
+def get_cpu_executor() -> Executor | None:
+    """
+    Return the executor used for CPU-bound ingestion stages (parse, split, clean).
+
+    Returns:
+        Executor | None: A process pool, the shared I/O thread pool, or None when
+        INGEST_EXECUTION_MODE is "inline".
+
+    Raises:
+        ValueError: If INGEST_EXECUTION_MODE is not a supported mode.
+    """
+    global _cpu_executor
+    mode = settings.INGEST_EXECUTION_MODE
+    if mode not in EXECUTION_MODES:
+        raise ValueError(f"Unsupported INGEST_EXECUTION_MODE '{mode}'. Expected one of {EXECUTION_MODES}.")
+    if mode == "inline":
+        return None
+    if mode == "thread":
+        return get_io_executor()
+
+    with _lock:
+        if _cpu_executor is None:
+            mp_context = None
+            if settings.INGEST_PROCESS_START_METHOD:
+                mp_context = multiprocessing.get_context(settings.INGEST_PROCESS_START_METHOD)
+            _cpu_executor = ProcessPoolExecutor(
+                max_workers=settings.INGEST_PROCESS_WORKERS,
+                mp_context=mp_context,
+                initializer=_init_process_worker,
+            )
+        return _cpu_executor
+
+async def run_cpu_bound(func, *args, **kwargs):
+    """
+    Run a CPU-bound callable off the event loop. The callable and its arguments
+    must be picklable when running in process mode.
+    """
+    executor = get_cpu_executor()
+    if executor is None:
+        return func(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+async def run_io_bound(func, *args, **kwargs):
+    """
+    Run a blocking I/O-bound callable in the shared thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_executor(), partial(func, *args, **kwargs))
+
+def shutdown_executors() -> None:
+    """
+    Shut down the ingestion pools. Called on application shutdown.
+    """
+    global _cpu_executor, _io_executor
+    with _lock:
+        if _cpu_executor is not None:
+            _cpu_executor.shutdown(wait=True, cancel_futures=True)
+            _cpu_executor = None
+        if _io_executor is not None:
+            _io_executor.shutdown(wait=True, cancel_futures=True)
+            _io_executor = None
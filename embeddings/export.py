@@ -0,0 +1,209 @@
+from array import array
+import io
+import json
+import uuid
+
+from sqlalchemy import select, text
+
+from database.create_schema import FileAssociatedId
+from embeddings.embedding_settings import Settings
+from embeddings.helper_functions import db_session
+from embeddings.quantized import EMBEDDING_TABLE
+from embeddings.vector_db import get_vector_engine
+
+settings = Settings()
+
+# Streaming export of a collection. Rows are read through a server-side cursor
+# in id order inside one REPEATABLE READ transaction, so memory stays flat, the
+# export is a consistent snapshot, and an interrupted export resumes from the
+# last id received (keyset pagination, no OFFSET).
+EXPORT_FORMATS = ("ndjson", "arrow", "npy")
+EXPORT_FIELDS = ("id", "document", "metadata", "embedding")
+# Chunk ids of a file_id filter, on the snapshot connection
+EXPORT_IDS_TABLE = "export_chunk_ids"
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "npy": "application/octet-stream",
+}
+
+def check_arrow() -> None:
+    """
+    Raises:
+        ImportError: If pyarrow is not installed.
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("Arrow export requires pyarrow: pip install pyarrow") from e
+
+def stage_file_chunk_ids(conn, file_ids: list) -> None:
+    """
+    Copy the chunk ids of the given files from the app database into a
+    temporary table of the export's snapshot connection, EXPORT_BATCH_SIZE
+    ids at a time, so a file filter costs no memory per chunk. ExportQuery
+    joins against it with staged_ids=True.
+    """
+    # The snapshot streams its reads through server-side cursors; these return no rows
+    def run(sql: str, params: dict | None = None):
+        conn.execute(text(sql), params or {}, execution_options={"stream_results": False})
+
+    run(f"CREATE TEMPORARY TABLE {EXPORT_IDS_TABLE} (id varchar PRIMARY KEY) ON COMMIT DROP")
+    with db_session() as db:
+        rows = db.execute(
+            select(FileAssociatedId.id_value).where(FileAssociatedId.file_id.in_(file_ids)),
+            execution_options={"yield_per": settings.EXPORT_BATCH_SIZE},
+        )
+        for batch in rows.partitions():
+            run(
+                f"INSERT INTO {EXPORT_IDS_TABLE} (id) SELECT unnest(CAST(:ids AS varchar[])) ON CONFLICT DO NOTHING",
+                {"ids": [row[0] for row in batch]},
+            )
+    run(f"ANALYZE {EXPORT_IDS_TABLE}")
+
+class ExportQuery:
+    """
+    Rows of a collection in id order, after an optional cursor, optionally
+    restricted to the chunk ids staged by stage_file_chunk_ids and capped at
+    limit rows.
+    """
+
+    def __init__(self, collection_id, after: str | None = None, staged_ids: bool = False,
+                 limit: int | None = None):
+        self.collection = f"'{uuid.UUID(str(collection_id))}'"
+        self.params = {}
+        self.where = f"collection_id = {self.collection}"
+        if after is not None:
+            self.where += " AND id > :after"
+            self.params["after"] = after
+        if staged_ids:
+            self.where += f" AND id IN (SELECT id FROM {EXPORT_IDS_TABLE})"
+        self.limit = ""
+        if limit:
+            self.limit = " LIMIT :limit"
+            self.params["limit"] = int(limit)
+
+    def rows_sql(self, columns: str) -> str:
+        return f"SELECT {columns} FROM {EMBEDDING_TABLE} WHERE {self.where} ORDER BY id{self.limit}"
+
+    def summary_sql(self) -> str:
+        # Row count, last id and dimension of what rows_sql returns
+        return (
+            f"SELECT count(*), max(id), max(vector_dims(embedding)) FROM ("
+            f"{self.rows_sql('id, embedding')}) s"
+        )
+
+def open_snapshot():
+    """
+    Connection on the vector database in a REPEATABLE READ transaction whose
+    queries stream through a server-side cursor. Every read of an export goes
+    through one snapshot, so the summary matches the rows streamed.
+    """
+    conn = get_vector_engine().connect().execution_options(
+        isolation_level="REPEATABLE READ", stream_results=True, max_row_buffer=settings.EXPORT_BATCH_SIZE
+    )
+    conn.begin()
+    return conn
+
+def export_summary(conn, query: ExportQuery) -> tuple[int, str | None, int | None]:
+    """
+    Return (rows, last id, dimension) of an export: the .npy header, and the
+    cursor to resume after once the export is received.
+    """
+    count, last_id, dims = conn.execute(text(query.summary_sql()), query.params).one()
+    return count, last_id, dims
+
+def _batches(conn, query: ExportQuery, columns: str):
+    result = conn.execute(text(query.rows_sql(columns)), query.params)
+    while True:
+        rows = result.fetchmany(settings.EXPORT_BATCH_SIZE)
+        if not rows:
+            return
+        yield rows
+
+def iter_ndjson(conn, query: ExportQuery, fields=EXPORT_FIELDS):
+    """
+    One JSON object per chunk and line. The vector text is passed through
+    from Postgres as-is (it is already a JSON array). Closes conn.
+    """
+    try:
+        for rows in _batches(conn, query, "id, document, cmetadata, embedding::text AS embedding"):
+            lines = []
+            for row in rows:
+                values = {"id": row.id}
+                if "document" in fields:
+                    values["document"] = row.document
+                if "metadata" in fields:
+                    values["metadata"] = row.cmetadata or {}
+                line = json.dumps(values)
+                if "embedding" in fields:
+                    line = f'{line[:-1]}, "embedding": {row.embedding}}}'
+                lines.append(line)
+            yield ("\n".join(lines) + "\n").encode()
+    finally:
+        conn.close()
+
+def npy_header(rows: int, dims: int) -> bytes:
+    """
+    Header of a version 1.0 .npy file holding a C-order (rows, dims) float32 array.
+    """
+    header = f"{{'descr': '<f4', 'fortran_order': False, 'shape': ({rows}, {dims}), }}"
+    # Magic (6) + version (2) + length (2) + header + newline, padded to 64 bytes
+    padding = -(10 + len(header) + 1) % 64
+    header = header + " " * padding + "\n"
+    return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode("latin1")
+
+def iter_npy(conn, query: ExportQuery, rows: int, dims: int):
+    """
+    The vectors of an export as one raw float32 .npy shard, in id order; rows
+    and dims come from export_summary on the same snapshot. Closes conn.
+    """
+    try:
+        yield npy_header(rows, dims)
+        for batch in _batches(conn, query, "embedding::real[] AS embedding"):
+            values = array("f")
+            for row in batch:
+                values.extend(row.embedding)
+            yield values.tobytes()
+    finally:
+        conn.close()
+
+def iter_arrow(conn, query: ExportQuery, dims: int, fields=EXPORT_FIELDS):
+    """
+    Arrow IPC stream, one record batch per EXPORT_BATCH_SIZE chunks. metadata
+    is a JSON string column; embedding a fixed-size list of float32. Closes conn.
+    """
+    import pyarrow as pa
+
+    columns = [pa.field("id", pa.string())]
+    if "document" in fields:
+        columns.append(pa.field("document", pa.string()))
+    if "metadata" in fields:
+        columns.append(pa.field("metadata", pa.string()))
+    if "embedding" in fields:
+        columns.append(pa.field("embedding", pa.list_(pa.float32(), dims)))
+    schema = pa.schema(columns)
+
+    sink = io.BytesIO()
+    try:
+        writer = pa.ipc.new_stream(sink, schema)
+        for rows in _batches(conn, query, "id, document, cmetadata, embedding::real[] AS embedding"):
+            arrays = [pa.array([row.id for row in rows], pa.string())]
+            if "document" in fields:
+                arrays.append(pa.array([row.document for row in rows], pa.string()))
+            if "metadata" in fields:
+                arrays.append(pa.array([json.dumps(row.cmetadata or {}) for row in rows], pa.string()))
+            if "embedding" in fields:
+                values = array("f")
+                for row in rows:
+                    values.extend(row.embedding)
+                arrays.append(pa.FixedSizeListArray.from_arrays(pa.array(values, pa.float32()), dims))
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+        writer.close()
+        yield sink.getvalue()
+    finally:
+        conn.close()
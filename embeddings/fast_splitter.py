@@ -0,0 +1,121 @@
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+import re
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+SEPARATORS = [
+    "\n\n",
+    "\n",
+    " ",
+    ".",
+    ",",
+    "\u200b",  # Zero-width space
+    "\uff0c",  # Fullwidth comma
+    "\u3001",  # Ideographic comma
+    "\uff0e",  # Fullwidth full stop
+    "\u3002",  # Ideographic full stop
+    "",
+]
+
+# Same cleanup as doc_loader.clean_string, applied once to the whole text:
+# drop NUL and control characters (except newline, tab, carriage return), NBSP -> space
+CONTROL_CHARS = re.compile(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]')
+
+def clean_text(text: str) -> str:
+    return CONTROL_CHARS.sub('', text).replace('\u00A0', ' ')
+
+class FastRecursiveSplitter(RecursiveCharacterTextSplitter):
+    """
+    Drop-in replacement for RecursiveCharacterTextSplitter with literal separators,
+    keep_separator=True and len as the length function.
+
+    Cleaning is fused into the split: the whole text is cleaned once before it is
+    split, instead of a replace/regex/replace pass over every chunk afterwards.
+    Pieces are never materialised as substrings; the splitter works on their offsets
+    in the text, finds chunk and overlap boundaries with bisect over prefix sums, and
+    slices each chunk out of the text exactly once.
+
+    For text without control characters or NBSPs the chunks are identical to the
+    langchain splitter. Otherwise chunk sizes are measured after cleaning, so a chunk
+    boundary can move by the number of characters removed.
+    """
+
+    def __init__(self, separators: list[str] | None = None, clean: bool = True, **kwargs):
+        kwargs.setdefault("keep_separator", True)
+        super().__init__(separators=separators or SEPARATORS, is_separator_regex=False, **kwargs)
+        self.clean = clean
+        self._fast_path = self._keep_separator is True and self._length_function is len
+
+    def split_text(self, text: str) -> list[str]:
+        if self.clean:
+            text = clean_text(text)
+        if not self._fast_path:
+            return super().split_text(text)
+        return self._fast_split(text, self._separators)
+
+    def _fast_split(self, text: str, separators: list[str]) -> list[str]:
+        separator = separators[-1]
+        new_separators = []
+        for i, candidate in enumerate(separators):
+            if not candidate:
+                separator = candidate
+                break
+            if candidate in text:
+                separator = candidate
+                new_separators = separators[i + 1:]
+                break
+
+        # Piece lengths with the separator kept at the start of every piece but the first
+        if separator:
+            separator_len = len(separator)
+            lengths = [len(part) + separator_len for part in text.split(separator)]
+            lengths[0] -= separator_len
+            if not lengths[0]:
+                lengths = lengths[1:]
+        else:
+            lengths = [1] * len(text)
+        offsets = list(accumulate(lengths, initial=0))
+
+        chunk_size = self._chunk_size
+        final_chunks = []
+        start = 0
+        for i in [i for i, length in enumerate(lengths) if length >= chunk_size]:
+            if i > start:
+                self._merge_run(text, offsets, start, i, final_chunks)
+            piece = text[offsets[i]:offsets[i + 1]]
+            if new_separators:
+                final_chunks.extend(self._fast_split(piece, new_separators))
+            else:
+                final_chunks.append(piece)
+            start = i + 1
+        if start < len(lengths):
+            self._merge_run(text, offsets, start, len(lengths), final_chunks)
+        return final_chunks
+
+    def _emit(self, chunk: str, out: list[str]) -> None:
+        if self._strip_whitespace:
+            chunk = chunk.strip()
+        if chunk:
+            out.append(chunk)
+
+    def _merge_run(self, text: str, offsets: list[int], lo: int, hi: int, out: list[str]) -> None:
+        """
+        Merge pieces lo..hi-1 (each shorter than chunk_size) into chunks, with the
+        same greedy fill and overlap rules as TextSplitter._merge_splits.
+        """
+        chunk_size = self._chunk_size
+        chunk_overlap = self._chunk_overlap
+        start = lo
+        while True:
+            # Last piece boundary that keeps the chunk within chunk_size
+            end = bisect_right(offsets, offsets[start] + chunk_size, start + 1, hi + 1) - 1
+            if end >= hi:
+                self._emit(text[offsets[start]:offsets[hi]], out)
+                return
+            self._emit(text[offsets[start]:offsets[end]], out)
+            # Drop pieces from the front until the rest fits in the overlap and
+            # leaves room for the next piece
+            keep_overlap = bisect_left(offsets, offsets[end] - chunk_overlap, start, end + 1)
+            make_room = bisect_left(offsets, offsets[end + 1] - chunk_size, start, end + 1)
+            start = max(keep_overlap, min(make_room, end))
@@ -1,20 +1,22 @@
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from defaults.db_engine import engine
+from defaults.db_engine import get_db
 from database.create_schema import EmbeddingModel
 from database.create_schema import Project
 import uuid
 from database.create_schema import FileAssociatedId
 from datetime import datetime
+from contextlib import contextmanager
+import hashlib
 
-# Database connection dependency
-def get_db():
-    from sqlalchemy.orm import sessionmaker
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Same session lifecycle as get_db, for use in a `with` block outside of routes
+db_session = contextmanager(get_db)
+
+def content_hash(text: str) -> str:
+    """
+    Return the sha256 hex digest of a (cleaned) chunk of text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 def get_embedding_value_by_field_name(field_name: str, db: Session) -> str:
     """
@@ -56,7 +58,26 @@ def get_vector_index_name_by_project_id(project_id: uuid.UUID, db: Session) -> s
         raise ValueError(f"Project '{project_id}' does not have a vector_index_name set.")
     return record.vector_index_name
 
-def add_file_associated_ids(source_id: uuid.UUID, ids: list[uuid.UUID], db: Session) -> None:
+def get_vector_storage_mode_by_project_id(project_id: uuid.UUID, db: Session) -> str:
+    """
+    Fetch the 'vector_storage_mode' for a given project_id from Project table.
+
+    Args:
+        project_id (uuid.UUID): The project ID to search for.
+        db (Session): SQLAlchemy session.
+
+    Returns:
+        str: The storage mode, "float32" when not set.
+
+    Raises:
+        ValueError: If the project does not exist.
+    """
+    record = db.query(Project.vector_storage_mode).filter(Project.project_id == project_id).first()
+    if record is None:
+        raise ValueError(f"Project '{project_id}' not found.")
+    return record[0] or "float32"
+
+def add_file_associated_ids(source_id: uuid.UUID, ids: list[uuid.UUID], db: Session, hashes: list[str] | None = None) -> None:
     """
     Insert multiple associated IDs for a given file_id into the FileAssociatedId table.
 
@@ -64,6 +85,7 @@ def add_file_associated_ids(source_id: uuid.UUID, ids: list[uuid.UUID], db: Sess
         source_id (uuid.UUID): The file_id from the files table.
         ids (list[uuid.UUID]): List of UUIDs representing the splits.
         db (Session): SQLAlchemy session.
+        hashes (list[str] | None): Content hash of each split, in the same order as ids.
 
     Raises:
         SQLAlchemyError: If insertion fails.
@@ -75,7 +97,7 @@ def add_file_associated_ids(source_id: uuid.UUID, ids: list[uuid.UUID], db: Sess
 
         existing_id_set = set(row[0] for row in existing_ids)
 
-        for split_id in ids:
+        for i, split_id in enumerate(ids):
             str_id = str(split_id)
             if str_id in existing_id_set:
                 continue
@@ -83,6 +105,7 @@ def add_file_associated_ids(source_id: uuid.UUID, ids: list[uuid.UUID], db: Sess
                 file_id=source_id,
                 id_value=str(split_id),
                 id_type="split_id",  # Static type, you can modify if needed
+                content_hash=hashes[i] if hashes else None,
                 created_at=datetime.utcnow()
             )
             db.add(db_entry)
@@ -93,3 +116,87 @@ def add_file_associated_ids(source_id: uuid.UUID, ids: list[uuid.UUID], db: Sess
         db.rollback()
         raise e
 
+def insert_file_associated_ids(source_id: uuid.UUID, ids: list[str], db: Session,
+                               hashes: list[str] | None = None) -> int:
+    """
+    Record a batch of split ids for a file with one multi-row INSERT, skipping
+    ids the file already has. Unlike add_file_associated_ids, only the given
+    ids are looked up, and the caller commits.
+
+    Args:
+        source_id (uuid.UUID): The file_id from the files table.
+        ids (list[str]): Split ids.
+        db (Session): SQLAlchemy session.
+        hashes (list[str] | None): Content hash of each split, in the same order as ids.
+
+    Returns:
+        int: Number of ids inserted.
+    """
+    existing = {row[0] for row in db.query(FileAssociatedId.id_value).filter(
+        FileAssociatedId.file_id == source_id,
+        FileAssociatedId.id_value.in_(ids),
+    ).all()}
+    rows = [
+        {
+            "file_id": source_id,
+            "id_value": str(split_id),
+            "id_type": "split_id",
+            "content_hash": hashes[i] if hashes else None,
+        }
+        for i, split_id in enumerate(ids)
+        if str(split_id) not in existing
+    ]
+    if rows:
+        db.execute(insert(FileAssociatedId), rows)
+    return len(rows)
+
+def get_file_associated_ids(source_id: uuid.UUID, db: Session) -> list[FileAssociatedId]:
+    """
+    Fetch the split records of a file.
+
+    Args:
+        source_id (uuid.UUID): The file_id from the files table.
+        db (Session): SQLAlchemy session.
+
+    Returns:
+        list[FileAssociatedId]: The file's split records.
+    """
+    return db.query(FileAssociatedId).filter(
+        FileAssociatedId.file_id == source_id,
+        FileAssociatedId.id_type == "split_id",
+    ).all()
+
+def sync_file_associated_ids(source_id: uuid.UUID, removed: list[str],
+                             backfilled: dict[str, str], db: Session) -> None:
+    """
+    Apply the removals and hash backfills of an incremental re-embed to the
+    FileAssociatedId table in one transaction. New split ids are recorded by
+    replace_embeddings, before the vector commit.
+
+    Args:
+        source_id (uuid.UUID): The file_id from the files table.
+        removed (list[str]): Split ids that no longer exist in the file.
+        backfilled (dict[str, str]): Existing split id -> content hash, for rows stored without one.
+        db (Session): SQLAlchemy session.
+
+    Raises:
+        SQLAlchemyError: If the update fails.
+    """
+    try:
+        if removed:
+            db.query(FileAssociatedId).filter(
+                FileAssociatedId.file_id == source_id,
+                FileAssociatedId.id_value.in_(removed),
+            ).delete(synchronize_session=False)
+
+        for id_value, hash_value in backfilled.items():
+            db.query(FileAssociatedId).filter(
+                FileAssociatedId.file_id == source_id,
+                FileAssociatedId.id_value == id_value,
+            ).update({"content_hash": hash_value}, synchronize_session=False)
+
+        db.commit()
+
+    except Exception as e:
+        db.rollback()
+        raise e
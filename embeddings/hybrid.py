@@ -0,0 +1,197 @@
+import argparse
+import json
+import re
+import uuid
+
+from sqlalchemy import cast, func, text
+from sqlalchemy.dialects.postgresql import REGCONFIG
+
+from embeddings.embedding_settings import Settings
+from embeddings.partitions import is_partitioned
+from embeddings.result_cache import bump_version
+from embeddings.quantized import (
+    EMBEDDING_TABLE, compact_expression, compact_operator, compact_query, set_search_params
+)
+from embeddings.vector_db import get_vector_engine
+
+settings = Settings()
+
+# Lexical side of hybrid search: a tsvector of each chunk, written next to its
+# vector by the write path and searched through a GIN index. The 'simple'
+# configuration does not stem, so identifiers, SKUs and error codes match as typed.
+# The column, its index and the tsvector of existing rows are added by an
+# explicit migration, never by a request:
+#
+#     python -m embeddings.hybrid enable
+LEXICAL_COLUMN = "document_tsv"
+LEXICAL_INDEX = "ix_document_tsv_gin"
+
+_lexical_ready = None
+
+def text_search_config() -> str:
+    config = settings.HYBRID_TEXT_SEARCH_CONFIG
+    if not re.fullmatch(r"\w+", config):
+        raise ValueError(f"Invalid text search configuration '{config}'.")
+    return config
+
+def lexical_expression(document_sql: str) -> str:
+    """
+    SQL expression of the tsvector of a document column or parameter.
+    """
+    return f"to_tsvector('{text_search_config()}'::regconfig, coalesce({document_sql}, ''))"
+
+def lexical_value(document: str):
+    """
+    SQLAlchemy expression of the tsvector of a document, for insert values.
+    """
+    return func.to_tsvector(cast(text_search_config(), REGCONFIG), document or "")
+
+def has_lexical_column(refresh: bool = False) -> bool:
+    """
+    Whether the embedding table has the tsvector column. Only a found column
+    is cached per process, so one added by the migration is picked up without
+    a restart.
+    """
+    global _lexical_ready
+    if not _lexical_ready or refresh:
+        with get_vector_engine().connect() as conn:
+            _lexical_ready = bool(conn.execute(text(
+                "SELECT 1 FROM pg_attribute WHERE attrelid = to_regclass(:table) "
+                "AND attname = :column AND NOT attisdropped"
+            ), {"table": EMBEDDING_TABLE, "column": LEXICAL_COLUMN}).scalar())
+    return _lexical_ready
+
+def ensure_lexical_column() -> bool:
+    """
+    Add the tsvector column and its GIN index when HYBRID_SEARCH_ENABLED is set.
+    Adding a nullable column is a catalog-only change. The index is built
+    CONCURRENTLY on the shared table; on a partitioned table it is created on
+    the parent, which builds it on every partition.
+
+    Returns:
+        bool: Whether the column exists.
+    """
+    if has_lexical_column() or not settings.HYBRID_SEARCH_ENABLED:
+        return has_lexical_column()
+    engine = get_vector_engine()
+    with engine.connect() as conn:
+        if not conn.execute(text("SELECT to_regclass(:table)"), {"table": EMBEDDING_TABLE}).scalar():
+            # PGVector creates the table on first use
+            return False
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {EMBEDDING_TABLE} ADD COLUMN IF NOT EXISTS {LEXICAL_COLUMN} tsvector"))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # CONCURRENTLY is not supported on partitioned tables
+        concurrently = "" if is_partitioned() else "CONCURRENTLY "
+        conn.execute(text(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS {LEXICAL_INDEX} ON {EMBEDDING_TABLE} USING gin ({LEXICAL_COLUMN})"
+        ))
+    print(f"Added {LEXICAL_COLUMN} to {EMBEDDING_TABLE}; run 'python -m embeddings.hybrid backfill' for existing rows.")
+    return has_lexical_column(refresh=True)
+
+def backfill_lexical(collection_id=None, batch_size: int = 1000) -> int:
+    """
+    Fill the tsvector of rows written before the column existed, in batches.
+
+    Returns:
+        int: Number of rows updated.
+    """
+    if not has_lexical_column():
+        raise ValueError("Hybrid search is not enabled on the embedding table.")
+    where = f"{LEXICAL_COLUMN} IS NULL"
+    if collection_id is not None:
+        where += f" AND collection_id = '{uuid.UUID(str(collection_id))}'"
+    updated = 0
+    while True:
+        with get_vector_engine().begin() as conn:
+            count = conn.execute(text(
+                f"UPDATE {EMBEDDING_TABLE} e SET {LEXICAL_COLUMN} = {lexical_expression('e.document')} "
+                f"FROM (SELECT collection_id, id FROM {EMBEDDING_TABLE} WHERE {where} LIMIT :batch) b "
+                f"WHERE e.collection_id = b.collection_id AND e.id = b.id"
+            ), {"batch": batch_size}).rowcount
+        updated += count
+        if count < batch_size:
+            break
+    if updated:
+        # Hybrid results of the backfilled collections change
+        with get_vector_engine().begin() as conn:
+            bump_version(conn, collection_id=collection_id)
+    return updated
+
+def search_collection_hybrid(session, collection_id, query_text: str, query_vector: list[float], k: int,
+                             mode: str, dims: int | None = None, metadata_filter: dict | None = None,
+                             candidates: int | None = None, rrf_k: int | None = None) -> list:
+    """
+    Hybrid search of a collection: the top candidates of the vector index and
+    of the full-text index are fused with reciprocal rank fusion,
+    score = sum of 1 / (rrf_k + rank), in a single statement.
+
+    Returns:
+        list: Rows of (id, document, cmetadata, distance, rrf_score, vector_rank,
+        lexical_rank), best fused score first. distance is the exact cosine
+        distance; a rank is None when the chunk was not a candidate on that side.
+    """
+    query = "[" + ",".join(repr(float(value)) for value in query_vector) + "]"
+    dims = dims or len(query_vector)
+    operator, _ = compact_operator(mode)
+    collection = f"'{uuid.UUID(str(collection_id))}'"
+    candidates = max(candidates or settings.HYBRID_CANDIDATES, k)
+    params = {
+        "query": query,
+        "query_text": query_text,
+        "k": k,
+        "candidates": candidates,
+        "rrf_k": rrf_k or settings.HYBRID_RRF_K,
+    }
+    where = f"collection_id = {collection}"
+    if metadata_filter:
+        params["filter"] = json.dumps(metadata_filter)
+        where += " AND cmetadata @> CAST(:filter AS jsonb)"
+    set_search_params(session, candidates)
+
+    vector_distance = f"{compact_expression(mode, dims)} {operator} {compact_query(mode, dims)}"
+    sql = (
+        f"WITH vector_hits AS ("
+        f"SELECT id, row_number() OVER (ORDER BY distance) AS rank FROM ("
+        f"SELECT id, {vector_distance} AS distance FROM {EMBEDDING_TABLE} WHERE {where} "
+        f"ORDER BY {vector_distance} LIMIT :candidates) v), "
+        f"lexical_hits AS ("
+        f"SELECT id, row_number() OVER (ORDER BY rank DESC) AS rank FROM ("
+        f"SELECT id, ts_rank_cd({LEXICAL_COLUMN}, q) AS rank "
+        f"FROM {EMBEDDING_TABLE}, websearch_to_tsquery('{text_search_config()}'::regconfig, :query_text) q "
+        f"WHERE {where} AND {LEXICAL_COLUMN} @@ q "
+        f"ORDER BY rank DESC LIMIT :candidates) l), "
+        f"fused AS ("
+        f"SELECT coalesce(v.id, l.id) AS id, "
+        f"coalesce(1.0 / (:rrf_k + v.rank), 0) + coalesce(1.0 / (:rrf_k + l.rank), 0) AS rrf_score, "
+        f"v.rank AS vector_rank, l.rank AS lexical_rank "
+        f"FROM vector_hits v FULL OUTER JOIN lexical_hits l ON l.id = v.id "
+        f"ORDER BY rrf_score DESC LIMIT :k) "
+        f"SELECT e.id, e.document, e.cmetadata, e.embedding <=> CAST(:query AS vector) AS distance, "
+        f"f.rrf_score, f.vector_rank, f.lexical_rank "
+        f"FROM fused f JOIN {EMBEDDING_TABLE} e ON e.collection_id = {collection} AND e.id = f.id "
+        f"ORDER BY f.rrf_score DESC, distance"
+    )
+    return session.execute(text(sql), params).fetchall()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the full-text side of hybrid search.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    enable = commands.add_parser("enable", help="Add the tsvector column and its index, then backfill it.")
+    enable.add_argument("--batch-size", type=int, default=1000)
+    backfill = commands.add_parser("backfill", help="Fill the tsvector of rows written before the column existed.")
+    backfill.add_argument("--collection-id", help="Only this collection.")
+    backfill.add_argument("--batch-size", type=int, default=1000)
+    commands.add_parser("status", help="Show whether the embedding table has the tsvector column.")
+    args = parser.parse_args()
+
+    if args.command == "enable":
+        if not settings.HYBRID_SEARCH_ENABLED:
+            parser.error("HYBRID_SEARCH_ENABLED is off.")
+        if not ensure_lexical_column():
+            parser.error(f"{EMBEDDING_TABLE} does not exist yet; run this after the first embeddings are written.")
+        print({"backfilled": backfill_lexical(batch_size=args.batch_size)})
+    elif args.command == "backfill":
+        print({"backfilled": backfill_lexical(args.collection_id, batch_size=args.batch_size)})
+    else:
+        print({"lexical_column": has_lexical_column()})
@@ -0,0 +1,286 @@
+import asyncio
+from collections import Counter
+from contextlib import aclosing
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+
+from database.create_schema import EmbeddingJob, EmbeddingJobFile, File as FileModel
+from embeddings.ann_index import bulk_load
+from embeddings.embedding_settings import Settings
+from embeddings.executors import run_io_bound
+from embeddings.helper_functions import db_session
+from embeddings.pdf_pages import aload_clean_splits, use_page_parallel
+from embeddings.streaming import aiter_list_windows, aiter_split_windows, should_stream, write_split_windows
+
+settings = Settings()
+
+RESUMABLE_STATUSES = ("pending", "running", "interrupted", "failed")
+
+# Jobs running in this process, so they are not garbage collected and can be stopped on shutdown
+_tasks: dict = {}
+
+def create_job(file_ids: list) -> str:
+    """
+    Record a pending job with one checkpoint row per file.
+
+    Raises:
+        ValueError: If none of the files exist.
+    """
+    with db_session() as db:
+        found = [row[0] for row in db.query(FileModel.file_id).filter(FileModel.file_id.in_(file_ids)).all()]
+        if not found:
+            raise ValueError("No files found for given file_ids")
+        job = EmbeddingJob(status="pending")
+        db.add(job)
+        db.flush()
+        db.add_all([EmbeddingJobFile(job_id=job.job_id, file_id=file_id) for file_id in found])
+        db.commit()
+        return job.job_id
+
+def get_job(job_id) -> dict | None:
+    """
+    Return the job status with per-file checkpoints, or None if it does not exist.
+    """
+    with db_session() as db:
+        job = db.query(EmbeddingJob).filter(EmbeddingJob.job_id == job_id).first()
+        if job is None:
+            return None
+        return {
+            "job_id": job.job_id,
+            "status": job.status,
+            "error": job.error,
+            "heartbeat_at": job.heartbeat_at,
+            "created_at": job.created_at,
+            "updated_at": job.updated_at,
+            "files": [
+                {
+                    "file_id": job_file.file_id,
+                    "status": job_file.status,
+                    "windows_done": job_file.windows_done,
+                    "splits_done": job_file.splits_done,
+                    "error": job_file.error,
+                }
+                for job_file in job.files
+            ],
+        }
+
+def claim_job(job_id) -> bool:
+    """
+    Take ownership of a job unless it is completed or another worker's heartbeat
+    is still within the lease.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=settings.EMBED_JOB_LEASE_SECONDS)
+    with db_session() as db:
+        claimed = db.query(EmbeddingJob).filter(
+            EmbeddingJob.job_id == job_id,
+            EmbeddingJob.status.in_(RESUMABLE_STATUSES),
+            or_(
+                EmbeddingJob.status != "running",
+                EmbeddingJob.heartbeat_at.is_(None),
+                EmbeddingJob.heartbeat_at < stale,
+            ),
+        ).update({"status": "running", "error": None, "heartbeat_at": now}, synchronize_session=False)
+        db.commit()
+        return claimed == 1
+
+def _touch_job(job_id) -> None:
+    with db_session() as db:
+        db.query(EmbeddingJob).filter(EmbeddingJob.job_id == job_id).update(
+            {"heartbeat_at": datetime.utcnow()}, synchronize_session=False
+        )
+        db.commit()
+
+def _finish_job(job_id, status: str, error: str | None = None) -> None:
+    with db_session() as db:
+        db.query(EmbeddingJob).filter(EmbeddingJob.job_id == job_id).update(
+            {"status": status, "error": error, "heartbeat_at": None}, synchronize_session=False
+        )
+        db.commit()
+
+def _load_open_files(job_id) -> list[dict]:
+    with db_session() as db:
+        rows = db.query(EmbeddingJobFile, FileModel).join(
+            FileModel, FileModel.file_id == EmbeddingJobFile.file_id
+        ).filter(
+            EmbeddingJobFile.job_id == job_id,
+            EmbeddingJobFile.status != "completed",
+        ).all()
+        return [
+            {
+                "file_id": db_file.file_id,
+                "project_id": db_file.project_id,
+                "storage_path": db_file.storage_path,
+                "size_bytes": db_file.size_bytes,
+                "mime_type": db_file.mime_type,
+                "is_embedded": db_file.is_embedded,
+                "splits_done": job_file.splits_done,
+            }
+            for job_file, db_file in rows
+        ]
+
+def _update_job_file(job_id, file_id, **values) -> None:
+    with db_session() as db:
+        db.query(EmbeddingJobFile).filter(
+            EmbeddingJobFile.job_id == job_id,
+            EmbeddingJobFile.file_id == file_id,
+        ).update(values, synchronize_session=False)
+        db.commit()
+
+def _checkpoint_window(job_id, file_id, splits_done: int) -> None:
+    _update_job_file(job_id, file_id, splits_done=splits_done, windows_done=EmbeddingJobFile.windows_done + 1)
+
+def _complete_job_file(job_id, file_id) -> None:
+    # The checkpoint and the is_embedded flag move together, file by file
+    with db_session() as db:
+        db.query(EmbeddingJobFile).filter(
+            EmbeddingJobFile.job_id == job_id,
+            EmbeddingJobFile.file_id == file_id,
+        ).update({"status": "completed", "error": None}, synchronize_session=False)
+        db.query(FileModel).filter(FileModel.file_id == file_id).update(
+            {"is_embedded": True}, synchronize_session=False
+        )
+        db.commit()
+
+async def embed_file(file_id, project_id, storage_path: str, size_bytes: int | None,
+                     mime_type: str | None = None, start: int = 0, on_window=None) -> int:
+    """
+    Embed a file window by window, skipping the first start splits.
+
+    Large files are parsed in streaming mode, except PDFs, whose page ranges are
+    extracted in parallel; other files are parsed on the CPU executor in one go. Either way every window is written before on_window is
+    called, so a checkpoint never covers splits that are not in the vector store.
+
+    Returns:
+        int: Number of splits in the file.
+    """
+    if project_id is None:
+        raise ValueError(f"File {file_id} has no associated project_id.")
+    if storage_path is None:
+        raise ValueError(f"File {file_id} has no storage path.")
+    if should_stream(size_bytes) and not use_page_parallel(mime_type, storage_path):
+        windows = aiter_split_windows(storage_path, mime_type)
+    else:
+        splits = await aload_clean_splits(storage_path, mime_type)
+        windows = aiter_list_windows(splits)
+    async with aclosing(windows):
+        total = await write_split_windows(windows, file_id, project_id, start, on_window)
+    if not total:
+        raise ValueError("No text found in the file.")
+    return total
+
+async def _run_job_file(job_id, job_file: dict) -> bool:
+    file_id = job_file["file_id"]
+    if job_file["is_embedded"]:
+        # Already embedded outside of this job
+        await run_io_bound(_complete_job_file, job_id, file_id)
+        return True
+
+    async def on_window(splits_done: int):
+        await run_io_bound(_checkpoint_window, job_id, file_id, splits_done)
+
+    await run_io_bound(_update_job_file, job_id, file_id, status="running", error=None)
+    try:
+        await embed_file(file_id, job_file["project_id"], job_file["storage_path"], job_file["size_bytes"],
+                         mime_type=job_file["mime_type"], start=job_file["splits_done"], on_window=on_window)
+        await run_io_bound(_complete_job_file, job_id, file_id)
+        return True
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(e)
+        await run_io_bound(_update_job_file, job_id, file_id, status="failed", error=str(e))
+        return False
+
+async def _heartbeat(job_id) -> None:
+    while True:
+        await asyncio.sleep(settings.EMBED_JOB_LEASE_SECONDS / 3)
+        await run_io_bound(_touch_job, job_id)
+
+async def run_job(job_id) -> dict:
+    """
+    Run a claimed job to the end, resuming every file from its last checkpoint.
+    Up to EMBED_JOB_MAX_CONCURRENT_FILES files are processed at a time, so a job
+    of thousands of files holds the splits of only that many; embedding is
+    bounded by the shared batcher.
+
+    Returns:
+        dict: Numbers of completed and failed files.
+    """
+    heartbeat = asyncio.ensure_future(_heartbeat(job_id))
+    try:
+        job_files = await run_io_bound(_load_open_files, job_id)
+        # Index maintenance on the affected projects waits until the load is done
+        project_files = Counter(job_file["project_id"] for job_file in job_files if not job_file["is_embedded"])
+        slots = asyncio.Semaphore(max(1, settings.EMBED_JOB_MAX_CONCURRENT_FILES))
+
+        async def run_file(job_file: dict) -> bool:
+            async with slots:
+                return await _run_job_file(job_id, job_file)
+
+        async with bulk_load(project_files):
+            results = await asyncio.gather(*[run_file(job_file) for job_file in job_files])
+        failed = results.count(False)
+        await run_io_bound(_finish_job, job_id, "failed" if failed else "completed",
+                           f"{failed} files failed" if failed else None)
+        return {"completed": results.count(True), "failed": failed}
+    except asyncio.CancelledError:
+        # Stopped on shutdown; release the lease so the next start resumes it at once.
+        # Shielded, so the write finishes in the I/O pool even if shutdown cancels again
+        await asyncio.shield(run_io_bound(_finish_job, job_id, "interrupted"))
+        raise
+    except Exception as e:
+        await run_io_bound(_finish_job, job_id, "failed", str(e))
+        raise
+    finally:
+        heartbeat.cancel()
+
+async def start_job(job_id) -> asyncio.Task | None:
+    """
+    Claim a job and run it in the background on the running event loop.
+
+    Returns:
+        asyncio.Task | None: The running job, or None if the job is completed or
+        owned by a live worker.
+    """
+    if job_id in _tasks or not await run_io_bound(claim_job, job_id):
+        return None
+    task = asyncio.get_running_loop().create_task(run_job(job_id))
+    _tasks[job_id] = task
+    task.add_done_callback(lambda _: _tasks.pop(job_id, None))
+    return task
+
+def _find_interrupted_jobs() -> list:
+    stale = datetime.utcnow() - timedelta(seconds=settings.EMBED_JOB_LEASE_SECONDS)
+    with db_session() as db:
+        rows = db.query(EmbeddingJob.job_id).filter(
+            or_(
+                EmbeddingJob.status.in_(("pending", "interrupted")),
+                (EmbeddingJob.status == "running") & (
+                    EmbeddingJob.heartbeat_at.is_(None) | (EmbeddingJob.heartbeat_at < stale)
+                ),
+            )
+        ).order_by(EmbeddingJob.created_at).all()
+        return [row[0] for row in rows]
+
+async def resume_interrupted_jobs() -> list:
+    """
+    Start every job left pending, interrupted, or running with an expired lease.
+    Failed jobs are only resumed on request.
+
+    Returns:
+        list: Ids of the jobs started.
+    """
+    job_ids = await run_io_bound(_find_interrupted_jobs)
+    return [job_id for job_id in job_ids if await start_job(job_id) is not None]
+
+async def stop_running_jobs() -> None:
+    """
+    Cancel the jobs running in this process, marking them interrupted.
+    """
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
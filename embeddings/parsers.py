@@ -0,0 +1,184 @@
+import csv
+import json
+import os
+from html.parser import HTMLParser
+
+# Lightweight parsers for formats that do not need unstructured. Each parser takes
+# a local path and yields text segments in document order; segments are joined
+# with blank lines before splitting, the same way S3FileLoader joins elements.
+
+READ_BLOCK_CHARS = 1 << 20
+
+def _open_text(path: str):
+    return open(path, encoding="utf-8", errors="replace", newline="")
+
+def parse_text(path: str):
+    """
+    Plain text and Markdown: yield paragraphs, reading the file in blocks.
+    """
+    with _open_text(path) as f:
+        pending = ""
+        while True:
+            block = f.read(READ_BLOCK_CHARS)
+            if not block:
+                break
+            paragraphs = (pending + block.replace("\r\n", "\n")).split("\n\n")
+            pending = paragraphs.pop()
+            for paragraph in paragraphs:
+                paragraph = paragraph.strip()
+                if paragraph:
+                    yield paragraph
+        pending = pending.strip()
+        if pending:
+            yield pending
+
+def parse_csv(path: str):
+    """
+    CSV: yield one "column: value" line per cell, one segment per row.
+    """
+    with _open_text(path) as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        header = [name.strip() for name in header]
+        for row in reader:
+            cells = [
+                f"{header[i] if i < len(header) and header[i] else f'column_{i + 1}'}: {value.strip()}"
+                for i, value in enumerate(row)
+                if value.strip()
+            ]
+            if cells:
+                yield "\n".join(cells)
+
+def _flatten_json(value, prefix: str = ""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten_json(item, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            yield from _flatten_json(item, f"{prefix}[{i}]")
+    elif value is not None and value != "":
+        yield f"{prefix}: {value}" if prefix else str(value)
+
+def _json_segment(value) -> str:
+    return "\n".join(_flatten_json(value))
+
+def parse_json(path: str):
+    """
+    JSON: yield one segment of "path: value" lines per top-level element.
+    """
+    with _open_text(path) as f:
+        data = json.load(f)
+    items = data if isinstance(data, list) else [data]
+    for item in items:
+        segment = _json_segment(item)
+        if segment:
+            yield segment
+
+def parse_json_lines(path: str):
+    """
+    JSON Lines: like parse_json, one record at a time.
+    """
+    with _open_text(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                segment = _json_segment(json.loads(line))
+                if segment:
+                    yield segment
+
+class _HTMLTextExtractor(HTMLParser):
+    BLOCK_TAGS = {
+        "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "figcaption",
+        "footer", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol",
+        "p", "pre", "section", "table", "td", "th", "tr", "ul",
+    }
+    SKIP_TAGS = {"script", "style", "noscript", "template", "head"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.segments = []
+        self._parts = []
+        self._skip_depth = 0
+
+    def _close_block(self):
+        text = " ".join("".join(self._parts).split())
+        self._parts = []
+        if text:
+            self.segments.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self._close_block()
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif tag in self.BLOCK_TAGS:
+            self._close_block()
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._parts.append(data)
+
+def parse_html(path: str):
+    """
+    HTML: yield the visible text of each block-level element, without scripts and styles.
+    """
+    extractor = _HTMLTextExtractor()
+    with _open_text(path) as f:
+        while True:
+            block = f.read(READ_BLOCK_CHARS)
+            if not block:
+                break
+            extractor.feed(block)
+            yield from extractor.segments
+            extractor.segments = []
+    extractor.close()
+    extractor._close_block()
+    yield from extractor.segments
+
+PARSERS = {
+    "text/plain": parse_text,
+    "text/markdown": parse_text,
+    "text/x-markdown": parse_text,
+    "text/csv": parse_csv,
+    "application/csv": parse_csv,
+    "application/json": parse_json,
+    "application/x-ndjson": parse_json_lines,
+    "application/jsonl": parse_json_lines,
+    "text/html": parse_html,
+    "application/xhtml+xml": parse_html,
+}
+
+# Used when the recorded MIME type is missing or generic (browsers send
+# application/octet-stream for .md and application/vnd.ms-excel for .csv)
+EXTENSION_PARSERS = {
+    ".txt": parse_text,
+    ".text": parse_text,
+    ".log": parse_text,
+    ".md": parse_text,
+    ".markdown": parse_text,
+    ".csv": parse_csv,
+    ".json": parse_json,
+    ".jsonl": parse_json_lines,
+    ".ndjson": parse_json_lines,
+    ".html": parse_html,
+    ".htm": parse_html,
+}
+
+def get_parser(mime_type: str | None, key: str = ""):
+    """
+    Return the fast-path parser for a file, or None if it should go through unstructured.
+
+    :param mime_type: MIME type recorded at upload, parameters such as charset are ignored
+    :param key: S3 key or file name, used for the extension fallback
+    """
+    if mime_type:
+        parser = PARSERS.get(mime_type.split(";")[0].strip().lower())
+        if parser is not None:
+            return parser
+    return EXTENSION_PARSERS.get(os.path.splitext(key)[1].lower())
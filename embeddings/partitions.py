@@ -0,0 +1,292 @@
+import argparse
+import uuid
+
+from sqlalchemy import text
+
+from embeddings.quantized import EMBEDDING_TABLE
+from embeddings.vector_db import get_vector_engine
+
+# In the partitioned layout langchain_pg_embedding is list-partitioned on
+# collection_id with one partition per collection, so vacuum, index builds and
+# scans of a project only touch its own rows and deleting a project drops a
+# table. Rows of collections without a partition land in the default partition
+# and are moved when it is attached. The primary key becomes (collection_id, id),
+# so upserts must use conflict_columns(); PGVector.add_embeddings no longer works.
+# The layout is cached per process: restart the app after
+#
+#     python -m embeddings.partitions migrate [--drop-legacy]
+
+COLLECTION_TABLE = "langchain_pg_collection"
+DEFAULT_PARTITION = f"{EMBEDDING_TABLE}_default"
+LEGACY_TABLE = f"{EMBEDDING_TABLE}_legacy"
+
+_partitioned = None
+# Collection ids known to have a partition, so connections skip the catalog lookup
+_attached = set()
+
+def is_partitioned(refresh: bool = False) -> bool:
+    """
+    Whether the embedding table is list-partitioned on collection_id.
+    """
+    global _partitioned
+    if _partitioned is None or refresh:
+        with get_vector_engine().connect() as conn:
+            _partitioned = bool(conn.execute(text(
+                "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"
+            ), {"table": EMBEDDING_TABLE}).scalar())
+    return _partitioned
+
+def partition_name(collection_id) -> str:
+    return f"{EMBEDDING_TABLE}_{uuid.UUID(str(collection_id)).hex}"
+
+def storage_table(collection_id) -> str:
+    """
+    Table holding a collection's rows: its partition, or the shared table.
+    """
+    return partition_name(collection_id) if is_partitioned() else EMBEDDING_TABLE
+
+def conflict_columns() -> list[str]:
+    """
+    Conflict target of embedding upserts: a unique index on a partitioned table
+    must include the partition key.
+    """
+    return ["collection_id", "id"] if is_partitioned() else ["id"]
+
+def _collection_id(conn, collection_name: str, create: bool = False):
+    if create:
+        conn.execute(text(
+            f"INSERT INTO {COLLECTION_TABLE} (uuid, name) VALUES (:uuid, :name) ON CONFLICT (name) DO NOTHING"
+        ), {"uuid": uuid.uuid4(), "name": collection_name})
+    return conn.execute(
+        text(f"SELECT uuid FROM {COLLECTION_TABLE} WHERE name = :name"), {"name": collection_name}
+    ).scalar()
+
+def _attach(conn, collection_id, source: str | None = None) -> bool:
+    """
+    Create and attach the partition of a collection, moving its rows out of
+    the default partition (and out of source, when migrating). Runs in the
+    caller's transaction.
+
+    Returns:
+        bool: False if the partition already existed.
+    """
+    name = partition_name(collection_id)
+    collection = f"'{uuid.UUID(str(collection_id))}'"
+    # Serialises concurrent attaches of the same collection
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": name})
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+        return False
+
+    # Attaching scans the default partition for rows of the new bound, which must not
+    # be there; the table is filled before it is attached for the same reason
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {EMBEDDING_TABLE} INCLUDING DEFAULTS)"))
+    conn.execute(text(
+        f"ALTER TABLE {name} ADD CONSTRAINT {name}_collection CHECK (collection_id IS NOT NULL "
+        f"AND collection_id = {collection})"
+    ))
+    columns = "id, collection_id, embedding, document, cmetadata"
+    if source:
+        from embeddings.hybrid import LEXICAL_COLUMN, has_lexical_column, lexical_expression
+
+        # The legacy table may predate the tsvector column; compute it while copying
+        targets, values = columns, columns
+        if has_lexical_column():
+            targets += f", {LEXICAL_COLUMN}"
+            values += f", {lexical_expression('document')}"
+        conn.execute(text(
+            f"INSERT INTO {name} ({targets}) SELECT {values} FROM {source} WHERE collection_id = {collection}"
+        ))
+    # Same parent, so the default partition and the new table have the same columns
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE collection_id = {collection} RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved ON CONFLICT DO NOTHING"
+    ))
+    # The check constraint lets ATTACH skip validating the partition bound
+    conn.execute(text(f"ALTER TABLE {EMBEDDING_TABLE} ATTACH PARTITION {name} FOR VALUES IN ({collection})"))
+    conn.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {name}_collection"))
+    return True
+
+def ensure_partition(collection_name: str):
+    """
+    Make sure a collection exists and, in the partitioned layout, has its own
+    partition. Called when a project is created or connected to.
+
+    Returns:
+        The collection id, or None when the table is not partitioned.
+    """
+    if not collection_name or not is_partitioned():
+        return None
+    with get_vector_engine().begin() as conn:
+        collection_id = _collection_id(conn, collection_name, create=True)
+        if collection_id not in _attached:
+            if _attach(conn, collection_id):
+                print(f"Attached partition {partition_name(collection_id)} for collection '{collection_name}'.")
+            _attached.add(collection_id)
+    return collection_id
+
+def find_collection_id(conn, collection_name: str):
+    """
+    Id of a collection, or None if it does not exist. PGVector creates the
+    collection table on first use, so before any embedding there is none.
+    """
+    if not conn.execute(text("SELECT to_regclass(:table)"), {"table": COLLECTION_TABLE}).scalar():
+        return None
+    return _collection_id(conn, collection_name)
+
+def drop_collection(collection_name: str) -> bool:
+    """
+    Delete a collection and all its embeddings. In the partitioned layout this
+    drops the collection's partition instead of deleting its rows one by one.
+
+    Returns:
+        bool: False if the collection did not exist.
+    """
+    with get_vector_engine().begin() as conn:
+        collection_id = find_collection_id(conn, collection_name)
+        if collection_id is None:
+            return False
+        if is_partitioned():
+            conn.execute(text(f"DROP TABLE IF EXISTS {partition_name(collection_id)}"))
+            _attached.discard(collection_id)
+        # Cascades to the remaining rows (all of them in the shared table)
+        conn.execute(text(f"DELETE FROM {COLLECTION_TABLE} WHERE uuid = :uuid"), {"uuid": collection_id})
+    return True
+
+def _create_partitioned_table(conn) -> None:
+    conn.execute(text(
+        f"CREATE TABLE {EMBEDDING_TABLE} ("
+        f"id VARCHAR NOT NULL, "
+        f"collection_id UUID NOT NULL REFERENCES {COLLECTION_TABLE} (uuid) ON DELETE CASCADE, "
+        f"embedding VECTOR, "
+        f"document VARCHAR, "
+        f"cmetadata JSONB, "
+        f"PRIMARY KEY (collection_id, id)"
+        f") PARTITION BY LIST (collection_id)"
+    ))
+    conn.execute(text(f"CREATE INDEX ix_cmetadata_gin ON {EMBEDDING_TABLE} USING gin (cmetadata jsonb_path_ops)"))
+    conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {EMBEDDING_TABLE} DEFAULT"))
+
+def _ann_index_specs(collection_ids: list) -> dict:
+    from embeddings.ann_index import get_index
+
+    specs = {}
+    for collection_id in collection_ids:
+        index = get_index(collection_id)
+        if index is not None and index["valid"]:
+            specs[collection_id] = {key: index.get(key) for key in ("method", "m", "ef_construction", "lists")}
+    return specs
+
+def _rebuild_ann_indexes(specs: dict, names: dict) -> list[str]:
+    from database.create_schema import Project
+    from embeddings.ann_index import build_index
+    from embeddings.helper_functions import db_session
+
+    rebuilt = []
+    with db_session() as db:
+        projects = dict(db.query(Project.vector_index_name, Project.project_id).filter(
+            Project.vector_index_name.in_([names[collection_id] for collection_id in specs])
+        ).all())
+    for collection_id, spec in specs.items():
+        project_id = projects.get(names[collection_id])
+        if project_id is None:
+            print(f"No project uses collection '{names[collection_id]}'; its ANN index was not rebuilt.")
+            continue
+        rebuilt.append(build_index(project_id, **spec)["name"])
+    return rebuilt
+
+def migrate_to_partitioned(drop_legacy: bool = False) -> dict:
+    """
+    Convert the shared embedding table to the partitioned layout.
+
+    The existing table is renamed to langchain_pg_embedding_legacy, the
+    partitioned table is created in its place and the rows are copied one
+    collection at a time, each in its own transaction. ANN indexes are rebuilt
+    on the new partitions with their previous parameters. Collections not yet
+    copied read as empty while the migration runs, so run it in a quiet period.
+    Running it again on a partitioned table attaches partitions for collections
+    whose rows sit in the default partition.
+
+    Args:
+        drop_legacy (bool): Drop the legacy table once every collection is copied.
+
+    Returns:
+        dict: Collections attached, rows copied, rows left in the legacy table
+        (without a collection) and ANN indexes rebuilt.
+    """
+    from embeddings.hybrid import ensure_lexical_column, has_lexical_column
+
+    engine = get_vector_engine()
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT to_regclass(:table)"), {"table": EMBEDDING_TABLE}).scalar()
+        legacy = conn.execute(text("SELECT to_regclass(:table)"), {"table": LEGACY_TABLE}).scalar()
+
+    specs, names = {}, {}
+    if exists and not is_partitioned(refresh=True):
+        if legacy:
+            raise ValueError(f"{LEGACY_TABLE} already exists; drop it or finish the previous migration first.")
+        with engine.connect() as conn:
+            names = dict(conn.execute(text(f"SELECT uuid, name FROM {COLLECTION_TABLE}")).all())
+        specs = _ann_index_specs(list(names))
+        with engine.begin() as conn:
+            conn.execute(text(f"LOCK TABLE {EMBEDDING_TABLE} IN ACCESS EXCLUSIVE MODE"))
+            conn.execute(text(f"ALTER TABLE {EMBEDDING_TABLE} RENAME TO {LEGACY_TABLE}"))
+            conn.execute(text(f"ALTER TABLE {LEGACY_TABLE} RENAME CONSTRAINT {EMBEDDING_TABLE}_pkey TO {LEGACY_TABLE}_pkey"))
+            conn.execute(text("ALTER INDEX IF EXISTS ix_cmetadata_gin RENAME TO ix_cmetadata_gin_legacy"))
+            conn.execute(text("ALTER INDEX IF EXISTS ix_document_tsv_gin RENAME TO ix_document_tsv_gin_legacy"))
+            # The ANN indexes are rebuilt on the partitions under the same names
+            for index in conn.execute(text(
+                "SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = CAST(:table AS regclass) "
+                "AND indexrelid::regclass::text LIKE 'ix_emb_%'"
+            ), {"table": LEGACY_TABLE}).scalars().all():
+                conn.execute(text(f"DROP INDEX {index}"))
+            _create_partitioned_table(conn)
+        legacy = LEGACY_TABLE
+    elif not exists:
+        with engine.begin() as conn:
+            _create_partitioned_table(conn)
+    is_partitioned(refresh=True)
+    # The new parent gets the tsvector column (and its index) before rows are copied
+    has_lexical_column(refresh=True)
+    ensure_lexical_column()
+
+    attached, copied = [], 0
+    with engine.connect() as conn:
+        collection_ids = conn.execute(text(f"SELECT uuid FROM {COLLECTION_TABLE} ORDER BY name")).scalars().all()
+    for collection_id in collection_ids:
+        with engine.begin() as conn:
+            if _attach(conn, collection_id, source=LEGACY_TABLE if legacy else None):
+                attached.append(str(collection_id))
+                copied += conn.execute(
+                    text(f"SELECT count(*) FROM {partition_name(collection_id)}")
+                ).scalar()
+                # Without statistics the planner prefers the primary key to the ANN index
+                conn.execute(text(f"ANALYZE {partition_name(collection_id)}"))
+        _attached.add(collection_id)
+
+    leftover = 0
+    if legacy:
+        with engine.begin() as conn:
+            leftover = conn.execute(text(f"SELECT count(*) FROM {LEGACY_TABLE} WHERE collection_id IS NULL")).scalar()
+            if drop_legacy:
+                conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+
+    return {
+        "partitions_attached": len(attached),
+        "rows_copied": copied,
+        "rows_without_collection": leftover,
+        "legacy_table": None if not legacy or drop_legacy else LEGACY_TABLE,
+        "ann_indexes_rebuilt": _rebuild_ann_indexes(specs, names) if specs else [],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the partitioned layout of the embedding table.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate = commands.add_parser("migrate", help="Partition the embedding table by collection.")
+    migrate.add_argument("--drop-legacy", action="store_true", help="Drop the unpartitioned table afterwards.")
+    commands.add_parser("status", help="Show the current layout.")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        print(migrate_to_partitioned(drop_legacy=args.drop_legacy))
+    else:
+        print({"partitioned": is_partitioned()})
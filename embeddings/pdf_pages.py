@@ -0,0 +1,142 @@
+import asyncio
+from bisect import bisect_right
+import os
+import tempfile
+
+from langchain_core.documents import Document
+
+from defaults.s3_client import s3_client
+from embeddings.doc_loader import S3_BUCKET_NAME, clean_string, load_clean_splits, text_splitter
+from embeddings.embedding_settings import Settings
+from embeddings.executors import run_cpu_bound, run_io_bound
+
+settings = Settings()
+
+PDF_MIME_TYPES = ("application/pdf", "application/x-pdf")
+
+def is_pdf(mime_type: str | None, key: str) -> bool:
+    if mime_type and mime_type.split(";")[0].strip().lower() in PDF_MIME_TYPES:
+        return True
+    return key.lower().endswith(".pdf")
+
+def use_page_parallel(mime_type: str | None, key: str) -> bool:
+    """
+    Whether a file goes through page-range extraction. Requires pypdf, which
+    ships with unstructured[pdf].
+    """
+    if not settings.PDF_PARALLEL_MIN_PAGES or not is_pdf(mime_type, key):
+        return False
+    try:
+        import pypdf  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def count_pdf_pages(path: str) -> int:
+    from pypdf import PdfReader
+
+    return len(PdfReader(path).pages)
+
+def page_ranges(n_pages: int, workers: int) -> list[tuple[int, int]]:
+    """
+    Split pages 0..n_pages-1 into at most workers contiguous, half-open ranges.
+    """
+    if n_pages < settings.PDF_PARALLEL_MIN_PAGES or workers <= 1:
+        return [(0, n_pages)]
+    size = -(-n_pages // workers)
+    return [(first, min(first + size, n_pages)) for first in range(0, n_pages, size)]
+
+def extract_pdf_pages(path: str, first: int, last: int, n_pages: int) -> list[tuple[int, str]]:
+    """
+    Worker stage: extract pages first..last-1 of a local PDF with unstructured.
+
+    The range is copied into a temporary PDF unless it covers the whole file.
+    Kept free of database access so it can run in a worker process.
+
+    :return: (1-based page number, text) for every page with text, in page order
+    """
+    from unstructured.partition.auto import partition
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if (first, last) == (0, n_pages):
+            elements = partition(filename=path)
+        else:
+            from pypdf import PdfReader, PdfWriter
+
+            reader = PdfReader(path)
+            writer = PdfWriter()
+            for i in range(first, last):
+                writer.add_page(reader.pages[i])
+            part_path = os.path.join(temp_dir, f"pages_{first + 1}_{last}.pdf")
+            writer.write(part_path)
+            elements = partition(filename=part_path)
+
+    pages = {}
+    for element in elements:
+        page_number = first + (getattr(element.metadata, "page_number", None) or 1)
+        pages.setdefault(page_number, []).append(str(element))
+    return [(page_number, "\n\n".join(texts)) for page_number, texts in sorted(pages.items())]
+
+def split_pdf_pages(pages: list[tuple[int, str]], metadata: dict) -> list[Document]:
+    """
+    Join pages in page order, split the text once and tag each split with the
+    page it starts on. Chunks may still span pages, as with the serial loader.
+    """
+    starts, numbers, parts = [], [], []
+    position = 0
+    for page_number, page_text in pages:
+        page_text = clean_string(page_text)
+        if not page_text.strip():
+            continue
+        if parts:
+            position += 2  # the "\n\n" between pages
+        starts.append(position)
+        numbers.append(page_number)
+        parts.append(page_text)
+        position += len(page_text)
+
+    text = "\n\n".join(parts)
+    splits = []
+    cursor = 0
+    for chunk in text_splitter.split_text(text):
+        # Chunks are cleaned substrings of the text, in order
+        found = text.find(chunk, cursor)
+        start = found if found >= 0 else cursor
+        cursor = start + 1
+        splits.append(Document(
+            page_content=chunk,
+            metadata={**metadata, "page_number": numbers[max(bisect_right(starts, start) - 1, 0)]},
+        ))
+    return splits
+
+async def load_pdf_splits(key: str) -> list[Document]:
+    """
+    Download a PDF once, extract its page ranges in parallel on the CPU
+    executor and split the merged text.
+
+    Raises:
+        ValueError: If the file yields no text.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, os.path.basename(key))
+        await run_io_bound(s3_client.download_file, S3_BUCKET_NAME, key, path)
+        n_pages = await run_io_bound(count_pdf_pages, path)
+        ranges = page_ranges(n_pages, settings.PDF_PARALLEL_WORKERS)
+        results = await asyncio.gather(*[
+            run_cpu_bound(extract_pdf_pages, path, first, last, n_pages) for first, last in ranges
+        ])
+
+    pages = [page for result in results for page in result]
+    splits = await run_cpu_bound(split_pdf_pages, pages, {"source": f"s3://{S3_BUCKET_NAME}/{key}"})
+    if not splits:
+        raise ValueError("No text found in the file.")
+    return splits
+
+async def aload_clean_splits(key: str, mime_type: str | None = None) -> list[Document]:
+    """
+    Async entry point of the in-memory ingestion path: PDFs are extracted page
+    range by page range, everything else goes through load_clean_splits.
+    """
+    if use_page_parallel(mime_type, key):
+        return await load_pdf_splits(key)
+    return await run_cpu_bound(load_clean_splits, key, mime_type)
@@ -0,0 +1,209 @@
+import json
+import uuid
+
+from sqlalchemy import text
+
+from embeddings.embedding_settings import Settings
+
+settings = Settings()
+
+# Per-project storage modes. The float32 `embedding` column stays the source of
+# truth; the ANN index of a collection (see ann_index.py) is a partial expression
+# index on a float32, halfvec (2x smaller) or binary-quantized (32x smaller) form
+# of it. Compact modes are searched first and re-ranked against the float32
+# vectors. halfvec and binary require pgvector >= 0.7.
+VECTOR_STORAGE_MODES = ("float32", "halfvec", "binary")
+
+# pgvector has no int8 vector type to index; scalar int8 cannot be served by an ANN index
+UNSUPPORTED_STORAGE_MODES = {
+    "int8": "pgvector has no int8 vector type; use 'halfvec' (2x) or 'binary' (32x) instead.",
+}
+
+EMBEDDING_TABLE = "langchain_pg_embedding"
+
+def validate_storage_mode(mode: str) -> str:
+    """
+    Return the normalised storage mode.
+
+    Raises:
+        ValueError: If the mode is unknown or not supported by pgvector.
+    """
+    mode = (mode or "float32").lower()
+    if mode in UNSUPPORTED_STORAGE_MODES:
+        raise ValueError(f"Vector storage mode '{mode}' is not supported: {UNSUPPORTED_STORAGE_MODES[mode]}")
+    if mode not in VECTOR_STORAGE_MODES:
+        raise ValueError(f"Unknown vector storage mode '{mode}'. Use one of: {', '.join(VECTOR_STORAGE_MODES)}.")
+    return mode
+
+def compact_expression(mode: str, dims: int) -> str:
+    """
+    SQL expression of the indexed form of the embedding column. Search queries
+    must use the exact same expression for the planner to pick the index; the
+    cast gives the column the fixed dimension pgvector indexes require.
+    """
+    dims = int(dims)
+    if mode == "halfvec":
+        return f"(embedding::halfvec({dims}))"
+    if mode == "binary":
+        return f"(binary_quantize(embedding)::bit({dims}))"
+    return f"(embedding::vector({dims}))"
+
+def compact_query(mode: str, dims: int, query: str = ":query") -> str:
+    # query is the bind parameter, or column, holding the query vector
+    dims = int(dims)
+    if mode == "halfvec":
+        return f"CAST({query} AS halfvec({dims}))"
+    if mode == "binary":
+        return f"binary_quantize(CAST({query} AS vector({dims})))::bit({dims})"
+    return f"CAST({query} AS vector({dims}))"
+
+def compact_operator(mode: str) -> tuple[str, str]:
+    """
+    Return (distance operator, operator class) of the indexed tier; the operator
+    classes exist for both HNSW and IVFFlat.
+    """
+    if mode == "halfvec":
+        return "<=>", "halfvec_cosine_ops"
+    if mode == "binary":
+        return "<~>", "bit_hamming_ops"
+    return "<=>", "vector_cosine_ops"
+
+def collection_dims(session, collection_id) -> int | None:
+    """
+    Dimension of the vectors stored in a collection, or None if it is empty.
+    """
+    return session.execute(
+        text(f"SELECT vector_dims(embedding) FROM {EMBEDDING_TABLE} WHERE collection_id = :cid LIMIT 1"),
+        {"cid": collection_id},
+    ).scalar()
+
+def set_search_params(session, rows: int) -> None:
+    """
+    Size the index scan for the current transaction: an HNSW scan returns at
+    most ef_search rows, IVFFlat visits ivfflat.probes lists.
+    """
+    session.execute(text(f"SET LOCAL hnsw.ef_search = {max(40, min(rows, 1000))}"))
+    session.execute(text(f"SET LOCAL ivfflat.probes = {int(settings.VECTOR_IVFFLAT_PROBES)}"))
+
+def search_collection(session, collection_id, query_vector: list[float], k: int, mode: str,
+                      dims: int | None = None, rerank_factor: int | None = None,
+                      metadata_filter: dict | None = None) -> list:
+    """
+    Nearest neighbours of query_vector in a collection by cosine distance.
+
+    In a compact mode the top k * rerank_factor candidates are taken from the
+    compact index and re-ranked against the float32 vectors, so the returned
+    distances are exact. metadata_filter keeps rows whose cmetadata contains it
+    (jsonb @>, served by the cmetadata GIN index); with an ANN index the filter
+    applies to the rows the index scan returns, so selective filters may yield
+    fewer than k rows.
+
+    Returns:
+        list: Rows of (id, document, cmetadata, distance), closest first.
+    """
+    query = "[" + ",".join(repr(float(value)) for value in query_vector) + "]"
+    dims = dims or len(query_vector)
+    operator, _ = compact_operator(mode)
+    # Inlined rather than bound so the planner can match the partial index predicate
+    collection = f"'{uuid.UUID(str(collection_id))}'"
+    params = {"query": query, "k": k}
+    where = f"collection_id = {collection}"
+    if metadata_filter:
+        params["filter"] = json.dumps(metadata_filter)
+        where += " AND cmetadata @> CAST(:filter AS jsonb)"
+
+    if mode == "float32":
+        set_search_params(session, k)
+        sql = (
+            f"SELECT id, document, cmetadata, embedding <=> CAST(:query AS vector) AS distance "
+            f"FROM {EMBEDDING_TABLE} WHERE {where} "
+            f"ORDER BY {compact_expression(mode, dims)} {operator} {compact_query(mode, dims)} LIMIT :k"
+        )
+        return session.execute(text(sql), params).fetchall()
+
+    candidates = k * (rerank_factor or settings.VECTOR_RERANK_FACTOR)
+    params["candidates"] = candidates
+    set_search_params(session, candidates)
+    sql = (
+        f"WITH candidates AS ("
+        f"SELECT id FROM {EMBEDDING_TABLE} WHERE {where} "
+        f"ORDER BY {compact_expression(mode, dims)} {operator} {compact_query(mode, dims)} LIMIT :candidates) "
+        f"SELECT e.id, e.document, e.cmetadata, e.embedding <=> CAST(:query AS vector) AS distance "
+        f"FROM candidates c JOIN {EMBEDDING_TABLE} e ON e.collection_id = {collection} AND e.id = c.id "
+        f"ORDER BY distance LIMIT :k"
+    )
+    return session.execute(text(sql), params).fetchall()
+
+def _format_vector(vector) -> str:
+    return "[" + ",".join(repr(float(value)) for value in vector) + "]"
+
+def search_collections_batch(session, searches: list[dict], targets: list[dict], dims: int,
+                             rerank_factor: int | None = None) -> list:
+    """
+    Run many top-k searches, over one or more collections, in a single statement.
+
+    The searches are unnested into rows and each collection gets one LATERAL
+    subquery (its collection id, storage mode and index expression inlined so
+    the planner can use the collection's ANN index and partition), the branches
+    being combined with UNION ALL.
+
+    Args:
+        session: Session or connection on the vector database.
+        searches (list[dict]): One per (query, collection) pair: {"vector", "target"
+            (index into targets), "k", "filter" (dict or None)}.
+        targets (list[dict]): {"collection_id", "storage_mode"} of each collection.
+        dims (int): Dimension of the query vectors.
+        rerank_factor (int | None): Candidates per result in compact modes.
+
+    Returns:
+        list: Rows of (search, id, document, cmetadata, distance), where search is
+        the index of the pair in searches.
+    """
+    if not searches:
+        return []
+    factor = rerank_factor or settings.VECTOR_RERANK_FACTOR
+    used = sorted({search["target"] for search in searches})
+    max_rows = max(search["k"] for search in searches)
+    if any(targets[target]["storage_mode"] != "float32" for target in used):
+        max_rows *= factor
+    set_search_params(session, max_rows)
+
+    params = {
+        "vectors": [_format_vector(search["vector"]) for search in searches],
+        "targets": [search["target"] for search in searches],
+        "ks": [search["k"] for search in searches],
+        "filters": [json.dumps(search.get("filter") or {}) for search in searches],
+    }
+    branches = []
+    for target in used:
+        mode = targets[target]["storage_mode"]
+        operator, _ = compact_operator(mode)
+        collection = f"'{uuid.UUID(str(targets[target]['collection_id']))}'"
+        order = f"{compact_expression(mode, dims)} {operator} {compact_query(mode, dims, 'q.query')}"
+        where = f"collection_id = {collection} AND (q.filter = '{{}}' OR cmetadata @> q.filter)"
+        if mode == "float32":
+            lateral = (
+                f"SELECT id, document, cmetadata, embedding <=> q.query AS distance "
+                f"FROM {EMBEDDING_TABLE} WHERE {where} ORDER BY {order} LIMIT q.k"
+            )
+        else:
+            lateral = (
+                f"SELECT e.id, e.document, e.cmetadata, e.embedding <=> q.query AS distance "
+                f"FROM (SELECT id FROM {EMBEDDING_TABLE} WHERE {where} ORDER BY {order} LIMIT q.k * {int(factor)}) c "
+                f"JOIN {EMBEDDING_TABLE} e ON e.collection_id = {collection} AND e.id = c.id "
+                f"ORDER BY distance LIMIT q.k"
+            )
+        branches.append(
+            f"SELECT q.search, r.id, r.document, r.cmetadata, r.distance "
+            f"FROM q CROSS JOIN LATERAL ({lateral}) r WHERE q.target = {int(target)}"
+        )
+
+    sql = (
+        f"WITH q AS MATERIALIZED ("
+        f"SELECT (ordinality - 1)::int AS search, CAST(vector AS vector({int(dims)})) AS query, "
+        f"target, k, filter "
+        f"FROM unnest(CAST(:vectors AS text[]), CAST(:targets AS int[]), CAST(:ks AS int[]), "
+        f"CAST(:filters AS jsonb[])) WITH ORDINALITY AS t(vector, target, k, filter, ordinality)) "
+        + " UNION ALL ".join(branches)
+    )
+    return session.execute(text(sql), params).fetchall()
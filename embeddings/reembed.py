@@ -0,0 +1,103 @@
+from collections import defaultdict
+
+from embeddings.batcher import get_embedding_batcher
+from embeddings.doc_loader import chunk_id
+from embeddings.executors import run_io_bound
+from embeddings.pdf_pages import aload_clean_splits
+from embeddings.helper_functions import (
+    content_hash, db_session, get_file_associated_ids, sync_file_associated_ids
+)
+from embeddings.vs_connect import get_vector_store
+
+def _load_existing_splits(file_id) -> list[tuple[str, str | None]]:
+    with db_session() as db:
+        return [(row.id_value, row.content_hash) for row in get_file_associated_ids(file_id, db)]
+
+def _sync_associations(file_id, removed: list, backfilled: dict) -> None:
+    with db_session() as db:
+        sync_file_associated_ids(file_id, removed, backfilled, db)
+
+async def reembed_file(file_id, storage_path: str, project_id, mime_type: str | None = None) -> dict:
+    """
+    Re-embed a file whose content changed, touching only the chunks that changed.
+
+    The file is split again and each chunk is hashed. Chunks whose hash is already
+    stored keep their vector and id; only new chunks are embedded, and chunks that
+    vanished are deleted. The collection is updated in one transaction, and the new
+    ids are recorded for the file before it commits, so no vector is left without
+    an owner; recorded ids with no stored vector, left by a failed commit, are
+    embedded again. Rows stored before hashes were recorded are hashed from the
+    document text in the vector store.
+
+    Returns:
+        dict: Counts of added, deleted and unchanged chunks.
+    """
+    splits = await aload_clean_splits(storage_path, mime_type)
+    vs = await run_io_bound(get_vector_store, project_id)
+    recorded = await run_io_bound(_load_existing_splits, file_id)
+    # Ids are recorded before the vector commit; one without a vector is embedded again
+    stored = await run_io_bound(vs.get_existing_ids, [id_value for id_value, _ in recorded])
+    existing = [(id_value, hash_value) for id_value, hash_value in recorded if id_value in stored]
+    missing = [id_value for id_value, _ in recorded if id_value not in stored]
+
+    backfilled = {}
+    legacy_ids = [id_value for id_value, hash_value in existing if hash_value is None]
+    if legacy_ids:
+        documents = await run_io_bound(vs.get_documents, legacy_ids)
+        backfilled = {id_value: content_hash(text) for id_value, text in documents.items()}
+
+    # Splits whose deterministic id is already stored are unchanged in place
+    hashes = [content_hash(split.page_content) for split in splits]
+    ids = [chunk_id(file_id, i, hash_value) for i, hash_value in enumerate(hashes)]
+    existing_ids = {id_value for id_value, _ in existing}
+    kept = existing_ids.intersection(ids)
+
+    # Remaining stored ids per content hash; duplicate chunks within a file are matched one to one
+    available = defaultdict(list)
+    for id_value, hash_value in existing:
+        hash_value = hash_value or backfilled.get(id_value)
+        if hash_value is not None and id_value not in kept:
+            available[hash_value].append(id_value)
+    orphaned = [id_value for id_value, hash_value in existing
+                if hash_value is None and id_value not in backfilled and id_value not in kept]
+
+    new_splits, new_hashes, new_ids = [], [], []
+    unchanged = 0
+    for split, hash_value, id_value in zip(splits, hashes, ids):
+        if id_value in kept:
+            unchanged += 1
+        elif available[hash_value]:
+            available[hash_value].pop()
+            unchanged += 1
+        else:
+            split.metadata.update({"id": id_value})
+            new_splits.append(split)
+            new_hashes.append(hash_value)
+            new_ids.append(id_value)
+
+    new_id_set = set(new_ids)
+    removed = orphaned + [id_value for stale in available.values() for id_value in stale]
+    removed += [id_value for id_value in missing if id_value not in new_id_set]
+
+    texts = [split.page_content for split in new_splits]
+    vectors = await get_embedding_batcher().embed(texts) if texts else []
+
+    await run_io_bound(
+        vs.replace_embeddings,
+        delete_ids=removed,
+        texts=texts,
+        vectors=vectors,
+        metadatas=[split.metadata for split in new_splits],
+        ids=new_ids,
+        file_id=file_id,
+        hashes=new_hashes,
+    )
+    removed_set = set(removed)
+    await run_io_bound(
+        _sync_associations,
+        file_id,
+        removed,
+        {id_value: hash_value for id_value, hash_value in backfilled.items() if id_value not in removed_set},
+    )
+
+    return {"added": len(new_ids), "deleted": len(removed), "unchanged": unchanged}
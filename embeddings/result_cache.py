@@ -0,0 +1,147 @@
+from collections import OrderedDict
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+from sqlalchemy import text
+
+from embeddings.embedding_cache import pack_vector
+from embeddings.partitions import COLLECTION_TABLE
+from embeddings.vector_db import get_vector_engine
+
+# Per-collection write versions. Every write to a collection (upsert, delete,
+# drop) bumps its version in the vector database, in the writing transaction
+# where possible, and cached search results are tagged with the version they
+# were computed at, so a result is only served while the collection is
+# unchanged, whichever replica wrote to it. Rows cascade with their collection.
+VERSION_TABLE = "collection_write_version"
+
+_versions_ready = False
+
+def ensure_version_table() -> None:
+    global _versions_ready
+    if _versions_ready:
+        return
+    with get_vector_engine().begin() as conn:
+        # CREATE TABLE IF NOT EXISTS is not safe against concurrent creators
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": VERSION_TABLE})
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+            f"collection_id uuid PRIMARY KEY REFERENCES {COLLECTION_TABLE} (uuid) ON DELETE CASCADE, "
+            f"version bigint NOT NULL)"
+        ))
+    _versions_ready = True
+
+def bump_version(conn, collection_id=None, collection_name: str | None = None) -> list:
+    """
+    Increment the write version of a collection, by id or name, or of every
+    collection when neither is given. Runs in the caller's transaction.
+
+    Returns:
+        list: Ids of the bumped collections.
+    """
+    ensure_version_table()
+    params = {}
+    where = ""
+    if collection_id is not None:
+        where = "WHERE uuid = :uuid"
+        params["uuid"] = uuid.UUID(str(collection_id))
+    elif collection_name is not None:
+        where = "WHERE name = :name"
+        params["name"] = collection_name
+    bumped = [row[0] for row in conn.execute(text(
+        f"INSERT INTO {VERSION_TABLE} (collection_id, version) SELECT uuid, 1 FROM {COLLECTION_TABLE} {where} "
+        f"ON CONFLICT (collection_id) DO UPDATE SET version = {VERSION_TABLE}.version + 1 "
+        f"RETURNING collection_id"
+    ), params)]
+    return bumped
+
+def collection_versions(conn, collection_ids: list) -> dict:
+    """
+    Current write version of each collection (0 if it was never bumped).
+    """
+    ensure_version_table()
+    ids = [uuid.UUID(str(collection_id)) for collection_id in collection_ids]
+    rows = conn.execute(
+        text(f"SELECT collection_id, version FROM {VERSION_TABLE} WHERE collection_id = ANY(:ids)"), {"ids": ids}
+    ).fetchall()
+    versions = {row[0]: row[1] for row in rows}
+    return {collection_id: versions.get(collection_id, 0) for collection_id in ids}
+
+class SearchResultCache:
+    """
+    LRU + TTL cache of raw search rows, keyed by (collection, query vector hash,
+    k, filter, mode, query text) and tagged with the collection's write version.
+
+    Rows are cached before the score threshold and field selection, so those
+    do not fragment the cache. An entry whose version is not the collection's
+    current version is dropped on lookup.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expiry, version, rows)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    @staticmethod
+    def key(collection_id, query_vector, k: int, metadata_filter: dict | None = None, mode: str = "vector",
+            query_text: str | None = None) -> tuple:
+        vector_hash = hashlib.sha256(pack_vector(query_vector)).hexdigest()
+        filter_key = json.dumps(metadata_filter or {}, sort_keys=True, default=str)
+        # The query text only affects hybrid results
+        text_key = query_text if mode == "hybrid" else None
+        return str(collection_id), vector_hash, int(k), filter_key, mode, text_key
+
+    def get(self, key: tuple, version: int) -> list | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= time.monotonic() or entry[1] != version:
+                del self._entries[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: tuple, version: int, rows: list) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, version, list(rows))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, collection_ids=None) -> None:
+        """
+        Drop the local entries of some collections, or all of them. Only frees
+        memory early: entries of a bumped collection are never served anyway.
+        """
+        with self._lock:
+            if collection_ids is None:
+                self._entries.clear()
+                return
+            collections = {str(collection_id) for collection_id in collection_ids}
+            for key in [key for key in self._entries if key[0] in collections]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+            }
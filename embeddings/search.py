@@ -0,0 +1,259 @@
+import asyncio
+import threading
+import time
+
+from sqlalchemy import text
+
+from embeddings.embedders import is_symmetric
+from embeddings.embedding_settings import Settings
+from embeddings.executors import run_io_bound
+from embeddings.hybrid import has_lexical_column, search_collection_hybrid
+from embeddings.helper_functions import (
+    db_session, get_vector_index_name_by_project_id, get_vector_storage_mode_by_project_id
+)
+from embeddings.partitions import COLLECTION_TABLE
+from embeddings.quantized import search_collection, search_collections_batch
+from embeddings.result_cache import SearchResultCache, bump_version, collection_versions
+from embeddings.vector_db import get_vector_engine
+
+settings = Settings()
+
+SEARCH_FIELDS = ("id", "content", "metadata", "score", "distance")
+# Extra fields of hybrid results
+HYBRID_FIELDS = SEARCH_FIELDS + ("rrf_score", "vector_rank", "lexical_rank")
+SEARCH_MODES = ("vector", "hybrid")
+
+result_cache = None
+if settings.SEARCH_RESULT_CACHE_ENABLED:
+    result_cache = SearchResultCache(
+        max_entries=settings.SEARCH_RESULT_CACHE_MAX_ENTRIES,
+        ttl_seconds=settings.SEARCH_RESULT_CACHE_TTL_SECONDS,
+    )
+
+# project_id -> (expiry, search target). Saves two lookups (project in the app
+# database, collection in the vector database) per search.
+_targets = {}
+_targets_lock = threading.Lock()
+
+def get_search_target(project_id) -> dict:
+    """
+    Collection id and storage mode of a project, cached for SEARCH_TARGET_CACHE_SECONDS.
+
+    Raises:
+        ValueError: If the project or its collection does not exist.
+    """
+    key = str(project_id)
+    now = time.monotonic()
+    with _targets_lock:
+        cached = _targets.get(key)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    with db_session() as db:
+        collection_name = get_vector_index_name_by_project_id(project_id, db)
+        storage_mode = get_vector_storage_mode_by_project_id(project_id, db)
+    with get_vector_engine().connect() as conn:
+        collection_id = conn.execute(
+            text(f"SELECT uuid FROM {COLLECTION_TABLE} WHERE name = :name"), {"name": collection_name}
+        ).scalar()
+    if collection_id is None:
+        raise ValueError(f"Collection '{collection_name}' has no embeddings yet.")
+
+    target = {"collection_id": collection_id, "collection_name": collection_name, "storage_mode": storage_mode}
+    with _targets_lock:
+        _targets[key] = (now + settings.SEARCH_TARGET_CACHE_SECONDS, target)
+    return target
+
+def invalidate_search_target(project_id=None) -> None:
+    """
+    Forget the cached target of a project, or of all projects.
+    """
+    with _targets_lock:
+        if project_id is None:
+            _targets.clear()
+        else:
+            _targets.pop(str(project_id), None)
+
+def bump_collection_version(conn, collection_id=None, collection_name: str | None = None) -> None:
+    """
+    Record a write to a collection, by id or name, in the caller's transaction
+    so its cached search results are no longer served.
+    """
+    bumped = bump_version(conn, collection_id=collection_id, collection_name=collection_name)
+    if result_cache is not None:
+        result_cache.invalidate(bumped)
+
+def embed_query(query: str) -> list[float]:
+    """
+    Embed a search query, through the query-embedding cache when it is enabled.
+    """
+    if settings.query_cache is None:
+        return settings.embeddings.embed_query(query)
+    return settings.query_cache.get_or_embed(query, settings.embeddings.embed_query)
+
+async def aembed_queries(queries: list[str]) -> list[list[float]]:
+    """
+    Embed a batch of queries: cache hits are served from the query cache, and
+    the distinct misses are embedded in one embed_documents call when the model
+    embeds queries like documents, or by concurrent embed_query calls otherwise.
+    """
+    vectors = [None] * len(queries)
+    pending = {}  # query -> indexes waiting for its vector
+    for i, query in enumerate(queries):
+        cached = settings.query_cache.lookup(query) if settings.query_cache is not None else None
+        if cached is not None:
+            vectors[i] = cached
+        else:
+            pending.setdefault(query, []).append(i)
+
+    if pending:
+        texts = list(pending)
+        if is_symmetric(settings.embeddings):
+            computed = await run_io_bound(settings.embeddings.embed_documents, texts)
+        else:
+            computed = await asyncio.gather(*[run_io_bound(settings.embeddings.embed_query, text) for text in texts])
+        for text, vector in zip(texts, computed):
+            vector = list(vector)
+            if settings.query_cache is not None:
+                settings.query_cache.store(text, vector)
+            for i in pending[text]:
+                vectors[i] = vector
+    return vectors
+
+def format_result(row, fields) -> dict:
+    distance = float(row.distance)
+    values = {
+        "id": row.id,
+        "content": row.document,
+        "metadata": row.cmetadata or {},
+        # Cosine similarity
+        "score": 1.0 - distance,
+        "distance": distance,
+    }
+    if "rrf_score" in row._fields:
+        values.update(
+            rrf_score=float(row.rrf_score), vector_rank=row.vector_rank, lexical_rank=row.lexical_rank
+        )
+    return {field: values[field] for field in fields if field in values}
+
+def search_project(project_id, query_vector: list[float], k: int, metadata_filter: dict | None = None,
+                   score_threshold: float | None = None, fields=SEARCH_FIELDS, mode: str = "vector",
+                   query_text: str | None = None) -> list[dict]:
+    """
+    Top-k search of a project's collection on a pooled connection.
+
+    Args:
+        project_id: The project to search.
+        query_vector (list[float]): Embedded query.
+        k (int): Maximum number of results.
+        metadata_filter (dict | None): Only match chunks whose metadata contains these key/values.
+        score_threshold (float | None): Drop results with a cosine similarity below this.
+        fields: Keys of each result, among SEARCH_FIELDS (HYBRID_FIELDS in hybrid mode).
+        mode (str): "vector", or "hybrid" to fuse full-text matches of query_text
+            with the vector ranking.
+        query_text (str | None): Query text for the full-text side of hybrid mode.
+
+    Returns:
+        list[dict]: Results, best first.
+
+    Raises:
+        ValueError: If the project or its collection does not exist, or hybrid
+            search is not enabled.
+    """
+    target = get_search_target(project_id)
+    if mode == "hybrid" and not has_lexical_column():
+        raise ValueError("Hybrid search is not enabled; run 'python -m embeddings.hybrid enable'.")
+    collection_id = target["collection_id"]
+    with get_vector_engine().connect() as conn:
+        rows = None
+        if result_cache is not None:
+            # A primary key lookup, against an ANN (and full-text) query on a miss
+            version = collection_versions(conn, [collection_id])[collection_id]
+            key = result_cache.key(collection_id, query_vector, k, metadata_filter, mode, query_text)
+            rows = result_cache.get(key, version)
+        if rows is None:
+            if mode == "hybrid":
+                rows = search_collection_hybrid(conn, collection_id, query_text, query_vector, k,
+                                                target["storage_mode"], metadata_filter=metadata_filter)
+            else:
+                rows = search_collection(conn, collection_id, query_vector, k, target["storage_mode"],
+                                         metadata_filter=metadata_filter)
+            if result_cache is not None:
+                result_cache.put(key, version, rows)
+    return [
+        format_result(row, fields)
+        for row in rows
+        if score_threshold is None or 1.0 - float(row.distance) >= score_threshold
+    ]
+
+def search_batch(queries: list[dict], query_vectors: list[list[float]], score_threshold: float | None = None,
+                 fields=SEARCH_FIELDS) -> list[list[dict]]:
+    """
+    Run the searches of a batch in one SQL statement.
+
+    Args:
+        queries (list[dict]): One per query: {"project_ids", "k", "filter"}.
+        query_vectors (list[list[float]]): Embedded queries, in the same order.
+        score_threshold (float | None): Drop results with a cosine similarity below this.
+        fields: Keys of each result, among SEARCH_FIELDS; "project_id" is always added.
+
+    Returns:
+        list[list[dict]]: Results of each query, best first across its projects.
+
+    Raises:
+        ValueError: If a project or its collection does not exist.
+    """
+    targets, target_index, projects = [], {}, []
+    searches, owners = [], []
+    for i, (query, vector) in enumerate(zip(queries, query_vectors)):
+        for project_id in query["project_ids"]:
+            key = str(project_id)
+            if key not in target_index:
+                target_index[key] = len(targets)
+                targets.append(get_search_target(project_id))
+                projects.append(key)
+            searches.append({
+                "vector": vector, "target": target_index[key], "k": query["k"], "filter": query.get("filter"),
+            })
+            owners.append(i)
+
+    if not searches:
+        return [[] for _ in queries]
+    cached = [None] * len(searches)
+    with get_vector_engine().connect() as conn:
+        if result_cache is not None:
+            versions = collection_versions(conn, [target["collection_id"] for target in targets])
+            for i, search in enumerate(searches):
+                collection_id = targets[search["target"]]["collection_id"]
+                search["key"] = result_cache.key(collection_id, search["vector"], search["k"], search["filter"])
+                search["version"] = versions[collection_id]
+                cached[i] = result_cache.get(search["key"], search["version"])
+        # Only the searches missing from the cache go to the database
+        misses = [i for i, rows in enumerate(cached) if rows is None]
+        rows = []
+        if misses:
+            rows = search_collections_batch(conn, [searches[i] for i in misses], targets,
+                                            dims=len(query_vectors[0]))
+
+    fetched = {i: [] for i in misses}
+    for row in rows:
+        fetched[misses[row.search]].append(row)
+    for i, search_rows in fetched.items():
+        cached[i] = search_rows
+        if result_cache is not None:
+            result_cache.put(searches[i]["key"], searches[i]["version"], search_rows)
+
+    grouped = [[] for _ in queries]
+    for i, search_rows in enumerate(cached):
+        search = searches[i]
+        for row in search_rows:
+            if score_threshold is not None and 1.0 - float(row.distance) < score_threshold:
+                continue
+            grouped[owners[i]].append(
+                (float(row.distance), {"project_id": projects[search["target"]], **format_result(row, fields)})
+            )
+    # Merge the per-project top-k lists of each query
+    return [
+        [result for _, result in sorted(results, key=lambda item: item[0])[:query["k"]]]
+        for query, results in zip(queries, grouped)
+    ]
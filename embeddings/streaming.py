@@ -0,0 +1,142 @@
+import asyncio
+import concurrent.futures
+from contextlib import aclosing
+import threading
+
+from embeddings.doc_loader import iter_clean_splits, register_split_ids
+from embeddings.embedding_settings import Settings
+from embeddings.executors import run_io_bound
+from embeddings.vs_connect import get_vector_store
+
+settings = Settings()
+
+_DONE = object()
+
+class _ConsumerStopped(Exception):
+    pass
+
+def should_stream(size_bytes: int | None) -> bool:
+    """
+    Whether a file is large enough to be ingested in streaming mode.
+    """
+    threshold = settings.INGEST_STREAMING_MIN_BYTES
+    return bool(threshold) and size_bytes is not None and size_bytes >= threshold
+
+def _produce_windows(splits, window_size: int, queue: asyncio.Queue, loop, stop: threading.Event):
+    """
+    Runs on the I/O pool: drain the split generator into fixed-size windows.
+    Blocks while the queue is full, which is what bounds memory.
+    """
+    def put(item):
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                return future.result(timeout=0.5)
+            except concurrent.futures.TimeoutError:
+                if stop.is_set():
+                    future.cancel()
+                    raise _ConsumerStopped()
+
+    try:
+        window = []
+        for split in splits:
+            window.append(split)
+            if len(window) >= window_size:
+                put(window)
+                window = []
+        if window:
+            put(window)
+        put(_DONE)
+    except _ConsumerStopped:
+        pass
+    except Exception as e:
+        if not stop.is_set():
+            put(e)
+    finally:
+        splits.close()
+
+async def aiter_split_windows(key: str, mime_type: str | None = None,
+                              window_size: int = settings.INGEST_STREAM_WINDOW_SIZE,
+                              queue_depth: int = settings.INGEST_STREAM_QUEUE_DEPTH):
+    """
+    Yield windows of window_size cleaned splits while the file is still being parsed.
+
+    Parsing runs on the I/O pool and hands windows through a queue of at most
+    queue_depth windows, so peak memory depends on the window size rather than
+    the file size. Close the generator (e.g. with contextlib.aclosing) to stop
+    the parser early.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+    producer = run_io_bound(_produce_windows, iter_clean_splits(key, mime_type), window_size, queue, loop, stop)
+    producer = asyncio.ensure_future(producer)
+
+    try:
+        while True:
+            window = await queue.get()
+            if window is _DONE:
+                return
+            if isinstance(window, Exception):
+                raise window
+            yield window
+    finally:
+        stop.set()
+        await producer
+
+async def aiter_list_windows(splits: list, window_size: int = settings.INGEST_STREAM_WINDOW_SIZE):
+    """
+    Yield an in-memory list of splits in windows of window_size.
+    """
+    for i in range(0, len(splits), window_size):
+        yield splits[i:i + window_size]
+
+async def write_split_windows(windows, file_id, project_id, start: int = 0, on_window=None) -> int:
+    """
+    Register, embed and write each window before taking the next one.
+
+    Args:
+        windows: Async iterable of split windows, in file order.
+        file_id: File the splits belong to.
+        project_id: Project whose collection receives the vectors.
+        start: Number of leading splits already written; they are skipped.
+        on_window: Optional coroutine function called with the number of splits
+            covered after each window is written.
+
+    Returns:
+        int: Total number of splits in the file, including skipped ones.
+    """
+    vs = await run_io_bound(get_vector_store, project_id)
+    ordinal = 0
+    async for window in windows:
+        first = ordinal
+        ordinal += len(window)
+        if ordinal <= start:
+            continue
+        window = window[max(start - first, 0):]
+        await run_io_bound(register_split_ids, window, file_id, ordinal - len(window))
+        await vs.apush_embeddings_to_vector_store(window)
+        if on_window is not None:
+            await on_window(ordinal)
+    return ordinal
+
+async def stream_file_to_vector_store(key: str, file_id, project_id,
+                                      window_size: int = settings.INGEST_STREAM_WINDOW_SIZE,
+                                      queue_depth: int = settings.INGEST_STREAM_QUEUE_DEPTH,
+                                      start: int = 0, on_window=None, mime_type: str | None = None) -> int:
+    """
+    Ingest a file in bounded memory: each window of splits is registered,
+    embedded and written before the next one is taken.
+
+    Returns:
+        int: Number of splits in the file.
+
+    Raises:
+        ValueError: If the file yields no text.
+    """
+    async with aclosing(aiter_split_windows(key, mime_type, window_size, queue_depth)) as windows:
+        written = await write_split_windows(windows, file_id, project_id, start, on_window)
+
+    if not written:
+        raise ValueError("No text found in the file.")
+    return written
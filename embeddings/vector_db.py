@@ -0,0 +1,22 @@
+from sqlalchemy import create_engine
+
+from embeddings.embedding_settings import Settings
+
+settings = Settings()
+
+_engine = None
+
+def get_vector_engine():
+    """
+    Engine on the vector database for DDL, catalog queries and raw SQL outside
+    of PGVector.
+    """
+    global _engine
+    if _engine is None:
+        _engine = create_engine(
+            settings.DATABASE_URL,
+            pool_pre_ping=True,
+            pool_size=settings.VECTOR_DB_POOL_SIZE,
+            max_overflow=settings.VECTOR_DB_MAX_OVERFLOW,
+        )
+    return _engine
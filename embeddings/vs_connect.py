@@ -1,32 +1,272 @@
-from langchain_postgres import PGVector
+import threading
 
-from embeddings.helper_functions import get_vector_index_name_by_project_id, get_db
+from langchain_core.documents import Document
+from sqlalchemy import column, delete, table
+from sqlalchemy.dialects.postgresql import TSVECTOR, insert
+
+from embeddings.helper_functions import (
+    get_vector_index_name_by_project_id, get_vector_storage_mode_by_project_id, db_session,
+    insert_file_associated_ids
+)
 from embeddings.embedding_settings import Settings
+from embeddings.batcher import get_embedding_batcher
+from embeddings.copy_writer import copy_embeddings
+from embeddings.executors import run_io_bound
+from embeddings.hybrid import LEXICAL_COLUMN, has_lexical_column, lexical_value
+from embeddings.partitions import conflict_columns, ensure_partition
+from embeddings.quantized import search_collection
+from embeddings.vector_db import get_vector_engine
+from embeddings.search import bump_collection_version, embed_query
 
 settings = Settings()
 
-# inside any FastAPI route or other internal function
+# Process-wide registry of vector store handles: project_id -> (collection name,
+# storage mode), and one handle per (collection name, storage mode). Handles share
+# the vector database engine (VECTOR_DB_POOL_SIZE), so ingesting or deleting
+# files reuses pooled connections instead of creating an engine per call.
+_projects = {}
+_stores = {}
+_registry_lock = threading.Lock()
+
 def get_collection_name(project_id: str) -> str:
-    db = next(get_db())  # assuming get_db() is your session generator
-    try:
-        return get_vector_index_name_by_project_id(project_id, db)
-    except ValueError as e:
-        raise "Project ID not found or vector index name not set." \
-              f"Error: {str(e)}"
+    with db_session() as db:
+        try:
+            return get_vector_index_name_by_project_id(project_id, db)
+        except ValueError as e:
+            raise ValueError(f"Project ID not found or vector index name not set. Error: {str(e)}") from e
+
+def get_storage_mode(project_id: str) -> str:
+    with db_session() as db:
+        return get_vector_storage_mode_by_project_id(project_id, db)
+
+def get_vector_store(project_id) -> "vector_stor_connection":
+    """
+    Shared vector store handle of a project's collection, created on first use.
+    """
+    key = str(project_id)
+    with _registry_lock:
+        target = _projects.get(key)
+    if target is None:
+        target = (get_collection_name(project_id), get_storage_mode(project_id))
+        with _registry_lock:
+            _projects[key] = target
+    with _registry_lock:
+        store = _stores.get(target)
+    if store is None:
+        store = vector_stor_connection(project_id, collection_name=target[0], storage_mode=target[1])
+        with _registry_lock:
+            store = _stores.setdefault(target, store)
+    return store
+
+def invalidate_vector_store(project_id=None, collection_name: str | None = None) -> None:
+    """
+    Forget a project's collection and storage mode (after its vector_index_name
+    or vector_storage_mode changes), and the handles of a dropped collection.
+    Without arguments, the whole registry is cleared.
+    """
+    with _registry_lock:
+        if project_id is None and collection_name is None:
+            _projects.clear()
+            _stores.clear()
+            return
+        if project_id is not None:
+            _projects.pop(str(project_id), None)
+        if collection_name is not None:
+            for target in [target for target in _stores if target[0] == collection_name]:
+                del _stores[target]
 
 class vector_stor_connection:
-    def __init__(self, project_id: str):
+    def __init__(self, project_id: str, collection_name: str | None = None, storage_mode: str | None = None):
         if not settings.embeddings:
             raise ValueError("No embedding model found.")
         if not settings.DATABASE_URL:
             raise ValueError("No database URL found.")
 
+        # langchain_postgres is only imported once a handle is needed
+        from langchain_postgres import PGVector
+
+        collection_name = collection_name or get_collection_name(project_id)
+        self.collection_name = collection_name
         self.vector_store = PGVector(
             embeddings=settings.embeddings,
-            collection_name=get_collection_name(project_id),
-            connection=settings.DATABASE_URL,
+            collection_name=collection_name,
+            connection=get_vector_engine(),
             use_jsonb=True,
         )
+        ensure_partition(collection_name)
+        self.storage_mode = storage_mode or get_storage_mode(project_id)
+        self._collection_id = None
+
+    @property
+    def collection_id(self):
+        """
+        Id of the collection, resolved once per handle (None if it does not exist).
+        """
+        if self._collection_id is None:
+            with self.vector_store._make_sync_session() as session:
+                collection = self.vector_store.get_collection(session)
+            self._collection_id = collection.uuid if collection else None
+        return self._collection_id
 
     def push_embeddings_to_vector_store(self, splits):
-        self.vector_store.add_documents(splits, ids=[doc.metadata["id"] for doc in splits])
\ No newline at end of file
+        texts = [doc.page_content for doc in splits]
+        self.replace_embeddings(
+            delete_ids=[],
+            texts=texts,
+            vectors=settings.embeddings.embed_documents(texts),
+            metadatas=[doc.metadata for doc in splits],
+            ids=[doc.metadata["id"] for doc in splits],
+        )
+
+    async def apush_embeddings_to_vector_store(self, splits):
+        """
+        Embed the splits through the shared micro-batcher, then write the
+        precomputed vectors without a second embedding pass. Splits whose id is
+        already in the collection are skipped, so a retried ingestion only
+        embeds what the failed attempt did not write.
+        """
+        present = await run_io_bound(self.get_existing_ids, [doc.metadata["id"] for doc in splits])
+        splits = [doc for doc in splits if doc.metadata["id"] not in present]
+        if not splits:
+            return
+        texts = [doc.page_content for doc in splits]
+        vectors = await get_embedding_batcher().embed(texts)
+        await run_io_bound(
+            self.replace_embeddings,
+            delete_ids=[],
+            texts=texts,
+            vectors=vectors,
+            metadatas=[doc.metadata for doc in splits],
+            ids=[doc.metadata["id"] for doc in splits],
+        )
+
+    def get_existing_ids(self, ids: list[str]) -> set[str]:
+        """
+        Return the subset of ids already stored in this collection.
+        """
+        store = self.vector_store.EmbeddingStore
+        collection_id = self.collection_id
+        if not collection_id or not ids:
+            return set()
+        with self.vector_store._make_sync_session() as session:
+            rows = session.query(store.id).filter(
+                store.collection_id == collection_id,
+                store.id.in_(ids),
+            ).all()
+        return {row[0] for row in rows}
+
+    def get_documents(self, ids: list[str]) -> dict[str, str]:
+        """
+        Return id -> stored document text for the given ids in this collection.
+        """
+        store = self.vector_store.EmbeddingStore
+        collection_id = self.collection_id
+        if not collection_id or not ids:
+            return {}
+        with self.vector_store._make_sync_session() as session:
+            rows = session.query(store.id, store.document).filter(
+                store.collection_id == collection_id,
+                store.id.in_(ids),
+            ).all()
+        return {row[0]: row[1] for row in rows}
+
+    def replace_embeddings(self, delete_ids: list[str], texts: list[str], vectors: list[list[float]],
+                           metadatas: list[dict], ids: list[str], file_id=None,
+                           hashes: list[str] | None = None) -> None:
+        """
+        Delete vanished chunks and upsert new ones in a single transaction on the collection.
+        Upserts target conflict_columns(), which works on both table layouts, and
+        write the chunk's tsvector for hybrid search when the table has the column.
+        Batches of VECTOR_COPY_MIN_ROWS or more go through a binary COPY.
+        The collection's write version is bumped in the same transaction.
+
+        With file_id, the ids are also recorded in file_associated_ids. That
+        table is in the app database, so it is committed just before the
+        vector transaction: a failure in between leaves recorded ids without
+        vectors, never vectors no file owns. reembed_file checks recorded ids
+        against the collection, so the next re-embed writes the missing vectors.
+        """
+        store = self.vector_store.EmbeddingStore
+        collection_id = self.collection_id
+        if not collection_id:
+            raise ValueError("Collection not found")
+        with self.vector_store._make_sync_session() as session:
+            if delete_ids:
+                session.execute(delete(store).where(
+                    store.collection_id == collection_id,
+                    store.id.in_(delete_ids),
+                ))
+            if ids and settings.VECTOR_COPY_MIN_ROWS and len(ids) >= settings.VECTOR_COPY_MIN_ROWS:
+                copy_embeddings(session, collection_id, ids, texts, vectors, metadatas)
+            elif ids:
+                lexical = has_lexical_column()
+                target = store.__table__
+                if lexical:
+                    # EmbeddingStore does not know the column
+                    target = table(
+                        store.__tablename__,
+                        *[column(c.name, c.type) for c in store.__table__.columns],
+                        column(LEXICAL_COLUMN, TSVECTOR),
+                    )
+                rows = []
+                for id_value, text, vector, metadata in zip(ids, texts, vectors, metadatas):
+                    row = {
+                        "id": id_value,
+                        "collection_id": collection_id,
+                        "embedding": vector,
+                        "document": text,
+                        "cmetadata": metadata,
+                    }
+                    if lexical:
+                        row[LEXICAL_COLUMN] = lexical_value(text)
+                    rows.append(row)
+                stmt = insert(target).values(rows)
+                updates = {
+                    "embedding": stmt.excluded.embedding,
+                    "document": stmt.excluded.document,
+                    "cmetadata": stmt.excluded.cmetadata,
+                }
+                if lexical:
+                    updates[LEXICAL_COLUMN] = stmt.excluded[LEXICAL_COLUMN]
+                session.execute(stmt.on_conflict_do_update(
+                    index_elements=conflict_columns(),
+                    set_=updates,
+                ))
+            # Last, so the version row is locked only until the commit
+            bump_collection_version(session, collection_id=collection_id)
+            if file_id is not None and ids:
+                with db_session() as db:
+                    insert_file_associated_ids(file_id, ids, db, hashes=hashes)
+                    db.commit()
+            session.commit()
+
+    def delete_embeddings(self, ids: list[str]) -> None:
+        """
+        Delete chunks of this collection by id; scoping to the collection lets
+        the partitioned layout touch only the collection's partition.
+        """
+        self.vector_store.delete(ids=ids, collection_only=True)
+        collection_id = self.collection_id
+        if collection_id is None:
+            # Nothing was deleted; without an id the bump would hit every collection
+            return
+        with get_vector_engine().begin() as conn:
+            bump_collection_version(conn, collection_id=collection_id)
+
+    def search_by_vector(self, vector: list[float], k: int = 4) -> list[tuple[Document, float]]:
+        """
+        k nearest documents to a vector with their cosine distance, searched
+        through the project's storage mode (compact index + exact re-rank).
+        """
+        collection_id = self.collection_id
+        if not collection_id:
+            return []
+        with self.vector_store._make_sync_session() as session:
+            rows = search_collection(session, collection_id, vector, k, self.storage_mode)
+        return [
+            (Document(id=row.id, page_content=row.document, metadata=row.cmetadata or {}), float(row.distance))
+            for row in rows
+        ]
+
+    def similarity_search_with_score(self, query: str, k: int = 4) -> list[tuple[Document, float]]:
+        return self.search_by_vector(embed_query(query), k)
@@ -1,14 +1,30 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy.ext.asyncio import AsyncSession
 import uuid
-from defaults.db_engine import engine
+from defaults.db_engine import get_async_db
 # Import from your existing schema
 from database.create_schema import Project
 from pydantic import BaseModel
+from typing import List, Optional
 import os
 from dotenv import load_dotenv
+from embeddings.embedding_settings import Settings
+from embeddings.executors import run_io_bound
+from embeddings.export import (
+    EXPORT_FIELDS, EXPORT_FORMATS, MEDIA_TYPES, ExportQuery, check_arrow, export_summary, iter_arrow,
+    iter_ndjson, iter_npy, open_snapshot, stage_file_chunk_ids
+)
+from embeddings.quantized import collection_dims
+from embeddings.search import (
+    HYBRID_FIELDS, SEARCH_FIELDS, SEARCH_MODES, aembed_queries, embed_query, get_search_target, search_batch,
+    search_project
+)
 load_dotenv(override=True)
 
+settings = Settings()
+
 DB_HOST=os.environ.get("DB_HOST")
 DB_PORT=os.environ.get("DB_PORT")
 DB_NAME=os.environ.get("DB_NAME")
@@ -19,23 +35,12 @@ DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/rag_pl
 
 app = APIRouter()
 
-# Database connection dependency
-def get_db():
-    # engine, _ = setup_database(DATABASE_URL)
-    from sqlalchemy.orm import sessionmaker
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # given a project id, return the vector_index_name for the project
 @app.get("/collection_name/{project_id}", response_model=dict)
-async def get_vector_index_name(project_id: uuid.UUID, db: Session = Depends(get_db)):
+async def get_vector_index_name(project_id: uuid.UUID, db: AsyncSession = Depends(get_async_db)):
     """Get the vector index name for a project"""
     try:
-        project = db.query(Project).filter(Project.project_id == project_id).first()
+        project = await db.get(Project, project_id)
         if not project:
             raise HTTPException(status_code=404, detail="Project not found")
         
@@ -51,6 +56,221 @@ async def get_vector_index_name(project_id: uuid.UUID, db: Session = Depends(get
             detail=f"Failed to fetch project stats: {str(e)}"
         )
 
+class SearchRequest(BaseModel):
+    query: str
+    k: Optional[int] = None
+    score_threshold: Optional[float] = None  # minimum cosine similarity
+    filter: Optional[dict] = None  # metadata key/values the chunks must contain
+    fields: Optional[List[str]] = None  # subset of id, content, metadata, score, distance
+    mode: Optional[str] = "vector"  # "hybrid" adds full-text matches, fused by reciprocal rank
+
+class BatchQuery(BaseModel):
+    query: str
+    project_ids: Optional[List[uuid.UUID]] = None  # defaults to the request's project_ids
+    k: Optional[int] = None
+    filter: Optional[dict] = None
+
+class BatchSearchRequest(BaseModel):
+    queries: List[BatchQuery]
+    project_ids: Optional[List[uuid.UUID]] = None
+    k: Optional[int] = None
+    score_threshold: Optional[float] = None
+    filter: Optional[dict] = None
+    fields: Optional[List[str]] = None
+
+def check_k(k: Optional[int]) -> int:
+    k = k or settings.SEARCH_DEFAULT_K
+    if not 1 <= k <= settings.SEARCH_MAX_K:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"k must be between 1 and {settings.SEARCH_MAX_K}."
+        )
+    return k
+
+def check_search_request(request, mode: str = "vector") -> tuple[int, List[str]]:
+    k = check_k(request.k)
+    if mode not in SEARCH_MODES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown mode '{mode}'. Use one of: {', '.join(SEARCH_MODES)}."
+        )
+    known = HYBRID_FIELDS if mode == "hybrid" else SEARCH_FIELDS
+    fields = request.fields or list(known)
+    unknown = [field for field in fields if field not in known]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}. Use any of: {', '.join(known)}."
+        )
+    return k, fields
+
+@app.post("/search/batch", response_model=dict)
+async def search_collections_batch(request: BatchSearchRequest):
+    """
+    Run several queries, each over one or more project collections, in one
+    request: the queries are embedded in one batch and all searches run in a
+    single SQL statement. Results are grouped per query, best first across
+    its projects.
+    """
+    k, fields = check_search_request(request)
+    if not 1 <= len(request.queries) <= settings.SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch must have between 1 and {settings.SEARCH_BATCH_MAX_QUERIES} queries."
+        )
+    queries = []
+    for item in request.queries:
+        project_ids = item.project_ids or request.project_ids
+        if not project_ids:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"No project_ids for query '{item.query}'."
+            )
+        queries.append({
+            "project_ids": list(dict.fromkeys(project_ids)),
+            "k": check_k(item.k) if item.k else k,
+            "filter": item.filter if item.filter is not None else request.filter,
+        })
+    try:
+        query_vectors = await aembed_queries([item.query for item in request.queries])
+        results = await run_io_bound(search_batch, queries, query_vectors, request.score_threshold, fields)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Search failed: {str(e)}"
+        )
+    return {
+        "results": [
+            {"query": item.query, "results": query_results}
+            for item, query_results in zip(request.queries, results)
+        ]
+    }
+
+@app.post("/search/{project_id}", response_model=dict)
+async def search_collection(project_id: uuid.UUID, request: SearchRequest):
+    """
+    Embed a query and return the closest chunks of the project's collection, so
+    clients need neither a database connection nor an embedding model. In
+    hybrid mode, exact matches of identifiers and codes rank high even when
+    their vectors are not the closest.
+    """
+    mode = (request.mode or "vector").lower()
+    k, fields = check_search_request(request, mode)
+    try:
+        query_vector = await run_io_bound(embed_query, request.query)
+        results = await run_io_bound(
+            search_project, project_id, query_vector, k, request.filter, request.score_threshold, fields,
+            mode, request.query
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Search failed: {str(e)}"
+        )
+    return {"project_id": str(project_id), "query": request.query, "results": results}
+
+def prepare_export(project_id: uuid.UUID, export_format: str, file_ids: Optional[List[uuid.UUID]],
+                   after: Optional[str], limit: Optional[int]):
+    """
+    Open the snapshot of an export and return (connection, query, rows, last id,
+    dimension); rows and last id are only counted for .npy shards.
+    """
+    target = get_search_target(project_id)
+    if export_format == "npy":
+        limit = min(limit or settings.EXPORT_NPY_SHARD_ROWS, settings.EXPORT_NPY_SHARD_ROWS)
+    query = ExportQuery(target["collection_id"], after=after, staged_ids=bool(file_ids), limit=limit)
+    conn = open_snapshot()
+    try:
+        if file_ids:
+            stage_file_chunk_ids(conn, file_ids)
+        rows = last_id = None
+        if export_format == "npy":
+            rows, last_id, dims = export_summary(conn, query)
+        else:
+            dims = collection_dims(conn, target["collection_id"])
+    except Exception:
+        conn.close()
+        raise
+    return conn, query, rows, last_id, dims
+
+@app.get("/export/{project_id}")
+async def export_collection(
+    project_id: uuid.UUID,
+    format: str = "ndjson",
+    file_id: Optional[List[uuid.UUID]] = Query(None),
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields: Optional[str] = None,
+):
+    """
+    Stream a project's chunks and vectors as NDJSON, an Arrow IPC stream, or a
+    raw float32 .npy shard (vectors only, at most EXPORT_NPY_SHARD_ROWS).
+
+    Chunks are exported in id order from a consistent snapshot, restricted to
+    the given file_ids if any. An interrupted export resumes with after=<last
+    id received>; .npy shards report theirs in X-Export-Last-Id.
+    """
+    export_format = format.lower()
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown format '{format}'. Use one of: {', '.join(EXPORT_FORMATS)}."
+        )
+    selected = fields.split(",") if fields else list(EXPORT_FIELDS)
+    unknown = [field for field in selected if field not in EXPORT_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}. Use any of: {', '.join(EXPORT_FIELDS)}."
+        )
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="limit must be positive.")
+    if export_format == "arrow":
+        try:
+            check_arrow()
+        except ImportError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    try:
+        conn, query, rows, last_id, dims = await run_io_bound(
+            prepare_export, project_id, export_format, file_id, after, limit
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Export failed: {str(e)}"
+        )
+
+    headers = {"Content-Disposition": f'attachment; filename="{project_id}.{export_format}"'}
+    if export_format == "npy":
+        if not rows:
+            conn.close()
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No vectors to export.")
+        body = iter_npy(conn, query, rows, dims)
+        headers.update({"X-Export-Rows": str(rows), "X-Export-Last-Id": last_id})
+    elif export_format == "arrow":
+        body = iter_arrow(conn, query, dims or 0, selected)
+    else:
+        body = iter_ndjson(conn, query, selected)
+    # The body generators close the connection; the task covers a client gone before the first chunk
+    return StreamingResponse(body, media_type=MEDIA_TYPES[export_format], headers=headers,
+                             background=BackgroundTask(conn.close))
+
 class CallExample(BaseModel):
     curl: str
     python_requests: str
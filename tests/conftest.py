@@ -0,0 +1,29 @@
+import os
+
+import pytest
+from sqlalchemy import text
+
+# The engines are built at import from these; nothing connects until a test asks
+os.environ.setdefault("DB_HOST", "localhost")
+os.environ.setdefault("DB_PORT", "5432")
+
+@pytest.fixture
+def vector_connection():
+    """
+    Connection on the configured vector database, in a transaction rolled back
+    afterwards. Tests using it are skipped when the database is unreachable.
+    """
+    from embeddings.vector_db import get_vector_engine
+
+    try:
+        conn = get_vector_engine().connect()
+    except Exception as e:
+        pytest.skip(f"Vector database unavailable: {e}")
+    transaction = conn.begin()
+    try:
+        if not conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'vector'")).scalar():
+            pytest.skip("The pgvector extension is not installed.")
+        yield conn
+    finally:
+        transaction.rollback()
+        conn.close()
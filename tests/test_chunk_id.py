@@ -0,0 +1,51 @@
+import uuid
+
+from langchain_core.documents import Document
+
+from embeddings import doc_loader
+from embeddings.doc_loader import chunk_id, register_split_ids
+from embeddings.helper_functions import content_hash
+
+FILE_ID = "6f1c2b1e-2d5a-4c1e-9a3b-0f5d6c7e8a90"
+OTHER_FILE_ID = "0b7e4a52-93d1-4c6f-8e2a-5d1f3c9b7a64"
+TEXTS = ["first split", "second split", "first split"]
+
+def test_same_input_gives_same_id():
+    hash_value = content_hash("hello")
+    assert chunk_id(FILE_ID, 0, hash_value) == chunk_id(uuid.UUID(FILE_ID), 0, hash_value)
+
+def test_id_is_pinned():
+    # Stored ids must survive upgrades; changing the naming scheme orphans every vector
+    assert chunk_id(FILE_ID, 0, content_hash("hello")) == "5223c117-ea1c-52d3-8e82-28c9049119ad"
+
+def test_id_is_uuid5_in_the_file_namespace():
+    hash_value = content_hash("hello")
+    value = uuid.UUID(chunk_id(FILE_ID, 3, hash_value))
+    assert value.version == 5
+    assert value == uuid.uuid5(uuid.UUID(FILE_ID), f"3:{hash_value}")
+
+def test_ordinal_hash_and_file_change_the_id():
+    hash_value = content_hash("hello")
+    ids = {
+        chunk_id(FILE_ID, 0, hash_value),
+        chunk_id(FILE_ID, 1, hash_value),
+        chunk_id(FILE_ID, 0, content_hash("hello!")),
+        chunk_id(OTHER_FILE_ID, 0, hash_value),
+    }
+    assert len(ids) == 4
+
+def test_windowed_registration_matches_whole_file(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(doc_loader, "get_db", lambda: iter([None]))
+    monkeypatch.setattr(doc_loader, "add_file_associated_ids",
+                        lambda source_id, ids, db, hashes: recorded.append(ids))
+
+    whole = register_split_ids([Document(page_content=t) for t in TEXTS], FILE_ID)
+    first = register_split_ids([Document(page_content=t) for t in TEXTS[:2]], FILE_ID)
+    rest = register_split_ids([Document(page_content=t) for t in TEXTS[2:]], FILE_ID, start=2)
+
+    ids = [split.metadata["id"] for split in whole]
+    assert [split.metadata["id"] for split in first + rest] == ids
+    # Repeated text at another position is a distinct split
+    assert len(set(ids)) == len(TEXTS)
+    assert recorded == [ids, ids[:2], ids[2:]]
@@ -0,0 +1,125 @@
+import json
+import math
+import struct
+import uuid
+
+import pytest
+from sqlalchemy import text
+
+from embeddings import copy_writer
+from embeddings.copy_writer import COPY_HEADER, STAGE_COLUMNS, _copy, encode_rows, pack_vectors
+
+COLLECTION_ID = uuid.UUID("6f1c2b1e-2d5a-4c1e-9a3b-0f5d6c7e8a90")
+IDS = ["a", "b", "c"]
+TEXTS = ["first chunk", "", None]
+VECTORS = [[0.5, -1.25, 3.0], [0.0, 0.125, -2.5], [1.0, 2.0, 4.0]]
+METADATAS = [{"source": "s3://bucket/key", "page": 1}, {}, None]
+
+def decode_payload(payload: bytes) -> list[list[bytes | None]]:
+    """
+    Rows of a COPY ... (FORMAT BINARY) payload, following Postgres' file format:
+    signature and header, then per row a field count and length-prefixed fields
+    (-1 for NULL), then a -1 trailer.
+    """
+    assert payload.startswith(b"PGCOPY\n\xff\r\n\x00")
+    flags, extension = struct.unpack_from(">ii", payload, 11)
+    assert (flags, extension) == (0, 0)
+    offset, rows = 19, []
+    while True:
+        (count,) = struct.unpack_from(">h", payload, offset)
+        offset += 2
+        if count == -1:
+            assert offset == len(payload)
+            return rows
+        fields = []
+        for _ in range(count):
+            (length,) = struct.unpack_from(">i", payload, offset)
+            offset += 4
+            if length == -1:
+                fields.append(None)
+            else:
+                fields.append(payload[offset:offset + length])
+                offset += length
+        rows.append(fields)
+
+def decode_vector(value: bytes) -> list[float]:
+    # pgvector's vector_send: int16 dimension, int16 unused, float32 values, big-endian
+    dims, unused = struct.unpack_from(">HH", value)
+    assert unused == 0
+    assert len(value) == 4 + 4 * dims
+    return list(struct.unpack_from(f">{dims}f", value, 4))
+
+@pytest.fixture(params=["numpy", "array"])
+def packing(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(copy_writer, "numpy", None)
+    return request.param
+
+def test_header_is_postgres_signature():
+    assert COPY_HEADER == b"PGCOPY\n\xff\r\n\x00" + b"\x00" * 8
+
+def test_pack_vectors_matches_vector_send(packing):
+    packed = pack_vectors(VECTORS)
+    assert [decode_vector(value) for value in packed] == VECTORS
+
+def test_pack_vectors_empty(packing):
+    assert pack_vectors([]) == []
+
+def test_numpy_and_array_paths_are_identical(monkeypatch):
+    numpy = pytest.importorskip("numpy")
+    with_numpy = encode_rows(COLLECTION_ID, IDS, TEXTS, numpy.asarray(VECTORS), METADATAS)
+    monkeypatch.setattr(copy_writer, "numpy", None)
+    assert encode_rows(COLLECTION_ID, IDS, TEXTS, VECTORS, METADATAS) == with_numpy
+
+def test_encode_rows_round_trip(packing):
+    rows = decode_payload(encode_rows(COLLECTION_ID, IDS, TEXTS, VECTORS, METADATAS))
+    assert len(rows) == len(IDS)
+    for row, id_value, text_value, vector, metadata in zip(rows, IDS, TEXTS, VECTORS, METADATAS):
+        assert len(row) == len(STAGE_COLUMNS.split(", "))
+        assert row[0].decode() == id_value
+        assert uuid.UUID(bytes=row[1]) == COLLECTION_ID
+        assert decode_vector(row[2]) == vector
+        assert (row[3].decode() if row[3] is not None else None) == text_value
+        if metadata is None:
+            assert row[4] is None
+        else:
+            # jsonb_send: a version byte, then the JSON text
+            assert row[4][:1] == b"\x01"
+            assert json.loads(row[4][1:]) == metadata
+
+def test_float32_rounding(packing):
+    (row,) = decode_payload(encode_rows(COLLECTION_ID, ["x"], ["t"], [[0.1, 1 / 3]], [{}]))
+    assert decode_vector(row[2]) == [struct.unpack(">f", struct.pack(">f", value))[0] for value in (0.1, 1 / 3)]
+
+def test_ragged_batch_is_rejected():
+    pytest.importorskip("numpy")
+    with pytest.raises(ValueError):
+        pack_vectors([[1.0, 2.0], [1.0]])
+
+@pytest.mark.parametrize("value", [math.nan, math.inf, -math.inf])
+def test_non_finite_metadata_is_rejected(value):
+    with pytest.raises(ValueError, match="chunk a"):
+        encode_rows(COLLECTION_ID, ["a"], ["t"], [[1.0]], [{"score": value}])
+
+def test_postgres_reads_the_payload(vector_connection, packing):
+    vector_connection.execute(text(
+        "CREATE TEMP TABLE copy_round_trip (id varchar, collection_id uuid, embedding vector, "
+        "document varchar, cmetadata jsonb) ON COMMIT DROP"
+    ))
+    cursor = vector_connection.connection.cursor()
+    try:
+        _copy(cursor, f"COPY copy_round_trip ({STAGE_COLUMNS}) FROM STDIN (FORMAT BINARY)",
+              encode_rows(COLLECTION_ID, IDS, TEXTS, VECTORS, METADATAS))
+    finally:
+        cursor.close()
+    rows = vector_connection.execute(text(
+        "SELECT id, collection_id, embedding::real[] AS embedding, document, cmetadata "
+        "FROM copy_round_trip ORDER BY id"
+    )).all()
+    assert [row.id for row in rows] == IDS
+    assert all(row.collection_id == COLLECTION_ID for row in rows)
+    assert [list(row.embedding) for row in rows] == VECTORS
+    assert [row.document for row in rows] == TEXTS
+    assert [row.cmetadata for row in rows] == METADATAS
@@ -0,0 +1,46 @@
+import pytest
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from benchmarks.splitter_benchmark import synthetic_corpus
+from embeddings.doc_loader import clean_string
+from embeddings.fast_splitter import SEPARATORS, FastRecursiveSplitter, clean_text
+
+EDGE_CASES = [
+    "",
+    "short",
+    "\n\n\n\n",
+    "x" * 2500,  # no separator at all: split character by character
+    "word " * 700,
+    "。".join(["向量検索数据문서" * 20] * 30),
+    "a\n\nb\n\nc" * 400,
+    " leading and trailing spaces " * 90,
+]
+
+def splitters(chunk_size: int, chunk_overlap: int):
+    reference = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                                               separators=SEPARATORS)
+    fast = FastRecursiveSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=SEPARATORS)
+    return reference, fast
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(1000, 100), (200, 0), (50, 20)])
+def test_clean_text_matches_langchain_then_clean_string(chunk_size, chunk_overlap):
+    reference, fast = splitters(chunk_size, chunk_overlap)
+    for doc in synthetic_corpus(n_docs=20) + EDGE_CASES:
+        assert fast.split_text(doc) == [clean_string(chunk) for chunk in reference.split_text(doc)]
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(1000, 100), (50, 20)])
+def test_dirty_text_matches_langchain_on_cleaned_text(chunk_size, chunk_overlap):
+    # Cleaning comes first, so sizes are measured on the cleaned text
+    reference, fast = splitters(chunk_size, chunk_overlap)
+    for doc in synthetic_corpus(n_docs=20, dirty=True):
+        assert fast.split_text(doc) == reference.split_text(clean_string(doc))
+
+def test_clean_text_matches_clean_string():
+    text = "a\x00b\x07c\x1bd e\x7ff\n\tg\rh"
+    assert clean_text(text) == clean_string(text) == "abcd ef\n\tg\rh"
+
+def test_without_cleaning_falls_back_to_langchain_splitting():
+    reference, _ = splitters(100, 10)
+    fast = FastRecursiveSplitter(chunk_size=100, chunk_overlap=10, separators=SEPARATORS, clean=False)
+    for doc in synthetic_corpus(n_docs=5, dirty=True):
+        assert fast.split_text(doc) == reference.split_text(doc)